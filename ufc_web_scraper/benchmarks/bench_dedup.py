@@ -0,0 +1,63 @@
+#Micro-benchmark for the startup cost of an incremental "nothing new" run
+#Usage: python benchmarks/bench_dedup.py (uses the urls/ and scraped_files/ folders next to main.py)
+import csv
+import os
+import sys
+import time
+
+#Scraper modules resolve their data folders from the working directory at import time
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+from scraper import events, fights, fightstats, fighters
+
+#Each stage's url file, the output file it is deduplicated against and the module doing it
+STAGES = [('events', 'event_urls.csv', 'ufc_event_data.csv', 'event_url', events),
+          ('fights', 'fight_urls.csv', 'ufc_fight_data.csv', 'fight_url', fights),
+          ('fightstats', 'fight_urls.csv', 'ufc_fight_stat_data.csv', 'fight_url', fightstats),
+          ('fighters', 'fighter_urls.csv', 'ufc_fighter_data.csv', 'fighter_url', fighters)]
+
+REPEATS = 5
+
+#Previous list based implementation, kept here as the baseline
+def legacy_filter_duplicate_urls(urls, file_name, url_column):
+    with open('scraped_files/' + file_name, 'r') as csv_file:
+        reader = csv.DictReader(csv_file)
+        scraped_urls = [row[url_column] for row in reader]
+        for url in scraped_urls:
+            if url in urls:
+                urls.remove(url)
+
+def load_urls(url_file):
+    with open('urls/' + url_file, 'r') as csv_file:
+        return [row[0] for row in csv.reader(csv_file)]
+
+#Best of REPEATS wall-clock time for loading the url file and filtering it
+def time_startup(filter_urls, url_file):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        urls = load_urls(url_file)
+        filter_urls(urls)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(urls)
+
+def main():
+    total_legacy = total_new = 0.0
+    print(f'{"stage":<12}{"urls":>8}{"scraped":>9}{"remaining":>11}{"legacy (s)":>12}{"set (s)":>10}{"speedup":>9}')
+    for name, url_file, output_file, url_column, module in STAGES:
+        if not os.path.exists('urls/' + url_file) or not os.path.exists('scraped_files/' + output_file):
+            print(f'{name:<12}missing urls/{url_file} or scraped_files/{output_file}')
+            continue
+        with open('scraped_files/' + output_file, 'r') as csv_file:
+            scraped = sum(1 for _ in csv_file) - 1
+        legacy, remaining = time_startup(lambda urls: legacy_filter_duplicate_urls(urls, output_file, url_column), url_file)
+        new, _ = time_startup(module.filter_duplicate_urls, url_file)
+        total_legacy += legacy
+        total_new += new
+        print(f'{name:<12}{len(load_urls(url_file)):>8}{scraped:>9}{remaining:>11}{legacy:>12.4f}{new:>10.4f}{legacy / new:>8.1f}x')
+    if total_new:
+        print(f'{"total":<40}{total_legacy:>12.4f}{total_new:>10.4f}{total_legacy / total_new:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#Benchmark of Phase 3 (normalise_tables) on synthetic tables at 1x and 10x today's size
+#Usage: python benchmarks/bench_normalise.py [--scales 1 10 100]
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraper import normalise_tables
+from benchmarks import synthetic
+
+#Previous row by row implementation of the lookups, kept here as the baseline
+def legacy_lookups(ufc_events, ufc_fights, ufc_fighters):
+    event_id_dict = {}
+    for num in range(len(ufc_events)):
+        event_id_dict[ufc_events.loc[num,'event_name']]=ufc_events.loc[num,'event_id']
+    fight_url_dict = {}
+    for num in range(len(ufc_fights)):
+        fight_url_dict[ufc_fights.loc[num,'fight_url']]=ufc_fights.loc[num,'fight_id']
+    fighter_id_dict = {}
+    for num in range(len(ufc_fighters)):
+        fighter_id_dict[ufc_fighters.loc[num,'fighter_name']]=ufc_fighters.loc[num,'fighter_id']
+    return event_id_dict, fight_url_dict, fighter_id_dict
+
+def load_tables(path):
+    folder = os.path.join(path, 'scraped_files')
+    return [pd.read_csv(os.path.join(folder, file_name)) for file_name in
+            ('ufc_event_data.csv', 'ufc_fight_data.csv', 'ufc_fight_stat_data.csv', 'ufc_fighter_data.csv')]
+
+#Whole of Phase 3 (read csv files, add keys and write them back) in the folder above path/scraped_files
+#Runs in its own process so the peak resident size is that of Phase 3 alone
+def run_phase_3(path):
+    os.chdir(path)
+    start = time.perf_counter()
+    normalise_tables.normalise_tables()
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_isolated(path):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_phase_3, (path,))
+
+def bench_scale(scale):
+    path = tempfile.mkdtemp(prefix='ufc_bench_')
+    cwd = os.getcwd()
+    try:
+        rows = synthetic.write_raw_tables(path, scale)
+
+        ufc_events, ufc_fights, ufc_fight_stats, ufc_fighters = load_tables(path)
+        normalise_tables.add_primary_keys(ufc_events, ufc_fights, ufc_fight_stats, ufc_fighters)
+        ufc_fighters['fighter_name'] = ufc_fighters['fighter_f_name'] + ' ' + ufc_fighters['fighter_l_name']
+        start = time.perf_counter()
+        legacy_lookups(ufc_events, ufc_fights, ufc_fighters)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalise_tables.add_foreign_key(ufc_events, ufc_fights, ufc_fight_stats, ufc_fighters)
+        foreign_keys = time.perf_counter() - start
+
+        del ufc_events, ufc_fights, ufc_fight_stats, ufc_fighters
+        phase_3, peak_rss = run_isolated(path)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path)
+
+    return {'scale': scale, 'rows': rows, 'legacy_lookups_seconds': round(legacy, 4),
+            'add_foreign_key_seconds': round(foreign_keys, 4), 'phase_3_seconds': round(phase_3, 4),
+            'phase_3_rows_per_sec': round(sum(rows.values()) / phase_3, 1),
+            'phase_3_peak_rss_mb': round(peak_rss / 1024 / 1024, 1)}
+
+def print_results(results):
+    print(f'{"scale":>6}{"fight stats":>13}{"legacy lookups (s)":>20}{"add_foreign_key (s)":>21}{"phase 3 (s)":>13}'
+          f'{"rows/sec":>11}{"peak MB":>9}')
+    for result in results:
+        print(f'{result["scale"]:>5}x{result["rows"]["fight_stats"]:>13}{result["legacy_lookups_seconds"]:>20}'
+              f'{result["add_foreign_key_seconds"]:>21}{result["phase_3_seconds"]:>13}'
+              f'{result["phase_3_rows_per_sec"]:>11.0f}{result["phase_3_peak_rss_mb"]:>9}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Times Phase 3 normalisation on synthetic tables')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='Multiples of today\'s row counts')
+    args = parser.parse_args()
+
+    results = [bench_scale(scale) for scale in args.scales]
+    print_results(results)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#Benchmark of the html extraction backends (lxml XPath vs BeautifulSoup) on stored pages
+#Usage: python benchmarks/bench_parsers.py [--corpus DIR] [--repeats N]
+#The default corpus is the recorded pages in benchmarks/fixtures, use --corpus cache for every cached page
+import argparse
+import gc
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+#Scraper modules resolve their data folders from the working directory at import time
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+from scraper import cache, events, fighters, parsing, replay
+
+BACKENDS = ['bs4', 'lxml']
+
+#Number of parsed pages held in memory at once to measure the resident size of one page
+MEMORY_PAGES = 200
+
+EXTRACTORS = {'events': events.parse_event,
+              'fights': replay.parse_fight_page,
+              'fighters': fighters.parse_fighter}
+
+#Recorded pages checked in with the benchmarks, listed with their urls in index.json
+fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+#Loads (url, html) pairs per page type from a fixtures folder (index.json) or a folder with the response cache layout
+def load_corpus(corpus_path):
+    pages = {page_type: [] for page_type in EXTRACTORS}
+    if os.path.exists(os.path.join(corpus_path, 'index.json')):
+        with open(os.path.join(corpus_path, 'index.json'), 'r') as index_file:
+            index = json.load(index_file)
+        for file_name, url in sorted(index.items()):
+            page_type = cache.page_type(url)
+            if page_type in pages:
+                with open(os.path.join(corpus_path, file_name), 'r', encoding='UTF8') as html_file:
+                    pages[page_type].append((url, html_file.read()))
+        return {page_type: items for page_type, items in pages.items() if items}
+
+    for meta_path in sorted(glob.glob(os.path.join(corpus_path, '*', '*.json'))):
+        with open(meta_path, 'r') as meta_file:
+            url = json.load(meta_file)['url']
+        page_type = cache.page_type(url)
+        if page_type in pages:
+            with gzip.open(meta_path[:-len('.json')] + '.html.gz', 'rb') as body_file:
+                pages[page_type].append((url, body_file.read().decode('utf-8', errors='replace')))
+    return {page_type: items for page_type, items in pages.items() if items}
+
+#Current resident set size in bytes
+def rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+#Times one extractor with one backend and measures the resident size of a parsed page
+#Each run gets its own process so memory freed by an earlier run is not reused
+def run_backend(backend, page_type, items, repeats):
+    parsing.BACKEND = backend
+    extract = EXTRACTORS[page_type]
+
+    gc.collect()
+    before = rss_bytes()
+    held = [parsing.parse_html(items[i % len(items)][1]) for i in range(MEMORY_PAGES)]
+    after = rss_bytes()
+    del held
+
+    #Warm up so selector compilation is not timed
+    for url, html in items:
+        extract(parsing.parse_html(html), url)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for url, html in items:
+            extract(parsing.parse_html(html), url)
+    elapsed = time.perf_counter() - start
+
+    return {'pages': len(items) * repeats,
+            'seconds': round(elapsed, 4),
+            'pages_per_sec': round(len(items) * repeats / elapsed, 1),
+            'kb_per_page': round((after - before) / MEMORY_PAGES / 1024, 1)}
+
+def run_isolated(backend, page_type, items, repeats):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_backend, (backend, page_type, items, repeats))
+
+#Results per backend and page type, None if the corpus has no event, fight or fighter pages
+def run(corpus_path=fixtures_path, repeats=20):
+    pages = load_corpus(corpus_path)
+    if not pages:
+        return None
+    return {backend: {page_type: run_isolated(backend, page_type, items, repeats)
+                      for page_type, items in pages.items()}
+            for backend in BACKENDS}
+
+def print_results(results):
+    print(f'{"page type":<10}{"backend":<9}{"pages/sec":>11}{"KB/page":>10}')
+    for page_type in results['lxml']:
+        for backend in BACKENDS:
+            row = results[backend][page_type]
+            print(f'{page_type:<10}{backend:<9}{row["pages_per_sec"]:>11}{row["kb_per_page"]:>10}')
+        speedup = results['lxml'][page_type]['pages_per_sec'] / results['bs4'][page_type]['pages_per_sec']
+        print(f'{"":<10}{"speedup":<9}{speedup:>10.1f}x')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares pages/sec and memory per page of the parsing backends')
+    parser.add_argument('--corpus', default=fixtures_path,
+                        help='Folder of stored pages (fixtures with index.json, or the response cache layout e.g. cache)')
+    parser.add_argument('--repeats', type=int, default=20, help='Times each page is parsed')
+    args = parser.parse_args()
+
+    results = run(args.corpus, args.repeats)
+    if results is None:
+        print(f'No event, fight or fighter pages found in {args.corpus}')
+        return
+    print_results(results)
+    return results
+
+if __name__ == '__main__':
+    main()
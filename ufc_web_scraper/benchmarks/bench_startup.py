@@ -0,0 +1,121 @@
+#Benchmark of the startup cost of an incremental run with nothing new to scrape, on synthetic tables
+#Times the duplicate url checks of every Phase 2 table (csv and sqlite backends) and a no-op
+#'--normalise incremental' run, each in a fresh process
+#Usage: python benchmarks/bench_startup.py [--scales 1 10 100]
+import argparse
+import csv
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import synthetic
+
+#Each url file and the table it is deduplicated against, in Phase 2 order
+STAGES = [('event_urls.csv', 'events'),
+          ('fight_urls.csv', 'fights'),
+          ('fight_urls.csv', 'fight_stats'),
+          ('fight_urls.csv', 'round_stats'),
+          ('fighter_urls.csv', 'fighters')]
+
+REPEATS = 5
+
+#Writes the url files of every row in path/scraped_files, so no url is new
+def write_url_files(path):
+    os.makedirs(os.path.join(path, 'urls'), exist_ok=True)
+    for url_file, table_file, url_column in (('event_urls.csv', 'ufc_event_data.csv', 'event_url'),
+                                             ('fight_urls.csv', 'ufc_fight_data.csv', 'fight_url'),
+                                             ('fighter_urls.csv', 'ufc_fighter_data.csv', 'fighter_url')):
+        with open(os.path.join(path, 'scraped_files', table_file), 'r', encoding='UTF8') as csv_file:
+            urls = [row[url_column] for row in csv.DictReader(csv_file)]
+        with open(os.path.join(path, 'urls', url_file), 'w', newline='') as csv_file:
+            csv.writer(csv_file).writerows([url] for url in urls)
+
+def load_urls(url_file):
+    with open('urls/' + url_file, 'r') as csv_file:
+        return [row[0] for row in csv.reader(csv_file)]
+
+#Copies the scraped csv files into scraped_files/ufc.db
+def load_sqlite(storage):
+    for table, (file_name, _, _, _) in storage.TABLES.items():
+        if not os.path.exists(os.path.join(storage.file_path, file_name)):
+            continue
+        with open(os.path.join(storage.file_path, file_name), 'r', encoding='UTF8') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader)
+            with storage.open_table(table, None) as writer:
+                writer.writerows(reader)
+
+#Best of REPEATS wall-clock time for loading every url file and filtering it against its table
+def time_dedup(storage, backend):
+    storage.BACKEND = backend
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        remaining = sum(len(storage.filter_new_urls(table, load_urls(url_file))) for url_file, table in STAGES)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, remaining
+
+#Runs in a spawned process started in path, so the scraper modules resolve their folders there
+def run_startup(path):
+    os.chdir(path)
+    from scraper import normalise_tables, storage
+
+    csv_seconds, remaining = time_dedup(storage, 'csv')
+
+    storage.BACKEND = 'sqlite'
+    load_sqlite(storage)
+    sqlite_seconds, _ = time_dedup(storage, 'sqlite')
+
+    #First run takes over every row, the second one only checks the high-water marks
+    os.makedirs('checkpoints', exist_ok=True)
+    start = time.perf_counter()
+    normalise_tables.normalise_new_rows()
+    first_run = time.perf_counter() - start
+    start = time.perf_counter()
+    normalise_tables.normalise_new_rows()
+    no_op = time.perf_counter() - start
+
+    return {'remaining_urls': remaining,
+            'csv_dedup_seconds': round(csv_seconds, 4),
+            'sqlite_dedup_seconds': round(sqlite_seconds, 4),
+            'normalise_first_run_seconds': round(first_run, 4),
+            'normalise_no_op_seconds': round(no_op, 4)}
+
+def bench_scale(scale):
+    path = tempfile.mkdtemp(prefix='ufc_bench_')
+    cwd = os.getcwd()
+    try:
+        rows = synthetic.write_raw_tables(path, scale)
+        write_url_files(path)
+        os.chdir(path)
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            result = pool.apply(run_startup, (path,))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path)
+    return {'scale': scale, 'rows': rows, **result}
+
+def print_results(results):
+    print(f'{"scale":>6}{"urls left":>11}{"csv dedup (s)":>15}{"sqlite dedup (s)":>18}'
+          f'{"first normalise (s)":>21}{"no-op normalise (s)":>21}')
+    for result in results:
+        print(f'{result["scale"]:>5}x{result["remaining_urls"]:>11}{result["csv_dedup_seconds"]:>15}'
+              f'{result["sqlite_dedup_seconds"]:>18}{result["normalise_first_run_seconds"]:>21}'
+              f'{result["normalise_no_op_seconds"]:>21}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Times the startup of an incremental run with nothing new to scrape')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='Multiples of today\'s row counts')
+    args = parser.parse_args()
+
+    results = [bench_scale(scale) for scale in args.scales]
+    print_results(results)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#End-to-end throughput benchmark of Phase 2 against the local mock server, offline and reproducible
+#Each scenario scrapes the same synthetic event, fight and fighter urls with a different fault injected by the server
+#and reports pages/sec with the requests, retries, 429s and failed pages it took
+#Usage: python benchmarks/bench_throughput.py [--pages 200] [--workers 8] [--rate 50] [--scenarios clean latency ...]
+import argparse
+import csv
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import mock_server, synthetic
+
+#Faults injected by the mock server in each scenario
+SCENARIOS = {'clean': {},
+             'latency': {'latency': 0.05, 'jitter': 0.05},
+             'rate_limited': {'max_rate': 20, 'retry_after': 1},
+             'server_errors': {'error_rate': 0.02},
+             'truncated': {'truncate_rate': 0.02}}
+
+#Phase 2 stages run in each scenario, urls come from synthetic url files so Phase 1 is not needed
+STAGES = ['events', 'fight_pages', 'fighters']
+
+#Writes url files listing the given number of events, fights and fighters
+def write_url_files(path, pages):
+    os.makedirs(os.path.join(path, 'urls'), exist_ok=True)
+    os.makedirs(os.path.join(path, 'scraped_files'), exist_ok=True)
+    for url_file, url in (('event_urls.csv', synthetic.event_url),
+                          ('fight_urls.csv', synthetic.fight_url),
+                          ('fighter_urls.csv', synthetic.fighter_url)):
+        with open(os.path.join(path, 'urls', url_file), 'w', newline='') as csv_file:
+            csv.writer(csv_file).writerows([url(num)] for num in range(pages))
+
+#Rows of a scraped csv file, one per page scraped
+def count_rows(table_file):
+    with open(os.path.join('scraped_files', table_file), 'r', encoding='UTF8') as csv_file:
+        return sum(1 for _ in csv.reader(csv_file)) - 1
+
+#Runs in a spawned process started in path, so the scraper modules resolve their folders there
+def run_scrape(path, base_url, workers, rate):
+    os.chdir(path)
+    sys.argv = ['main.py', '--base-url', base_url]
+    import logging
+    import main
+    from scraper import cache, fetcher, get_urls, metrics, ratelimit
+
+    #Failed pages are counted below, not logged
+    logging.disable(logging.CRITICAL)
+    args = main.parse_args()
+    get_urls.BASE_URL = args.base_url
+    cache.ENABLED = False
+    ratelimit.MAX_RATE = max(ratelimit.MAX_RATE, rate)
+    fetcher.configure(max_workers=workers, requests_per_second=rate)
+    metrics.reset()
+
+    start = time.perf_counter()
+    main.run_stages(main.build_stages(args), set(STAGES), logging.getLogger(__name__))
+    seconds = time.perf_counter() - start
+
+    pages = sum(count_rows(table_file) for table_file in ('ufc_event_data.csv', 'ufc_fight_data.csv',
+                                                           'ufc_fighter_data.csv'))
+    return {'seconds': round(seconds, 2),
+            'pages': pages,
+            'pages_per_sec': round(pages / seconds, 1),
+            'requests': metrics.total('requests_total'),
+            'retries': metrics.total('retries_total'),
+            'rate_limited': metrics.total('rate_limited_total'),
+            'request_errors': metrics.total('request_errors_total'),
+            'failed_pages': metrics.total('failed_pages_total')}
+
+def bench_scenario(name, pages, workers, rate, seed=0):
+    server = mock_server.start_server(mock_server.load_pages(mock_server.fixtures_path), seed=seed, **SCENARIOS[name])
+    path = tempfile.mkdtemp(prefix='ufc_bench_')
+    cwd = os.getcwd()
+    try:
+        write_url_files(path, pages)
+        os.chdir(path)
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            result = pool.apply(run_scrape, (path, server.url, workers, rate))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path)
+        server.shutdown()
+        server.server_close()
+    return {'scenario': name, **result, 'server': dict(server.counts)}
+
+#Runs every scenario, returning {scenario: result} so run_benchmarks.py can compare runs
+def run(pages=200, workers=8, rate=50, scenarios=None):
+    return {name: bench_scenario(name, pages, workers, rate) for name in scenarios or SCENARIOS}
+
+def print_results(results):
+    print(f'{"scenario":<15}{"pages":>7}{"seconds":>9}{"pages/sec":>11}{"requests":>10}{"retries":>9}'
+          f'{"429s":>6}{"errors":>8}{"failed":>8}')
+    for name, result in results.items():
+        print(f'{name:<15}{result["pages"]:>7}{result["seconds"]:>9}{result["pages_per_sec"]:>11}'
+              f'{result["requests"]:>10}{result["retries"]:>9}{result["rate_limited"]:>6}'
+              f'{result["request_errors"]:>8}{result["failed_pages"]:>8}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Times Phase 2 against the local mock server with injected faults')
+    parser.add_argument('--pages', type=int, default=200, help='Events, fights and fighters scraped in each scenario')
+    parser.add_argument('--workers', type=int, default=8, help='Fetcher worker threads')
+    parser.add_argument('--rate', type=float, default=50, help='Starting requests per second of the rate limiter')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), help='Scenarios to run (defaults to all)')
+    args = parser.parse_args()
+
+    results = run(args.pages, args.workers, args.rate, args.scenarios)
+    print_results(results)
+    return results
+
+if __name__ == '__main__':
+    main()
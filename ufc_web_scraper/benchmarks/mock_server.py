@@ -0,0 +1,189 @@
+#Local stand-in for ufcstats.com that serves recorded pages at the site's url paths, for offline load and throughput tests
+#Urls without a recording of their own get a recorded page of the same type, so any event, fight or fighter url works
+#Faults can be injected: latency, 429s with Retry-After above a request rate, 5xx errors and truncated bodies
+#Usage: python benchmarks/mock_server.py [--corpus DIR] [--port 8000] [--latency 0.05] [--max-rate 20] [--error-rate 0.01]
+#and scrape it with: python main.py --base-url http://127.0.0.1:8000
+import argparse
+import collections
+import glob
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraper import cache
+
+#Recorded pages checked in with the benchmarks, listed with their urls in index.json
+fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+#Path and query of a url, as the server receives it
+def url_path(url):
+    parts = urllib.parse.urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+#Loads {path: html bytes} from a fixtures folder (index.json) or a folder with the response cache layout
+def load_pages(corpus_path):
+    pages = {}
+    if os.path.exists(os.path.join(corpus_path, 'index.json')):
+        with open(os.path.join(corpus_path, 'index.json'), 'r') as index_file:
+            index = json.load(index_file)
+        for file_name, url in sorted(index.items()):
+            with open(os.path.join(corpus_path, file_name), 'rb') as html_file:
+                pages[url_path(url)] = html_file.read()
+        return pages
+
+    for meta_path in sorted(glob.glob(os.path.join(corpus_path, '*', '*.json'))):
+        with open(meta_path, 'r') as meta_file:
+            url = json.load(meta_file)['url']
+        with gzip.open(meta_path[:-len('.json')] + '.html.gz', 'rb') as body_file:
+            pages[url_path(url)] = body_file.read()
+    return pages
+
+class MockHandler(BaseHTTPRequestHandler):
+    #Keep-alive, so pooled connections are reused as they are with the real site
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.serve(self)
+
+    def log_message(self, format, *args):
+        pass
+
+#Threaded server holding the pages and the faults to inject, with a count of every response sent
+#Faults are drawn from a seeded generator so runs with the same settings see the same mix of responses
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, pages, port=0, latency=0.0, jitter=0.0, max_rate=None, retry_after=1,
+                 error_rate=0.0, error_status=500, truncate_rate=0.0, seed=0):
+        super().__init__(('127.0.0.1', port), MockHandler)
+        self.pages = pages
+        self.by_type = collections.defaultdict(list)
+        for path, body in sorted(pages.items()):
+            self.by_type[cache.page_type(path)].append(body)
+        self.latency = latency
+        self.jitter = jitter
+        self.max_rate = max_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.truncate_rate = truncate_rate
+        self.rng = random.Random(seed)
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        #Token bucket holding up to one second of requests at max_rate
+        self.tokens = max_rate or 0
+        self.updated = time.monotonic()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    #Recorded page of a path, or a recorded page of the same type picked by the path, or None
+    def find_page(self, path):
+        body = self.pages.get(path)
+        if body is None:
+            recorded = self.by_type.get(cache.page_type(path))
+            if recorded:
+                body = recorded[zlib.crc32(path.encode('utf-8')) % len(recorded)]
+        return body
+
+    #Takes a token if the request rate is below max_rate
+    def take_token(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_rate, self.tokens + (now - self.updated) * self.max_rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    #Picks the delay and outcome of a request: 'ok', 'rate_limited', 'error' or 'truncated'
+    def draw(self):
+        with self.lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter) if self.latency or self.jitter else 0
+            if self.max_rate and not self.take_token():
+                return delay, 'rate_limited'
+            fault = self.rng.random()
+            if fault < self.error_rate:
+                return delay, 'error'
+            elif fault < self.error_rate + self.truncate_rate:
+                return delay, 'truncated'
+            return delay, 'ok'
+
+    def serve(self, handler):
+        delay, outcome = self.draw()
+        if delay:
+            time.sleep(delay)
+
+        body = self.find_page(handler.path)
+        if body is None:
+            status, body = 404, b'Not found'
+        elif outcome == 'rate_limited':
+            status, body = 429, b'Too many requests'
+        elif outcome == 'error':
+            status, body = self.error_status, b'Server error'
+        else:
+            status = 200
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/html; charset=utf-8')
+        handler.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            handler.send_header('Retry-After', str(self.retry_after))
+        handler.end_headers()
+
+        #Truncated bodies are cut off half way and the connection closed, as if it dropped mid-transfer
+        if status == 200 and outcome == 'truncated':
+            handler.wfile.write(body[:len(body) // 2])
+            handler.close_connection = True
+        else:
+            handler.wfile.write(body)
+
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts[outcome if status != 404 else 'not_found'] += 1
+
+#Starts a server on a background thread, on a free port unless one is given
+def start_server(pages, **faults):
+    server = MockServer(pages, **faults)
+    threading.Thread(target=server.serve_forever, name='mock-server', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves recorded ufcstats.com pages locally, with optional faults')
+    parser.add_argument('--corpus', default=fixtures_path,
+                        help='Folder of stored pages to serve (defaults to benchmarks/fixtures, use cache for every cached page)')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many more seconds, drawn per response')
+    parser.add_argument('--max-rate', type=float, help='Requests per second above which 429s are sent')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of responses that are server errors')
+    parser.add_argument('--error-status', type=int, default=500, help='Status code of the server errors')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Share of responses cut off half way')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus)
+    server = MockServer(pages, port=args.port, latency=args.latency, jitter=args.jitter, max_rate=args.max_rate,
+                        retry_after=args.retry_after, error_rate=args.error_rate, error_status=args.error_status,
+                        truncate_rate=args.truncate_rate, seed=args.seed)
+    print(f'Serving {len(pages)} pages on {server.url}, scrape it with: python main.py --base-url {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.counts))
+
+if __name__ == '__main__':
+    main()
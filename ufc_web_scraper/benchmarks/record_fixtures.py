@@ -0,0 +1,57 @@
+#Records pages from the response cache into benchmarks/fixtures and lists them in fixtures/index.json
+#Usage: python benchmarks/record_fixtures.py [--fetch] [URL ...] (each url must have been scraped into cache/ first,
+#or is fetched from the site with --fetch). Without urls every page already in index.json is recorded again
+import argparse
+import json
+import os
+import sys
+
+#Scraper modules resolve their data folders from the working directory at import time
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+from scraper import cache, get_urls
+from benchmarks.bench_parsers import fixtures_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Copies cached pages into the benchmark fixtures')
+    parser.add_argument('urls', nargs='*',
+                        help='Urls of cached pages to record, defaults to every page in fixtures/index.json')
+    parser.add_argument('--fetch', action='store_true',
+                        help='Fetch the pages from the site (revalidating cached copies) instead of reading the cache')
+    args = parser.parse_args()
+
+    index_path = os.path.join(fixtures_path, 'index.json')
+    with open(index_path, 'r') as index_file:
+        index = json.load(index_file)
+    #Pages already recorded keep their file name
+    file_names = {url: file_name for file_name, url in index.items()}
+    session = get_urls.create_session() if args.fetch else None
+
+    for url in args.urls or list(file_names):
+        if args.fetch:
+            try:
+                response = cache.fetch(session, url)
+                response.raise_for_status()
+            except Exception as e:
+                print(f'Could not fetch {url}: {e}')
+                continue
+            content = response.content
+        else:
+            content, _ = cache.load(url)
+        if content is None:
+            print(f'Not in cache: {url}')
+            continue
+        #New pages are named after the last part of their url, e.g. fights/0adfc21045c02555.html
+        file_name = file_names.get(url, f'{cache.page_type(url)}/{url.rstrip("/").rsplit("/", 1)[1]}.html')
+        os.makedirs(os.path.join(fixtures_path, cache.page_type(url)), exist_ok=True)
+        with open(os.path.join(fixtures_path, file_name), 'wb') as html_file:
+            html_file.write(content)
+        index[file_name] = url
+        print(f'Recorded {url} as {file_name}')
+
+    with open(index_path, 'w') as index_file:
+        json.dump(dict(sorted(index.items())), index_file, indent=2)
+        index_file.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#Runs the whole benchmark suite offline and saves the results as JSON
+#Parsers run on the recorded pages in benchmarks/fixtures, Phase 3 and incremental startup on synthetic tables,
+#and with --throughput Phase 2 against the local mock server
+#Usage: python benchmarks/run_benchmarks.py [--scales 1 10 100] [--corpus DIR] [--throughput] [--output FILE] [--baseline FILE]
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import bench_normalise, bench_parsers, bench_startup, bench_throughput
+
+results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+#Metrics compared against a baseline, with True where higher is better
+METRICS = {'pages_per_sec': True,
+           'kb_per_page': False,
+           'phase_3_seconds': False,
+           'phase_3_rows_per_sec': True,
+           'phase_3_peak_rss_mb': False,
+           'csv_dedup_seconds': False,
+           'sqlite_dedup_seconds': False,
+           'normalise_no_op_seconds': False}
+
+#Percentage change below which a metric is treated as noise
+THRESHOLD = 5
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#Flattens the results into {'section/key/.../metric': value} for the metrics in METRICS
+def flatten(results, prefix=''):
+    if isinstance(results, list):
+        return {key: value for result in results for key, value in flatten(result, f'{prefix}{result["scale"]}x/').items()}
+    metrics = {}
+    for key, value in results.items():
+        if isinstance(value, (dict, list)):
+            metrics.update(flatten(value, f'{prefix}{key}/'))
+        elif key in METRICS:
+            metrics[prefix + key] = value
+    return metrics
+
+#Prints the change of every metric found in both runs
+def compare(results, baseline):
+    current, previous = flatten(results['benchmarks']), flatten(baseline['benchmarks'])
+    print(f'\nChange against {baseline.get("commit")} ({baseline.get("date")})')
+    for name in sorted(current.keys() & previous.keys()):
+        if not previous[name]:
+            continue
+        change = (current[name] - previous[name]) / previous[name] * 100
+        better = change > 0 if METRICS[name.rsplit('/', 1)[1]] else change < 0
+        label = '' if abs(change) < THRESHOLD else 'better' if better else 'worse'
+        print(f'{name:<55}{previous[name]:>12}{current[name]:>12}{change:>+9.1f}% {label}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the parser, Phase 3 and incremental startup benchmarks')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10],
+                        help='Multiples of today\'s row counts for the synthetic tables')
+    parser.add_argument('--corpus', default=bench_parsers.fixtures_path,
+                        help='Folder of stored pages for the parser benchmark (defaults to benchmarks/fixtures)')
+    parser.add_argument('--repeats', type=int, default=20, help='Times each page is parsed')
+    parser.add_argument('--throughput', action='store_true',
+                        help='Also time Phase 2 against the local mock server in every fault scenario (a couple of minutes)')
+    parser.add_argument('--output', help='JSON file for the results (defaults to benchmarks/results/<date>.json)')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    results = {'date': now.isoformat(timespec='seconds'),
+               'commit': git_commit(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'cpu_count': os.cpu_count(),
+               'benchmarks': {}}
+
+    print('Parsers')
+    results['benchmarks']['parsers'] = bench_parsers.run(args.corpus, args.repeats)
+    if results['benchmarks']['parsers'] is None:
+        print(f'No event, fight or fighter pages found in {args.corpus}')
+    else:
+        bench_parsers.print_results(results['benchmarks']['parsers'])
+
+    print('\nPhase 3')
+    results['benchmarks']['normalise'] = [bench_normalise.bench_scale(scale) for scale in args.scales]
+    bench_normalise.print_results(results['benchmarks']['normalise'])
+
+    print('\nIncremental startup')
+    results['benchmarks']['startup'] = [bench_startup.bench_scale(scale) for scale in args.scales]
+    bench_startup.print_results(results['benchmarks']['startup'])
+
+    if args.throughput:
+        print('\nThroughput against the mock server')
+        results['benchmarks']['throughput'] = bench_throughput.run()
+        bench_throughput.print_results(results['benchmarks']['throughput'])
+
+    output = args.output or os.path.join(results_path, now.strftime('%Y%m%dT%H%M%SZ') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f'\nResults saved to {output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            compare(results, json.load(baseline_file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#Generates Phase 2 style csv files of any size for offline benchmarks
+import csv
+import os
+import random
+
+#Row counts of the scraped dataset at scale 1
+EVENTS = 740
+FIGHTS = 8104
+FIGHTERS = 4376
+
+EVENT_COLUMNS = ['event_name', 'event_date', 'event_city', 'event_state', 'event_country', 'event_url']
+FIGHT_COLUMNS = ['event_name', 'referee', 'f_1', 'f_2', 'winner', 'num_rounds', 'title_fight',
+                 'weight_class', 'gender', 'result', 'result_details', 'finish_round', 'finish_time', 'fight_url',
+                 'f_1_url', 'f_2_url', 'winner_url', 'round_breakdown']
+FIGHT_STAT_COLUMNS = ['fighter_id', 'knockdowns', 'total_strikes_att', 'total_strikes_succ', 'sig_strikes_att',
+                      'sig_strikes_succ', 'takedown_att', 'takedown_succ', 'submission_att', 'reversals',
+                      'ctrl_time', 'fight_url', 'fighter_url']
+ROUND_STAT_COLUMNS = ['fighter_id', 'round', 'knockdowns', 'sig_strikes_att', 'sig_strikes_succ', 'total_strikes_att',
+                      'total_strikes_succ', 'takedown_att', 'takedown_succ', 'submission_att', 'reversals',
+                      'ctrl_seconds', 'head_strikes_att', 'head_strikes_succ', 'body_strikes_att', 'body_strikes_succ',
+                      'leg_strikes_att', 'leg_strikes_succ', 'distance_strikes_att', 'distance_strikes_succ',
+                      'clinch_strikes_att', 'clinch_strikes_succ', 'ground_strikes_att', 'ground_strikes_succ',
+                      'fight_url', 'fighter_url']
+FIGHTER_COLUMNS = ['fighter_f_name', 'fighter_l_name', 'fighter_nickname', 'fighter_height_cm',
+                   'fighter_weight_lbs', 'fighter_reach_cm', 'fighter_stance', 'fighter_dob', 'fighter_w',
+                   'fighter_l', 'fighter_d', 'fighter_nc_dq', 'fighter_url']
+
+WEIGHT_CLASSES = ['Flyweight', 'Bantamweight', 'Featherweight', 'Lightweight', 'Welterweight',
+                  'Middleweight', 'Light Heavyweight', 'Heavyweight']
+
+def write_csv(path, columns, rows):
+    with open(path, 'w', newline='', encoding='UTF8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+def fighter_url(num):
+    return f'http://ufcstats.com/fighter-details/{num:016x}'
+
+def event_url(num):
+    return f'http://ufcstats.com/event-details/{num:016x}'
+
+def fight_url(num):
+    return f'http://ufcstats.com/fight-details/{num:016x}'
+
+#Writes the raw tables to path/scraped_files, scaled from today's row counts
+def write_raw_tables(path, scale=1, seed=0):
+    rng = random.Random(seed)
+    n_events, n_fights, n_fighters = EVENTS * scale, FIGHTS * scale, FIGHTERS * scale
+    folder = os.path.join(path, 'scraped_files')
+    os.makedirs(folder, exist_ok=True)
+
+    fighters = [(f'First{num}', f'Last{num}') for num in range(n_fighters)]
+    write_csv(os.path.join(folder, 'ufc_fighter_data.csv'), FIGHTER_COLUMNS,
+              ([first, last, 'NULL', round(rng.uniform(155, 200), 2), rng.choice([125, 135, 145, 155, 170, 185, 205]),
+                'NULL', rng.choice(['Orthodox', 'Southpaw', 'NULL']), '1990-01-01',
+                rng.randint(0, 30), rng.randint(0, 15), 0, 'NULL', fighter_url(num)]
+               for num, (first, last) in enumerate(fighters)))
+
+    event_names = [f'UFC Synthetic {num}' for num in range(n_events)]
+    write_csv(os.path.join(folder, 'ufc_event_data.csv'), EVENT_COLUMNS,
+              ([name, '2020-01-01', 'Las Vegas', 'Nevada', 'USA', event_url(num)]
+               for num, name in enumerate(event_names)))
+
+    fights = []
+    for num in range(n_fights):
+        f_1, f_2 = rng.sample(range(n_fighters), 2)
+        fights.append((num, (' '.join(fighters[f_1]), fighter_url(f_1)), (' '.join(fighters[f_2]), fighter_url(f_2))))
+    write_csv(os.path.join(folder, 'ufc_fight_data.csv'), FIGHT_COLUMNS,
+              ([event_names[num * n_events // n_fights], 'Herb Dean', f_1[0], f_2[0], f_1[0], 3, 'F',
+                rng.choice(WEIGHT_CLASSES), 'M', 'Decision', 'Unanimous', 3, '5:00', fight_url(num),
+                f_1[1], f_2[1], f_1[1], 'T']
+               for num, f_1, f_2 in fights))
+
+    write_csv(os.path.join(folder, 'ufc_fight_stat_data.csv'), FIGHT_STAT_COLUMNS,
+              ([name, rng.randint(0, 2), rng.randint(0, 200), rng.randint(0, 100), rng.randint(0, 150),
+                rng.randint(0, 80), rng.randint(0, 8), rng.randint(0, 4), rng.randint(0, 3), 0,
+                f'{rng.randint(0, 14)}:{rng.randint(0, 59):02d}', fight_url(num), url]
+               for num, f_1, f_2 in fights for name, url in (f_1, f_2)))
+
+    #Three rounds per fight, one row per fighter per round
+    write_csv(os.path.join(folder, 'ufc_round_stat_data.csv'), ROUND_STAT_COLUMNS,
+              ([name, round_num] + [rng.randint(0, 40) for _ in range(len(ROUND_STAT_COLUMNS) - 4)] + [fight_url(num), url]
+               for num, f_1, f_2 in fights for round_num in (1, 2, 3) for name, url in (f_1, f_2)))
+
+    return {'events': n_events, 'fights': n_fights, 'fight_stats': 2 * n_fights, 'round_stats': 6 * n_fights,
+            'fighters': n_fighters}
@@ -1,6 +1,8 @@
+import argparse
 import logging
 import time
-from scraper import get_urls, events, fights, fightstats, fighters, normalise_tables
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scraper import deadletter, get_urls, events, fightpages, fighters, metrics, normalise_tables, pipeline, ratelimit, replay, retry, storage, workqueue
 
 def setup_logging():
     logging.basicConfig(
@@ -13,51 +15,184 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Scrapes UFC events, fights, fight stats and fighters from ufcstats.com')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only collect URLs for events completed since the last run')
+    parser.add_argument('--replay', action='store_true',
+                        help='Rebuild the CSV files by re-parsing stored pages, without network access')
+    parser.add_argument('--corpus',
+                        help='Folder of stored pages to replay (defaults to the response cache)')
+    parser.add_argument('--processes', type=int,
+                        help='Number of parser processes used by --replay (defaults to all cores), '
+                             'or of worker processes started by --queue work (defaults to 1)')
+    parser.add_argument('--formats', nargs='+', choices=['parquet', 'arrow'], default=[],
+                        help='Also save the normalised tables as typed Parquet and/or Arrow IPC files (requires pyarrow)')
+    parser.add_argument('--normalise', choices=['full', 'incremental'], default='full',
+                        help='Rebuild every table in place, or only normalise rows scraped since the last run into scraped_files/normalised')
+    parser.add_argument('--storage', choices=['csv', 'sqlite'], default='csv',
+                        help='Save scraped rows to csv files or upsert them into scraped_files/ufc.db')
+    parser.add_argument('--metrics', default='ufc_metrics.json',
+                        help='File the run metrics are saved to, in the Prometheus text format if it ends in .prom')
+    parser.add_argument('--progress', action='store_true',
+                        help='Show a live progress line while pages are fetched')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Only scrape the pages that failed in earlier runs (checkpoints/dead_letters.journal), '
+                             'with a growing pause between passes, then normalise')
+    parser.add_argument('--stream', action='store_true',
+                        help='Scrape each page as soon as its URL is found, running URL collection and scraping at once')
+    parser.add_argument('--fighters', choices=['profiles', 'listing', 'listing-only'], default='profiles',
+                        help='Scrape fighters from one profile page each, or from the 26 listing pages with profile '
+                             'pages only for new or changed fighters (listing) or none at all (listing-only)')
+    parser.add_argument('--refresh-fighters', action='store_true',
+                        help='Re-fetch the profiles of fighters in newly scraped fights and update their records in place')
+    parser.add_argument('--summaries', action='store_true',
+                        help='Also write a summary of every bout from the event pages fetched while collecting fight URLs')
+    parser.add_argument('--max-rate', type=float, default=ratelimit.MAX_RATE,
+                        help='Requests per second the adaptive rate limiter may rise to while the site responds well '
+                             '(defaults to one request per 1.5 seconds). With --queue, the one given to enqueue caps every worker')
+    parser.add_argument('--base-url',
+                        help='Send requests to this server instead of ufcstats.com, e.g. a local mock '
+                             '(benchmarks/mock_server.py). Scraped URLs keep the ufcstats.com base')
+    parser.add_argument('--queue', choices=['enqueue', 'work', 'merge'],
+                        help='Spread Phase 2 over workers sharing a work queue: collect URLs and queue them (enqueue), '
+                             'scrape queued pages on this machine (work), or write the results to the tables (merge)')
+    parser.add_argument('--queue-path', default=workqueue.queue_path,
+                        help='Work queue file shared by every worker, on a local filesystem (defaults to checkpoints/work_queue.db)')
+    parser.add_argument('--only', nargs='+', metavar='STAGE',
+                        help='Only run these stages, e.g. --only fighter_urls fighters. Stages they depend on are '
+                             'not run, their output from an earlier run is used instead')
+    args = parser.parse_args()
+
+    if args.only:
+        stages = build_stages(args)
+        unknown = [name for name in args.only if name not in stages]
+        if unknown:
+            parser.error(f'unknown stage(s) {", ".join(unknown)}, choose from {", ".join(stages)}')
+    return args
+
+#Phase 3 for the chosen storage backend and normalisation mode
+def normalise(args):
+    if args.storage == 'sqlite':
+        # Tables already have primary keys, only foreign keys of new rows need filling in
+        if args.formats:
+            logging.getLogger(__name__).warning("--formats only applies to the csv storage backend")
+        storage.link_keys()
+    elif args.normalise == 'incremental':
+        normalise_tables.normalise_new_rows(args.formats)
+    else:
+        normalise_tables.normalise_tables(args.formats)
+
+#Fighters stage for the chosen --fighters mode
+def scrape_fighters(args):
+    if args.fighters == 'profiles':
+        fighters.scrape_fighters()
+    else:
+        fighters.scrape_fighter_listings(fetch_profiles=args.fighters == 'listing')
+
+#Stages of a run as {name: (metrics stage, function, stages it depends on)}
+#Fighter URLs and fighters do not depend on events or fights, so those branches run at the same time
+def build_stages(args):
+    if args.replay:
+        # Re-parses stored pages into csv files without network access
+        stages = {'replay': ('phase_2/replay', lambda: replay.replay(args.corpus, args.processes), [])}
+    elif args.retry_failed:
+        # Scrapes only the pages recorded in the dead-letter store
+        stages = {'retry_failed': ('phase_2/retry_failed', retry.retry_failed, [])}
+    elif args.stream:
+        # Streams urls from event pages straight into the fight and fighter scrapers
+        stages = {'pipeline': ('phase_1_2/pipeline', lambda: pipeline.run_pipeline(args.incremental), [])}
+    elif args.queue == 'work':
+        # Leases queued urls until none are left, in as many processes as --processes asks for
+        stages = {'queue_worker': ('phase_2/queue_worker', lambda: workqueue.run_workers(args.queue_path, args.processes), [])}
+    elif args.queue == 'merge':
+        stages = {'merge': ('phase_2/merge', lambda: workqueue.merge_results(args.queue_path), [])}
+    elif args.incremental:
+        stages = {'new_urls': ('phase_1/new_urls', get_urls.get_new_urls, []),
+                  'events': ('phase_2/events', events.scrape_events, ['new_urls']),
+                  'fight_pages': ('phase_2/fight_pages', fightpages.scrape_fight_pages, ['new_urls']),
+                  'fighters': ('phase_2/fighters', lambda: scrape_fighters(args), ['new_urls'])}
+    else:
+        stages = {'event_urls': ('phase_1/event_urls', get_urls.get_event_urls, []),
+                  'fight_urls': ('phase_1/fight_urls', get_urls.get_fight_urls, ['event_urls']),
+                  'fighter_urls': ('phase_1/fighter_urls', get_urls.get_fighter_urls, []),
+                  # Event pages are fetched once, by fight_urls, and events reads them from the cache afterwards
+                  'events': ('phase_2/events', events.scrape_events, ['fight_urls']),
+                  'fight_pages': ('phase_2/fight_pages', fightpages.scrape_fight_pages, ['fight_urls']),
+                  'fighters': ('phase_2/fighters', lambda: scrape_fighters(args), ['fighter_urls'])}
+
+    if args.queue == 'enqueue':
+        # Phase 2 is left to the workers, so the tables are normalised after the merge
+        url_stages = [name for name in stages if name.endswith('urls')]
+        stages = {name: stages[name] for name in url_stages}
+        stages['enqueue'] = ('phase_1/enqueue', lambda: workqueue.enqueue_urls(args.queue_path), url_stages)
+        return stages
+    elif args.queue == 'work':
+        return stages
+
+    # Refreshes fighters who fought in newly scraped fights, once fighters new to this run have been added
+    if args.refresh_fighters and not args.replay:
+        stages['refresh_fighters'] = ('phase_2/refresh_fighters', fighters.refresh_fighters, list(stages))
+
+    # Normalises tables for clean final output once every table has been scraped
+    if args.storage == 'sqlite':
+        normalise_stage = 'phase_3/link_keys'
+    elif args.normalise == 'incremental':
+        normalise_stage = 'phase_3/normalise_new_rows'
+    else:
+        normalise_stage = 'phase_3/normalise_tables'
+    stages['normalise'] = (normalise_stage, lambda: normalise(args), list(stages))
+    return stages
+
+#Runs each stage on its own thread as soon as the stages it depends on have finished
+#Requests of stages running at once share the rate limiter and the fetcher's MAX_WORKERS slots
+#If a stage fails, stages already running are left to finish, no new ones are started and the error is raised
+def run_stages(stages, selected, logger):
+    #Dependencies that are not selected were completed by an earlier run
+    waiting = {name: [dep for dep in deps if dep in selected]
+               for name, (_, _, deps) in stages.items() if name in selected}
+    finished = set()
+    running = {}
+
+    def run_stage(name):
+        metrics_stage, function, _ = stages[name]
+        logger.info(f"Starting stage {name}")
+        with metrics.stage(metrics_stage):
+            function()
+        logger.info(f"Stage {name} completed")
+
+    with ThreadPoolExecutor(max_workers=max(len(waiting), 1), thread_name_prefix='stage') as executor:
+        while waiting or running:
+            for name in [name for name, deps in waiting.items() if all(dep in finished for dep in deps)]:
+                del waiting[name]
+                running[executor.submit(run_stage, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                future.result()
+                finished.add(name)
+
 def main():
+    args = parse_args()
     logger = setup_logging()
     start_time = time.time()
+    storage.BACKEND = args.storage
+    metrics.PROGRESS = args.progress
+    get_urls.SUMMARIES = args.summaries
+    fighters.REFRESH = args.refresh_fighters
+    if args.base_url:
+        get_urls.BASE_URL = args.base_url.rstrip('/')
+    ratelimit.MAX_RATE = args.max_rate
+    if args.max_rate < ratelimit.REQUESTS_PER_SECOND:
+        ratelimit.configure(args.max_rate)
     
     logger.info("=== UFC Web Scraper Started ===")
     
     try:
-        # Scrapes all urls from ufcstats.com
-        logger.info("Phase 1: Getting URLs from ufcstats.com")
-        
-        logger.info("Getting event URLs...")
-        get_urls.get_event_urls()
-        logger.info("Event URLs completed")
-        
-        logger.info("Getting fight URLs...")
-        get_urls.get_fight_urls()
-        logger.info("Fight URLs completed")
-        
-        logger.info("Getting fighter URLs...")
-        get_urls.get_fighter_urls()
-        logger.info("Fighter URLs completed")
-        
-        # Iterates through urls and scrapes key data into csv files
-        logger.info("Phase 2: Scraping data from URLs")
-        
-        logger.info("Scraping events data...")
-        events.scrape_events()
-        logger.info("Events scraping completed")
-        
-        logger.info("Scraping fights data...")
-        fights.scrape_fights()
-        logger.info("Fights scraping completed")
-        
-        logger.info("Scraping fight stats data...")
-        fightstats.scrape_fightstats()
-        logger.info("Fight stats scraping completed")
-        
-        logger.info("Scraping fighters data...")
-        fighters.scrape_fighters()
-        logger.info("Fighters scraping completed")
-        
-        # Normalises tables for clean final output
-        logger.info("Phase 3: Normalising tables")
-        normalise_tables.normalise_tables()
-        logger.info("Table normalisation completed")
+        stages = build_stages(args)
+        selected = set(args.only or stages)
+        logger.info(f"Running stages: {', '.join(name for name in stages if name in selected)}")
+        run_stages(stages, selected, logger)
         
         elapsed_time = time.time() - start_time
         logger.info(f"=== UFC Web Scraper Completed Successfully in {elapsed_time:.2f} seconds ===")
@@ -66,5 +201,11 @@ def main():
         logger.error(f"Error during scraping process: {e}")
         raise
 
+    finally:
+        # Saves timings and request counts, also for failed runs
+        deadletter.close()
+        metrics.log_summary()
+        metrics.save(args.metrics)
+
 if __name__ == '__main__':
     main()
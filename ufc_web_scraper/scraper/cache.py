@@ -0,0 +1,157 @@
+#Import libraries for the on-disk HTTP response cache
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from scraper import metrics
+
+logger = logging.getLogger(__name__)
+
+#Define path for cached pages, stored as gzipped html with a json metadata file per url
+cache_path = os.getcwd() + '/cache'
+
+#Set to False to always go to the network
+ENABLED = True
+
+#Seconds a cached page is served without contacting ufcstats.com (None never expires)
+#Completed events and fights almost never change, fighter records change after every bout
+#and the listing pages gain new entries every week
+TTL = {'events': 90 * 24 * 3600,
+       'fights': 90 * 24 * 3600,
+       'fighters': 7 * 24 * 3600,
+       'event_listings': 3600,
+       'fighter_listings': 24 * 3600,
+       'other': 3600}
+
+#Minimal stand-in for requests.Response returned for pages served from the cache
+class CachedResponse:
+
+    def __init__(self, url, content, meta):
+        self.url = url
+        self.content = content
+        self.status_code = meta.get('status_code', 200)
+        self.headers = {'ETag': meta.get('etag'), 'Last-Modified': meta.get('last_modified')}
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def raise_for_status(self):
+        pass
+
+#Maps a url to the page type used for its TTL and cache folder
+def page_type(url):
+    if 'event-details' in url:
+        return 'events'
+    elif 'fight-details' in url:
+        return 'fights'
+    elif 'fighter-details' in url:
+        return 'fighters'
+    elif 'statistics/events' in url:
+        return 'event_listings'
+    elif 'statistics/fighters' in url:
+        return 'fighter_listings'
+    else:
+        return 'other'
+
+#Returns the paths of the cached body and metadata for a url
+def entry_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    folder = os.path.join(cache_path, page_type(url))
+    return os.path.join(folder, key + '.html.gz'), os.path.join(folder, key + '.json')
+
+#Loads cached body and metadata for a url, or (None, None) if not cached
+def load(url):
+    body_path, meta_path = entry_paths(url)
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        with gzip.open(body_path, 'rb') as body_file:
+            return body_file.read(), meta
+    except (OSError, ValueError):
+        return None, None
+
+#Writes a file atomically so concurrent workers or a crash never leave a partial entry
+#The temporary name is unique per thread, as stages running at once can fetch the same page
+def write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+
+def save_meta(url, meta):
+    _, meta_path = entry_paths(url)
+    write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+#Stores a successful response body and its validators
+def store(url, response):
+    body_path, _ = entry_paths(url)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    write_atomic(body_path, gzip.compress(response.content))
+    save_meta(url, {'url': url,
+                    'status_code': response.status_code,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.time()})
+
+def is_fresh(url, meta):
+    ttl = TTL.get(page_type(url))
+    return ttl is None or time.time() - meta['fetched_at'] < ttl
+
+#Returns the cached page if it is still within its TTL, without any network access
+def get_fresh(url):
+    if not ENABLED:
+        return None
+    content, meta = load(url)
+    if content is not None and is_fresh(url, meta):
+        logger.debug(f'Cache hit: {url}')
+        metrics.inc('cache_hits_total', page_type=page_type(url))
+        return CachedResponse(url, content, meta)
+    return None
+
+#Requests a url, revalidating a stale cached copy with ETag/Last-Modified where the server supports it
+def fetch(session, url, timeout=30):
+    content, meta = load(url) if ENABLED else (None, None)
+
+    headers = {}
+    if content is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = session.get(url, timeout=timeout, headers=headers)
+
+    #Page unchanged since it was cached, so refresh its age and serve the stored body
+    if response.status_code == 304 and content is not None:
+        logger.debug(f'Cache revalidated: {url}')
+        meta['fetched_at'] = time.time()
+        save_meta(url, meta)
+        return CachedResponse(url, content, meta)
+
+    if ENABLED and response.status_code == 200:
+        store(url, response)
+    response.from_cache = False
+    return response
+
+#Marks a cached page as stale, so the next request for it is revalidated with the server
+def expire(url):
+    _, meta_path = entry_paths(url)
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return
+    meta['fetched_at'] = 0
+    save_meta(url, meta)
+
+#Returns a cached page if fresh, otherwise fetches it from the network
+def get(session, url, timeout=30):
+    cached = get_fresh(url)
+    if cached is not None:
+        return cached
+    return fetch(session, url, timeout)
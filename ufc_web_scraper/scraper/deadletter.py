@@ -0,0 +1,70 @@
+#Import libraries for the dead-letter store of pages that failed to scrape
+import threading
+import time
+import logging
+from scraper import cache, journal
+
+logger = logging.getLogger(__name__)
+
+#Set to False to stop recording failed pages, e.g. in work queue workers, whose queue keeps its own failures
+ENABLED = True
+
+#Failed pages as an append-only journal in checkpoints/, the last entry of a url wins
+#A url that later scrapes successfully gets an entry without data, which removes it
+NAME = 'dead_letters'
+
+lock = threading.Lock()
+store = None
+entries = None
+
+#Entries of the journal, loaded on first use
+def load_entries():
+    global store, entries
+    if entries is None:
+        store = journal.Journal(NAME)
+        entries = store.load()
+    return entries
+
+#Returns {url: entry} of every page still failing, each entry with its page type, error class and message,
+#the number of failed attempts and when it first and last failed
+def failed_pages():
+    with lock:
+        return {url: entry for url, entry in load_entries().items() if entry is not None}
+
+#Records a failed attempt at a page
+def record_failure(url, error):
+    if not ENABLED:
+        return
+    with lock:
+        previous = load_entries().get(url)
+        now = time.time()
+        entry = {'page_type': cache.page_type(url),
+                 'error': type(error).__name__,
+                 'message': str(error)[:500],
+                 'attempts': previous['attempts'] + 1 if previous else 1,
+                 'first_failed_at': previous['first_failed_at'] if previous else now,
+                 'failed_at': now}
+        store.append(url, entry)
+        entries[url] = entry
+
+#Removes a page that has now been scraped
+def resolve(url):
+    if not ENABLED:
+        return
+    with lock:
+        if load_entries().get(url) is not None:
+            store.append(url)
+            entries[url] = None
+
+#Rewrites the journal with only the pages still failing
+def compact():
+    with lock:
+        failed = {url: entry for url, entry in load_entries().items() if entry is not None}
+        store.compact(failed)
+        entries.clear()
+        entries.update(failed)
+
+def close():
+    with lock:
+        if store is not None:
+            store.close()
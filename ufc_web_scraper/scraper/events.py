@@ -1,11 +1,11 @@
 #Import libraries for web-scraping and saving to CSV file.
 
 import requests
-import bs4
 import csv
 import os
 from datetime import datetime
 import logging
+from scraper import fetcher, records, storage
 
 logger = logging.getLogger(__name__)
 
@@ -36,17 +36,30 @@ def create_csv_file():
 
 #Ensure each url is only scraped once when script is run multiple times
 def filter_duplicate_urls(event_urls):
-    if 'ufc_event_data.csv' in os.listdir(file_path):
-        with open(file_path + '/' + 'ufc_event_data.csv','r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            
-            #List of previously scraped urls:
-            
-            scraped_event_urls = [row['event_url'] for row in reader]
-            #Removes scraped urls from event_urls
-            for url in scraped_event_urls:
-                if url in event_urls:
-                    event_urls.remove(url)
+    #Removes previously scraped urls, keeping the original order of event_urls
+    event_urls[:] = storage.filter_new_urls('events', event_urls)
+
+#Scrapes event details from a parsed event page and returns them as a typed record
+def parse_event(event_soup,event):
+    event_full_location = event_soup.select('li')[4].text.split(':')[1].strip().split(',')
+
+    event_name = event_soup.select('h2')[0].text
+    event_date = str(datetime.strptime(event_soup.select('li')[3].text.split(':')[-1].strip(), '%B %d, %Y'))
+    event_city = event_full_location[0]
+    event_country = event_full_location[-1]
+    
+    #Check event location contains state details
+    if len(event_full_location)>2:
+        event_state = event_full_location[1]
+    else:
+        event_state = 'NULL'
+    
+    return records.Event.from_row([event_name.strip(), 
+                                   event_date[0:10], 
+                                   event_city.strip(), 
+                                   event_state.strip(), 
+                                   event_country.strip(), 
+                                   event])
 
 #Scrapes details of each UFC event appends to CSV file 'ufc_event_data'
 def scrape_events():
@@ -71,54 +84,28 @@ def scrape_events():
         logger.info('Event data already scraped')
         
     else:
-        create_csv_file()
-
         logger.info(f'Starting to scrape {urls_to_scrape} event URLs...')
         urls_scraped = 0
         
-        with open(file_path + '/' + 'ufc_event_data.csv','a+') as csv_file:
-            writer = csv.writer(csv_file)
+        with storage.open_table('events', create_csv_file) as writer:
         
-            #Iterates through each event url to scrape key details
-            for i, event in enumerate(event_urls, 1):
-                try:
-                    logger.debug(f'Processing event {i}/{urls_to_scrape}: {event}')
-                    event_request = requests.get(event)
-                    event_soup = bs4.BeautifulSoup(event_request.text,'lxml')
-                    event_full_location = event_soup.select('li')[4].text.split(':')[1].strip().split(',')
-
-                    event_name = event_soup.select('h2')[0].text
-                    event_date = str(datetime.strptime(event_soup.select('li')[3].text.split(':')[-1].strip(), '%B %d, %Y'))
-                    event_city = event_full_location[0]
-                    event_country = event_full_location[-1]
-                    
-                    #Check event location contains state details
-                    if len(event_full_location)>2:
-                        event_state = event_full_location[1]
-                    else:
-                        event_state = 'NULL'
-                    
-                    #Adds new row to csv file
-                    writer.writerow([event_name.strip(), 
-                                     event_date[0:10], 
-                                     event_city.strip(), 
-                                     event_state.strip(), 
-                                     event_country.strip(), 
-                                     event])
-                    
-                    urls_scraped += 1
-                    logger.debug(f'Successfully scraped event: {event_name.strip()}')
-                        
-                except IndexError as e:
-                    logger.error(f"IndexError scraping event page: {event} - {e}")
+            #Fetches event pages concurrently and writes rows back in url order
+            for i, (event, row, error) in enumerate(fetcher.scrape_urls(event_urls, parse_event), 1):
+                logger.debug(f'Processing event {i}/{urls_to_scrape}: {event}')
+                if isinstance(error, IndexError):
+                    logger.error(f"IndexError scraping event page: {event} - {error}")
                     continue
-                except requests.RequestException as e:
-                    logger.error(f"Request error for event: {event} - {e}")
+                elif isinstance(error, requests.RequestException):
+                    logger.error(f"Request error for event: {event} - {error}")
                     continue
-                except Exception as e:
-                    logger.error(f"Unexpected error scraping event: {event} - {e}")
+                elif error is not None:
+                    logger.error(f"Unexpected error scraping event: {event} - {error}")
                     continue
+
+                #Adds new row to the events table
+                writer.writerow(row)
+                
+                urls_scraped += 1
+                logger.debug(f'Successfully scraped event: {row.event_name}')
                 
             logger.info(f'{urls_scraped}/{urls_to_scrape} events successfully scraped')
-            
-
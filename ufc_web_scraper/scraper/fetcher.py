@@ -0,0 +1,131 @@
+#Import libraries for concurrent, rate-limited fetching of ufcstats.com pages
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scraper import cache, deadletter, metrics, parsing, ratelimit
+from scraper.get_urls import create_session
+
+logger = logging.getLogger(__name__)
+
+#Default number of worker threads, requests are paced by the shared limiter in ratelimit.py
+MAX_WORKERS = 8
+REQUEST_TIMEOUT = 30
+
+#Urls per worker fetched ahead of the first one still unfinished, i.e. results held back by a slow request
+LOOKAHEAD = 2
+
+session = None
+session_lock = threading.Lock()
+
+#Requests in flight across every scrape running at once, so stages run in parallel share MAX_WORKERS between them
+request_slots = threading.BoundedSemaphore(MAX_WORKERS)
+
+#Sets the number of workers and the starting requests per second for later fetches
+def configure(max_workers=None, requests_per_second=None):
+    global MAX_WORKERS, session, request_slots
+    if max_workers is not None:
+        MAX_WORKERS = max_workers
+        #Pool size depends on the number of workers so the session is rebuilt on next use
+        session = None
+        request_slots = threading.BoundedSemaphore(max_workers)
+    if requests_per_second is not None:
+        ratelimit.configure(requests_per_second)
+    logger.info(f'Fetcher configured with {MAX_WORKERS} workers starting at {ratelimit.REQUESTS_PER_SECOND} requests/sec')
+
+#Returns the shared retrying session, with a connection pool large enough for every worker
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = create_session(pool_size=MAX_WORKERS)
+        return session
+
+#Fetches a single url, serving fresh pages from the cache so only real requests are rate limited
+#With revalidate, cached pages are always checked with the server, which answers 304 if they are unchanged
+def fetch(url, revalidate=False):
+    cached = None if revalidate else cache.get_fresh(url)
+    if cached is not None:
+        return cached
+    with request_slots:
+        return cache.fetch(get_session(), url, REQUEST_TIMEOUT)
+
+#Fetches urls on a thread pool and yields (index, url, response, error) in completion order
+#A url is only submitted while it is less than LOOKAHEAD urls past the first one still unfinished, so a stalled
+#request holds back at most that many later results, which in_order keeps until it returns
+def fetch_all(urls, max_workers=None, revalidate=False):
+    max_workers = max_workers or MAX_WORKERS
+    lookahead = max_workers * LOOKAHEAD
+    url_iter = iter(enumerate(urls))
+    pending = {}
+    finished = set()
+    next_submit = 0
+    first_unfinished = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        #Keeps a bounded number of urls in flight so memory does not grow with the url list
+        def submit_next():
+            nonlocal next_submit
+            while next_submit < first_unfinished + lookahead:
+                for index, url in url_iter:
+                    pending[executor.submit(fetch, url, revalidate)] = (index, url)
+                    next_submit = index + 1
+                    break
+                else:
+                    return
+
+        submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, url = pending.pop(future)
+                try:
+                    response, error = future.result(), None
+                except Exception as e:
+                    response, error = None, e
+                finished.add(index)
+                while first_unfinished in finished:
+                    finished.remove(first_unfinished)
+                    first_unfinished += 1
+                submit_next()
+                yield index, url, response, error
+
+#Buffers (index, ...) results that complete early and yields them back in input order
+#fetch_all stops submitting urls LOOKAHEAD per worker past the first unfinished one, which bounds the buffer
+def in_order(results):
+    buffered = {}
+    next_index = 0
+    for result in results:
+        buffered[result[0]] = result
+        while next_index in buffered:
+            yield buffered.pop(next_index)
+            next_index += 1
+
+#Fetches urls (a list or any iterable) concurrently, parses each page as soon as it arrives and yields (url, result, error) in input order
+def scrape_urls(urls, parse, max_workers=None, revalidate=False):
+
+    def parsed_pages():
+        for index, url, response, error in fetch_all(urls, max_workers, revalidate):
+            result = None
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    result = parse(parsing.parse_html(response.text), url)
+                except Exception as e:
+                    error = e
+                metrics.observe('parse_seconds', time.perf_counter() - start, page_type=cache.page_type(url))
+            #Failed pages are kept in the dead-letter store until they scrape, see --retry-failed
+            if error is not None:
+                metrics.inc('failed_pages_total', page_type=cache.page_type(url))
+                deadletter.record_failure(url, error)
+            else:
+                deadletter.resolve(url)
+            yield index, url, result, error
+
+    #urls may be a generator that is still discovering them, then the total is unknown
+    total_urls = len(urls) if hasattr(urls, '__len__') else None
+    for done, (index, url, result, error) in enumerate(in_order(parsed_pages()), 1):
+        metrics.progress(cache.page_type(url), done, total_urls)
+        yield url, result, error
@@ -1,12 +1,14 @@
 #Import libraries for web-scraping and saving to CSV file.
 import requests
-import bs4
+import contextlib
 import re
 import csv
 from string import ascii_lowercase
 import os
 from datetime import datetime
+import time
 import logging
+from scraper import cache, fetcher, get_urls, journal, parsing, records, storage
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +16,13 @@ logger = logging.getLogger(__name__)
 url_path = os.getcwd() + '/urls'
 file_path = os.getcwd() + '/scraped_files'
 
+#Set to True to queue both fighters of every newly scraped fight for refresh_fighters(), whose records changed with it
+REFRESH = False
+
+#Columns a refresh updates: everything from the profile except the name
+REFRESH_COLUMNS = ['fighter_nickname', 'fighter_height_cm', 'fighter_weight_lbs', 'fighter_reach_cm', 'fighter_stance',
+                   'fighter_dob', 'fighter_w', 'fighter_l', 'fighter_d', 'fighter_nc_dq']
+
 #If file does not exist, create a new CSV file with column headers
 def create_csv():
     if 'ufc_fighter_data.csv' not in os.listdir(file_path):
@@ -38,15 +47,8 @@ def create_csv():
 
 #Ensure each url is only scraped once when script is run multiple times
 def filter_duplicate_urls(fighter_urls):
-    if 'ufc_fighter_data.csv' in os.listdir(file_path):
-        with open(file_path + '/' + 'ufc_fighter_data.csv','r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            scraped_fighter_urls = [row['fighter_url'] for row in reader]
-            
-            #Removes previously scraped urls from fighter_urls
-            for url in scraped_fighter_urls:
-                if url in fighter_urls:
-                    fighter_urls.remove(url)
+    #Removes previously scraped urls, keeping the original order of fighter_urls
+    fighter_urls[:] = storage.filter_new_urls('fighters', fighter_urls)
 
 
 #Parse fighter last name depending on length of name
@@ -72,7 +74,9 @@ def parse_nickname(nickname):
 
 #Converts height in feet/inches to height in cm
 def parse_height(height):
-    height_text = height.text.split(':')[1].strip()
+    return height_to_cm(height.text.split(':')[1].strip())
+
+def height_to_cm(height_text):
     if '--' in height_text.split("'"):
         return 'NULL'
     else:
@@ -84,15 +88,20 @@ def parse_height(height):
 
 #Converts reach in inches to reach in cm
 def parse_reach(reach):
-    reach_text = reach.text.split(':')[1]
+    return reach_to_cm(reach.text.split(':')[1])
+
+def reach_to_cm(reach_text):
     if '--' in reach_text:
         return 'NULL'
     else:
-        return round(int(reach_text.strip().strip('"')) * 2.54, 2)
+        #Listing pages show reach with a decimal place, e.g. 72.0"
+        return round(float(reach_text.strip().strip('"')) * 2.54, 2)
 
 
 def parse_weight(weight_element):
-    weight_text = weight_element.text.split(':')[1]
+    return weight_to_lbs(weight_element.text.split(':')[1])
+
+def weight_to_lbs(weight_text):
     if '--' in weight_text:
         return 'NULL'
     else:
@@ -116,6 +125,180 @@ def parse_dob(dob):
         return str(datetime.strptime(dob_text, '%b %d, %Y'))[0:10]
 
 
+#Scrapes fighter details from a parsed fighter page and returns them as a typed record
+def parse_fighter(fighter_soup,url):
+    name = fighter_soup.select('span')[0].text.split()
+    nickname = fighter_soup.select('p.b-content__Nickname')[0]
+    details = fighter_soup.select('li.b-list__box-list-item')
+    record = fighter_soup.select('span.b-content__title-record')[0].text.split(':')[1].strip().split('-')
+
+    fighter_f_name = name[0] 
+    fighter_l_name = parse_l_name(name)
+    fighter_nickname = parse_nickname(nickname)
+    fighter_height_cm = parse_height(details[0])
+    fighter_weight_lbs = parse_weight(details[1])
+    fighter_reach_cm = parse_reach(details[2])
+    fighter_stance = parse_stance(details[3])
+    fighter_dob = parse_dob(details[4])
+    fighter_w = record[0]
+    fighter_l = record[1]
+    fighter_d = record[-1][0] if len(record[-1]) > 1 else record[-1]
+    fighter_nc_dq = record[-1].split('(')[-1][0] if len(record[-1]) > 1 else 'NULL'
+
+    return records.Fighter.from_row([fighter_f_name.strip(), 
+                                     fighter_l_name.strip(), 
+                                     fighter_nickname,
+                                     fighter_height_cm,
+                                     fighter_weight_lbs,
+                                     fighter_reach_cm,
+                                     fighter_stance,
+                                     fighter_dob[0:10],
+                                     fighter_w,
+                                     fighter_l,
+                                     fighter_d,
+                                     fighter_nc_dq,
+                                     url])
+
+
+#Columns shown on the alphabetical listing pages, compared with stored rows to find fighters that changed
+LISTING_COLUMNS = ['fighter_f_name', 'fighter_l_name', 'fighter_nickname', 'fighter_height_cm', 'fighter_weight_lbs',
+                   'fighter_reach_cm', 'fighter_stance', 'fighter_w', 'fighter_l', 'fighter_d']
+
+#Scrapes every fighter row of a parsed listing page (First, Last, Nickname, Ht., Wt., Reach, Stance, W, L, D, Belt)
+#The listing has no date of birth or no contest count, so they are left missing
+def parse_listing(listing_soup):
+    listed = []
+    for row in listing_soup.select('tr.b-statistics__table-row'):
+        links = row.select('a')
+        cells = [cell.text.strip() for cell in row.select('td')]
+        name = (cells[0] + ' ' + cells[1]).split() if len(cells) >= 10 else []
+        if not links or not name:
+            continue
+        listed.append(records.Fighter.from_row([name[0],
+                                                parse_l_name(name).strip(),
+                                                cells[2] or 'NULL',
+                                                height_to_cm(cells[3]),
+                                                weight_to_lbs(cells[4]),
+                                                reach_to_cm(cells[5]),
+                                                cells[6],
+                                                'NULL',
+                                                cells[7],
+                                                cells[8],
+                                                cells[9],
+                                                'NULL',
+                                                links[0].get('href')]))
+    return listed
+
+#Scrapes fighters from the 26 alphabetical listing pages instead of one profile page per fighter
+#With fetch_profiles, profile pages are only fetched for fighters that are new or whose listing columns changed,
+#for the date of birth and no contest count the listing lacks. Changed fighters are updated in place
+def scrape_fighter_listings(fetch_profiles=True):
+
+    logger.info('Scraping fighters from the fighter listing pages')
+    session = get_urls.create_session()
+
+    #The listing pages are cached by get_urls.get_fighter_urls, so this usually needs no requests
+    listed = {}
+    for letter in ascii_lowercase:
+        try:
+            response = cache.get(session, f'{get_urls.SITE_URL}/statistics/fighters?char={letter}&page=all', timeout=30)
+            for fighter in parse_listing(parsing.parse_html(response.text)):
+                listed.setdefault(fighter.fighter_url, fighter)
+        except requests.RequestException as e:
+            logger.error(f'Error requesting fighters page for letter {letter}: {e}')
+            continue
+        except Exception as e:
+            logger.error(f'Error processing fighters page for letter {letter}: {e}')
+            continue
+    logger.info(f'Found {len(listed)} fighters on the listing pages')
+
+    stored = storage.stored_values('fighters', LISTING_COLUMNS)
+    new_urls = [url for url in listed if url not in stored]
+    changed_urls = [fighter.fighter_url for fighter in storage.changed_records('fighters', listed.values(), stored)]
+    logger.info(f'Found {len(new_urls)} new and {len(changed_urls)} changed fighters')
+
+    profiles = {}
+    if fetch_profiles:
+        for url, fighter, error in fetcher.scrape_urls(new_urls + changed_urls, parse_fighter):
+            if isinstance(error, requests.RequestException):
+                logger.error(f"Request error for fighter: {url} - {error}")
+                continue
+            elif error is not None:
+                logger.error(f"Unexpected error scraping fighter: {url} - {error}")
+                continue
+            profiles[url] = fighter
+
+    #Fighters without a profile page keep the listing columns, and changed ones their stored date of birth
+    if new_urls:
+        with storage.open_table('fighters', create_csv) as writer:
+            writer.writerows(profiles.get(url, listed[url]) for url in new_urls)
+    storage.update_rows('fighters', [profiles[url] for url in changed_urls if url in profiles], storage.TABLES['fighters'][1])
+    storage.update_rows('fighters', [listed[url] for url in changed_urls if url not in profiles], LISTING_COLUMNS)
+
+    logger.info(f'{len(new_urls)} fighters added and {len(changed_urls)} updated, '
+                f'{len(profiles)} profile pages fetched for {len(listed)} fighters')
+
+#Journal of fighters waiting for a refresh, or None when REFRESH is off
+def open_refresh_journal():
+    if REFRESH:
+        return journal.Journal('fighters_to_refresh')
+    return contextlib.nullcontext()
+
+#Queues both fighters of a newly scraped fight, with the time it was scraped
+def queue_refresh(refresh_journal, fight):
+    if refresh_journal is None:
+        return
+    for url in (fight.f_1_url, fight.f_2_url):
+        if url is not None:
+            refresh_journal.append(url, time.time())
+
+#Updates the refresh columns of stored fighters whose profile changed, given their stored_values for REFRESH_COLUMNS
+#Values are compared typed, so a row written by pandas (155.0, blanks) is not changed. Returns the fighters updated
+def update_changed(profiles, stored):
+    changed = storage.changed_records('fighters', profiles, stored)
+    storage.update_rows('fighters', changed, REFRESH_COLUMNS)
+    return changed
+
+#Re-fetches the profiles of fighters queued by newly scraped fights and updates their rows in place
+#Profiles fetched after the fight was scraped already include it, e.g. fighters scraped for the first time in the
+#same run, and fighters not stored yet are left to scrape_fighters(), so usually only a few dozen pages per event
+#are fetched. Pages are revalidated with the server even if cached, an unchanged profile costs a 304
+def refresh_fighters():
+    refresh_journal = journal.Journal('fighters_to_refresh')
+    queued = refresh_journal.load()
+    if not queued:
+        logger.info('No fighters to refresh')
+        return
+
+    stored = storage.stored_values('fighters', REFRESH_COLUMNS)
+    urls = []
+    for url, queued_at in queued.items():
+        _, meta = cache.load(url) if cache.ENABLED else (None, None)
+        if url in stored and (meta is None or meta.get('fetched_at', 0) < queued_at):
+            urls.append(url)
+    logger.info(f'Refreshing {len(urls)} of {len(queued)} fighters from newly scraped fights')
+
+    refreshed, failed = [], []
+    for url, fighter, error in fetcher.scrape_urls(urls, parse_fighter, revalidate=True):
+        if isinstance(error, requests.RequestException):
+            logger.error(f"Request error for fighter: {url} - {error}")
+            failed.append(url)
+            continue
+        elif error is not None:
+            logger.error(f"Unexpected error scraping fighter: {url} - {error}")
+            failed.append(url)
+            continue
+        refreshed.append(fighter)
+
+    refreshed = update_changed(refreshed, stored)
+
+    #Fighters that could not be fetched stay queued for the next run
+    refresh_journal.remove()
+    with refresh_journal:
+        for url in failed:
+            refresh_journal.append(url, queued[url])
+    logger.info(f'{len(refreshed)} of {len(urls)} refreshed fighters changed, {len(failed)} left for the next run')
+
 #Scrapes details of each UFC fighter appends to CSV file 'ufc_fighter_data'
 def scrape_fighters():
     
@@ -140,69 +323,31 @@ def scrape_fighters():
 
     else:
 
-        create_csv()
-
         urls_scraped = 0
         
         logger.info(f'Starting to scrape {urls_to_scrape} fighter URLs...')
 
-        with open(file_path + '/' + 'ufc_fighter_data.csv', 'a+') as ufc_fighters:
-            writer = csv.writer(ufc_fighters)
-
-            #Iterates through each url and scrapes key details
-            for i, url in enumerate(fighter_urls, 1):
-                try:
-                    logger.debug(f'Processing fighter {i}/{urls_to_scrape}: {url}')
-                    fighter_url = requests.get(url)
-                    fighter_soup = bs4.BeautifulSoup(fighter_url.text, 'lxml')
-                    
-                    name = fighter_soup.select('span')[0].text.split()
-                    nickname = fighter_soup.select('p.b-content__Nickname')[0]
-                    details = fighter_soup.select('li.b-list__box-list-item')
-                    record = fighter_soup.select('span.b-content__title-record')[0].text.split(':')[1].strip().split('-')
-
-                    fighter_f_name = name[0] 
-                    fighter_l_name = parse_l_name(name)
-                    fighter_nickname = parse_nickname(nickname)
-                    fighter_height_cm = parse_height(details[0])
-                    fighter_weight_lbs = parse_weight(details[1])
-                    fighter_reach_cm = parse_reach(details[2])
-                    fighter_stance = parse_stance(details[3])
-                    fighter_dob = parse_dob(details[4])
-                    fighter_w = record[0]
-                    fighter_l = record[1]
-                    fighter_d = record[-1][0] if len(record[-1]) > 1 else record[-1]
-                    fighter_nc_dq = record[-1].split('(')[-1][0] if len(record[-1]) > 1 else 'NULL'
-                    
-
-                    #Adds new row to csv file
-                    writer.writerow([fighter_f_name.strip(), 
-                                     fighter_l_name.strip(), 
-                                     fighter_nickname,
-                                     fighter_height_cm,
-                                     fighter_weight_lbs,
-                                     fighter_reach_cm,
-                                     fighter_stance,
-                                     fighter_dob[0:10],
-                                     fighter_w,
-                                     fighter_l,
-                                     fighter_d,
-                                     fighter_nc_dq,
-                                     url])
-                    
-                    urls_scraped += 1
-                    logger.debug(f'Successfully scraped fighter from: {url}')
-                    
-                except IndexError as e:
-                    logger.error(f"IndexError scraping fighter page: {url} - {e}")
+        with storage.open_table('fighters', create_csv) as writer:
+
+            #Fetches fighter pages concurrently and writes rows back in url order
+            for i, (url, row, error) in enumerate(fetcher.scrape_urls(fighter_urls, parse_fighter), 1):
+                logger.debug(f'Processing fighter {i}/{urls_to_scrape}: {url}')
+                if isinstance(error, IndexError):
+                    logger.error(f"IndexError scraping fighter page: {url} - {error}")
                     continue
-                except requests.RequestException as e:
-                    logger.error(f"Request error for fighter: {url} - {e}")
+                elif isinstance(error, requests.RequestException):
+                    logger.error(f"Request error for fighter: {url} - {error}")
                     continue
-                except Exception as e:
-                    logger.error(f"Unexpected error scraping fighter: {url} - {e}")
+                elif error is not None:
+                    logger.error(f"Unexpected error scraping fighter: {url} - {error}")
                     continue
 
+                #Adds new row to the fighters table
+                writer.writerow(row)
+                
+                urls_scraped += 1
+                logger.debug(f'Successfully scraped fighter from: {url}')
+
 
         logger.info(f'{urls_scraped}/{urls_to_scrape} fighters successfully scraped')
 
@@ -0,0 +1,137 @@
+#Import libraries for web-scraping and saving to CSV file.
+import requests
+import csv
+import os
+import logging
+from scraper import deadletter, fetcher, fighters, fights, fightstats, records, roundstats, storage
+
+logger = logging.getLogger(__name__)
+
+#Define paths for url folder and scraped files folder
+url_path = os.getcwd() + '/urls'
+file_path = os.getcwd() + '/scraped_files'
+
+#Urls already scraped into a fight page table, for round stats including fights without a round by round breakdown
+def scraped_urls(table):
+    if table == 'round_stats':
+        return roundstats.scraped_urls()
+    return storage.scraped_urls(table)
+
+#Runs the extractor of each table in tables on the same parsed fight page
+#Every extractor runs before anything is written, so a failure leaves no file half-written
+#Round stats come from tables of their own, so if they fail the fight and its stats are still returned, along with
+#the round stats error for write_tables to put the page in the dead-letter store
+#round_rows is None unless round stats were scraped, and the fight is flagged with whether it has a breakdown
+def parse_tables(fight_soup,url,tables):
+    fight_row = fights.parse_fight(fight_soup,url) if 'fights' in tables else None
+    stat_rows = fightstats.parse_fight_stats(fight_soup,url) if 'fight_stats' in tables else []
+    round_rows, round_error = None, None
+    if 'round_stats' in tables:
+        try:
+            round_rows = roundstats.parse_round_stats(fight_soup,url)
+        except Exception as e:
+            round_error = e
+        if fight_row is not None and round_rows is not None:
+            fight_row.round_breakdown = 'T' if round_rows else 'F'
+    return fight_row, stat_rows, round_rows, round_error
+
+#Writes the rows parse_tables scraped from a fight page to the fights, fight stats and round stats writers
+#Fights stored earlier that turn out to have no round by round breakdown are added to no_breakdown, to be flagged
+#with flag_no_breakdown once the writers are closed
+#A page whose round stats failed goes to the dead-letter store, once the fetcher has resolved it for the other tables,
+#so --retry-failed scrapes just its round stats again. Returns False if the round stats failed
+def write_tables(writers, refresh_journal, url, rows, no_breakdown):
+    fight_writer, stat_writer, round_writer = writers
+    fight_row, stat_rows, round_rows, round_error = rows
+    if fight_row is not None:
+        fight_writer.writerow(fight_row)
+        fighters.queue_refresh(refresh_journal, fight_row)
+    elif round_rows == []:
+        no_breakdown.append(url)
+    stat_writer.writerows(stat_rows)
+    round_writer.writerows(round_rows or [])
+    if round_error is not None:
+        logger.error(f'Error processing round stats of fight URL {url}: {round_error}')
+        deadletter.record_failure(url, round_error)
+        return False
+    return True
+
+#Flags stored fights as having no round by round breakdown, so their pages are not fetched again for round stats
+#Updating a csv file rewrites it, so this runs once the table's writer is closed
+def flag_no_breakdown(urls):
+    flagged = []
+    for url in urls:
+        values = dict.fromkeys(name for name, _ in records.Fight.columns())
+        values.update(fight_url=url, round_breakdown='F')
+        flagged.append(records.Fight(**values))
+    storage.update_rows('fights', flagged, ['round_breakdown'], relink=False)
+
+#Fetches each fight page once and scrapes 'ufc_fight_data.csv', 'ufc_fight_stat_data.csv' and 'ufc_round_stat_data.csv' from it
+def scrape_fight_pages():
+
+    #Get fight URLs from file
+    if 'fight_urls.csv' in os.listdir(url_path):
+        with open(url_path + '/' + 'fight_urls.csv','r') as fight_csv:
+            reader = csv.reader(fight_csv)
+            fight_urls = [row[0] for row in reader]
+        logger.info(f'Loaded {len(fight_urls)} fight URLs from file')
+    else:
+        logger.error("Missing file: fight_urls.csv - try running 'get_urls.get_fight_urls()'")
+        return
+
+    #Each output file is deduplicated on its own so a page is only fetched if either table is missing it
+    new_fight_urls = list(fight_urls)
+    fights.filter_duplicate_urls(new_fight_urls)
+    new_fight_urls = set(new_fight_urls)
+
+    new_stat_urls = list(fight_urls)
+    fightstats.filter_duplicate_urls(new_stat_urls)
+    new_stat_urls = set(new_stat_urls)
+
+    new_round_urls = list(fight_urls)
+    roundstats.filter_duplicate_urls(new_round_urls)
+    new_round_urls = set(new_round_urls)
+
+    fight_urls = [url for url in fight_urls if url in new_fight_urls or url in new_stat_urls or url in new_round_urls]
+
+    urls_to_scrape = len(fight_urls)
+    logger.info(f'Found {urls_to_scrape} new fight pages to scrape')
+
+    if urls_to_scrape == 0:
+        logger.info('Fight, fight stats and round stats data already scraped')
+        return
+
+    #Only the tables still missing the page are extracted
+    def parse_fight_page(fight_soup,url):
+        tables = {table for table, new_urls in (('fights', new_fight_urls),
+                                                 ('fight_stats', new_stat_urls),
+                                                 ('round_stats', new_round_urls)) if url in new_urls}
+        return parse_tables(fight_soup,url,tables)
+
+    logger.info(f'Starting to scrape {urls_to_scrape} fight pages...')
+    urls_scraped = 0
+    no_breakdown = []
+
+    with storage.open_table('fights', fights.create_csv_file) as fight_writer, \
+         storage.open_table('fight_stats', fightstats.create_csv_file) as stat_writer, \
+         storage.open_table('round_stats', roundstats.create_csv_file) as round_writer, \
+         fighters.open_refresh_journal() as refresh_journal:
+
+        #Fetches fight pages concurrently and writes rows back in url order
+        for i, (url, rows, error) in enumerate(fetcher.scrape_urls(fight_urls, parse_fight_page), 1):
+            logger.debug(f'Processing fight page {i}/{urls_to_scrape}: {url}')
+            if isinstance(error, requests.RequestException):
+                logger.error(f'Request error for fight URL {url}: {error}')
+                continue
+            elif error is not None:
+                logger.error(f'Error processing fight URL {url}: {error}')
+                continue
+
+            write_tables((fight_writer, stat_writer, round_writer), refresh_journal, url, rows, no_breakdown)
+
+            urls_scraped += 1
+            logger.debug(f'Successfully scraped fight page: {url}')
+
+    flag_no_breakdown(no_breakdown)
+
+    logger.info(f'{urls_scraped}/{urls_to_scrape} fight pages scraped successfully')
@@ -1,10 +1,10 @@
 #Import libraries for web-scraping and saving to CSV file.
 import requests
-import bs4
 import re
 import csv
 import os
 import logging
+from scraper import fetcher, records, storage
 
 logger = logging.getLogger(__name__)
 
@@ -31,22 +31,19 @@ def create_csv_file():
                              'result_details', 
                              'finish_round', 
                              'finish_time', 
-                             'fight_url'])
+                             'fight_url',
+                             'f_1_url',
+                             'f_2_url',
+                             'winner_url',
+                             'round_breakdown'])
         logger.info('New File Created - ufc_fight_data.csv')
     else:
         logger.info('Scraping to Existing File - ufc_fight_data.csv')
 
 #Ensure each url is only scraped once when script is run multiple times
 def filter_duplicate_urls(fight_urls):
-    if 'ufc_fight_data.csv' in os.listdir(file_path):
-        with open(file_path + '/' + 'ufc_fight_data.csv','r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            scraped_fight_urls = [row['fight_url'] for row in reader]
-            
-            #Removes previously scraped urls from fight_urls
-            for url in scraped_fight_urls:
-                if url in fight_urls:
-                    fight_urls.remove(url)
+    #Removes previously scraped urls, keeping the original order of fight_urls
+    fight_urls[:] = storage.filter_new_urls('fights', fight_urls)
 
 #Scrape referee name
 def get_referee(overview):
@@ -62,6 +59,14 @@ def get_fighters(fight_details,fight_soup):
     except:
         return fight_soup.select('a.b-fight-details__person-link')[0].text, fight_soup.select('a.b-fight-details__person-link')[1].text
 
+#Scrape profile urls of both fighters, which identify them where names can be shared or misspelt
+def get_fighter_urls(fight_soup):
+    try:
+        person_links = fight_soup.select('a.b-fight-details__person-link')
+        return person_links[0].get('href').strip(), person_links[1].get('href').strip()
+    except:
+        return 'NULL', 'NULL'
+
 #Scrape name of winner 
 def get_winner(win_lose):
     #If there is a winner, set 'winner' to winning fighter. If no winner (e.g. NC, DQ) set 'winner' to NULL
@@ -114,6 +119,57 @@ def get_result(select_result,select_result_details):
     else:
         return select_result[0].text.split(':')[1], select_result_details[1].text.split(':')[-1]
 
+#Scrapes fight details from a parsed fight page and returns them as a typed record
+#round_breakdown is left missing, fightpages.parse_tables sets it when it scrapes the round stats too
+def parse_fight(fight_soup,url):
+
+    #Define key select statements
+    overview = fight_soup.select('i.b-fight-details__text-item')
+    select_result = fight_soup.select('i.b-fight-details__text-item_first')
+    select_result_details = fight_soup.select('p.b-fight-details__text')
+    fight_details = fight_soup.select('p.b-fight-details__table-text')
+    fight_type = fight_soup.select('i.b-fight-details__fight-title')
+    win_lose = fight_soup.select('i.b-fight-details__person-status')
+
+    #Scrape fight details
+    event_name = fight_soup.select('h2')[0].text
+    referee = get_referee(overview)
+    f_1,f_2 = get_fighters(fight_details,fight_soup)
+    f_1_url,f_2_url = get_fighter_urls(fight_soup)
+    num_rounds = overview[2].text.split(':')[1].strip()[0]
+    title_fight = get_title_fight(fight_type)
+    weight_class = get_weight_class(fight_type)
+    gender = get_gender(fight_type)  
+    result,result_details = get_result(select_result,select_result_details)
+    finish_round = overview[0].text.split(':')[1]
+    finish_time = re.findall(r'\d:\d\d',overview[1].text)[0]
+    if (win_lose[0].text.strip()=='W') | (win_lose[1].text.strip()=='W'):
+        if (win_lose[0].text.strip()=='W'):
+            winner, winner_url = f_1, f_1_url
+        else:
+            winner, winner_url = f_2, f_2_url
+    else:
+        winner, winner_url = 'NULL', 'NULL'
+
+    return records.Fight.from_row([event_name.strip(),
+                                   referee.strip(), 
+                                   f_1.strip(), 
+                                   f_2.strip(), 
+                                   winner.strip(), 
+                                   num_rounds.strip(), 
+                                   title_fight,
+                                   weight_class, 
+                                   gender,
+                                   result.strip(), 
+                                   result_details.strip(), 
+                                   finish_round.strip(), 
+                                   finish_time.strip(), 
+                                   url,
+                                   f_1_url,
+                                   f_2_url,
+                                   winner_url,
+                                   'NULL'])
+
 #Scrapes details of each UFC fight and appends to file 'ufc_fight_data.csv'
 def scrape_fights():
     
@@ -136,71 +192,25 @@ def scrape_fights():
         logger.info('Fight data already scraped')
         
     else:
-        create_csv_file()
-
         logger.info(f'Starting to scrape {urls_to_scrape} fights...')
         urls_scraped = 0
     
-        with open(file_path + '/' + 'ufc_fight_data.csv','a+') as csv_file:
-            writer = csv.writer(csv_file)
+        with storage.open_table('fights', create_csv_file) as writer:
         
-            for i, url in enumerate(fight_urls, 1):
-                try:
-                    logger.debug(f'Processing fight {i}/{urls_to_scrape}: {url}')
-                    fight_url = requests.get(url)
-                    fight_soup = bs4.BeautifulSoup(fight_url.text,'lxml')
-
-                    #Define key select statements
-                    overview = fight_soup.select('i.b-fight-details__text-item')
-                    select_result = fight_soup.select('i.b-fight-details__text-item_first')
-                    select_result_details = fight_soup.select('p.b-fight-details__text')
-                    fight_details = fight_soup.select('p.b-fight-details__table-text')
-                    fight_type = fight_soup.select('i.b-fight-details__fight-title')
-                    win_lose = fight_soup.select('i.b-fight-details__person-status')
-
-                    #Scrape fight details
-                    event_name = fight_soup.h2.text
-                    referee = get_referee(overview)
-                    f_1,f_2 = get_fighters(fight_details,fight_soup)
-                    num_rounds = overview[2].text.split(':')[1].strip()[0]
-                    title_fight = get_title_fight(fight_type)
-                    weight_class = get_weight_class(fight_type)
-                    gender = get_gender(fight_type)  
-                    result,result_details = get_result(select_result,select_result_details)
-                    finish_round = overview[0].text.split(':')[1]
-                    finish_time = re.findall(r'\d:\d\d',overview[1].text)[0]
-                    if (win_lose[0].text.strip()=='W') | (win_lose[1].text.strip()=='W'):
-                        if (win_lose[0].text.strip()=='W'):
-                            winner = f_1
-                        else:
-                            winner = f_2
-                    else:
-                        winner = 'NULL'
-
-                    #Adds row containing scraped fight details to csv file
-                    writer.writerow([event_name.strip(),
-                                     referee.strip(), 
-                                     f_1.strip(), 
-                                     f_2.strip(), 
-                                     winner.strip(), 
-                                     num_rounds.strip(), 
-                                     title_fight,
-                                     weight_class, 
-                                     gender,
-                                     result.strip(), 
-                                     result_details.strip(), 
-                                     finish_round.strip(), 
-                                     finish_time.strip(), 
-                                     url])
-                    
-                    urls_scraped += 1
-                    logger.debug(f'Successfully scraped fight: {f_1.strip()} vs {f_2.strip()}')
-                    
-                except requests.RequestException as e:
-                    logger.error(f'Request error for fight URL {url}: {e}')
+            #Fetches fight pages concurrently and writes rows back in url order
+            for i, (url, row, error) in enumerate(fetcher.scrape_urls(fight_urls, parse_fight), 1):
+                logger.debug(f'Processing fight {i}/{urls_to_scrape}: {url}')
+                if isinstance(error, requests.RequestException):
+                    logger.error(f'Request error for fight URL {url}: {error}')
                     continue
-                except Exception as e:
-                    logger.error(f'Error processing fight URL {url}: {e}')
+                elif error is not None:
+                    logger.error(f'Error processing fight URL {url}: {error}')
                     continue
+
+                #Adds row containing scraped fight details to csv file
+                writer.writerow(row)
+                
+                urls_scraped += 1
+                logger.debug(f'Successfully scraped fight: {row.f_1} vs {row.f_2}')
         
         logger.info(f'{urls_scraped}/{urls_to_scrape} fight links scraped successfully')
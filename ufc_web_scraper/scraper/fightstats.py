@@ -1,10 +1,10 @@
 #Import libraries for web-scraping and saving to CSV file.
 import requests
-import bs4
 import re
 import csv
 import os
 import logging
+from scraper import fetcher, records, storage
 
 logger = logging.getLogger(__name__)
 
@@ -13,13 +13,8 @@ url_path = os.getcwd() + '/urls'
 file_path = os.getcwd() + '/scraped_files'
 
 def filter_duplicate_urls(fight_urls):
-    if 'ufc_fight_stat_data.csv' in os.listdir(file_path):
-        with open(file_path + '/' + 'ufc_fight_stat_data.csv','r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            scraped_fight_urls = [row['fight_url'] for row in reader]
-            for url in scraped_fight_urls:
-                if url in fight_urls:
-                    fight_urls.remove(url)
+    #Removes previously scraped urls, keeping the original order of fight_urls
+    fight_urls[:] = storage.filter_new_urls('fight_stats', fight_urls)
 
 #Scrapes fighter name
 def get_fighter_id(fight_soup,fight_stats,fighter):
@@ -35,6 +30,13 @@ def get_fighter_id(fight_soup,fight_stats,fighter):
         except:
             return fight_soup.select('a.b-fight-details__person-link')[1].text
 
+#Scrapes fighter profile url
+def get_fighter_url(fight_soup,fighter):
+    try:
+        return fight_soup.select('a.b-fight-details__person-link')[fighter - 1].get('href').strip()
+    except:
+        return 'NULL'
+
 #Scrapes striking stats for specified fighter
 def get_striking_stats(fight_stats,fighter):
     if fighter == 1:
@@ -142,10 +144,9 @@ def get_grappling_stats(fight_stats,fighter):
             'NULL')
 
 
-#Scrapes details of each UFC fight and appends to file 'ufc_fight_data.csv'
-def scrape_fightstats():
-    
-    #Creates csv file for scraped data
+#Creates csv file for scraped data
+def create_csv_file():
+    #If file does not exist, create a new CSV file with column headers
     if 'ufc_fight_stat_data.csv' not in os.listdir(file_path):
         with open (file_path + '/' + 'ufc_fight_stat_data.csv','w',newline="",encoding='UTF8') as ufc_fighter_data:
             writer = csv.writer(ufc_fighter_data)
@@ -160,11 +161,80 @@ def scrape_fightstats():
                              'submission_att',
                              'reversals',
                              'ctrl_time',
-                             'fight_url'])
+                             'fight_url',
+                             'fighter_url'])
         logger.info('New File Created - ufc_fight_stat_data.csv')
     else:
         logger.info('Scraping to Existing File - ufc_fight_stat_data.csv')
 
+#Scrapes fight stats for both fighters from a parsed fight page and returns them as typed records
+def parse_fight_stats(fight_soup,url):
+
+    fight_stats = fight_soup.select('p.b-fight-details__table-text')
+    
+    #Scrape fight stats for first fighter 
+    fighter_name = get_fighter_id(fight_soup,fight_stats,1)
+    fighter_url = get_fighter_url(fight_soup,1)
+    (knockdowns,
+     total_strikes_att,
+     total_strikes_succ,
+     sig_strikes_att,
+     sig_strikes_succ) = get_striking_stats(fight_stats,1)
+    (takedown_att,
+     takedown_succ,
+     submission_att,
+     reversals,
+     ctrl_time) = get_grappling_stats(fight_stats,1)
+
+    #Fight stats row for first fighter
+    fighter_1_row = [fighter_name.strip(),
+                     knockdowns.strip(),
+                     total_strikes_att.strip(),
+                     total_strikes_succ.strip(),
+                     sig_strikes_att.strip(),
+                     sig_strikes_succ.strip(),
+                     takedown_att.strip(),
+                     takedown_succ.strip(),
+                     submission_att.strip(),
+                     reversals.strip(),
+                     ctrl_time.strip(),
+                     url,
+                     fighter_url]
+
+    #Scrape fight stats for second fighter 
+    fighter_name = get_fighter_id(fight_soup,fight_stats,2)
+    fighter_url = get_fighter_url(fight_soup,2)
+    (knockdowns,
+     total_strikes_att,
+     total_strikes_succ,
+     sig_strikes_att,
+     sig_strikes_succ) = get_striking_stats(fight_stats,2)
+    (takedown_att,
+     takedown_succ,
+     submission_att,
+     reversals,
+     ctrl_time) = get_grappling_stats(fight_stats,2)
+
+    #Fight stats row for second fighter
+    fighter_2_row = [fighter_name.strip(),
+                     knockdowns.strip(),
+                     total_strikes_att.strip(),
+                     total_strikes_succ.strip(),
+                     sig_strikes_att.strip(),
+                     sig_strikes_succ.strip(),
+                     takedown_att.strip(),
+                     takedown_succ.strip(),
+                     submission_att.strip(),
+                     reversals.strip(),
+                     ctrl_time.strip(),
+                     url,
+                     fighter_url]
+
+    return [records.FightStat.from_row(fighter_1_row), records.FightStat.from_row(fighter_2_row)]
+
+#Scrapes stats of each UFC fight and appends to file 'ufc_fight_stat_data.csv'
+def scrape_fightstats():
+
     #Get fight URLs from file
     if 'fight_urls.csv' in os.listdir(url_path):
         with open(url_path + '/' + 'fight_urls.csv','r') as fight_csv:
@@ -188,82 +258,23 @@ def scrape_fightstats():
     logger.info(f'Starting to scrape {urls_to_scrape} fight URLs...')
     urls_scraped = 0
     
-    with open(file_path + '/' + 'ufc_fight_stat_data.csv','a+') as csv_file:
-        writer = csv.writer(csv_file)
+    with storage.open_table('fight_stats', create_csv_file) as writer:
     
-        #Iterate through each fight_url to scrape fight stats
-        for i, url in enumerate(fight_urls, 1):
-            try:
-                logger.debug(f'Processing fight {i}/{urls_to_scrape}: {url}')
-                fight_url = requests.get(url)
-                fight_soup = bs4.BeautifulSoup(fight_url.text,'lxml')
-                
-                fight_stats = fight_soup.select('p.b-fight-details__table-text')
-                
-                #Scrape fight stats for first fighter 
-                fighter_name = get_fighter_id(fight_soup,fight_stats,1)
-                (knockdowns,
-                 total_strikes_att,
-                 total_strikes_succ,
-                 sig_strikes_att,
-                 sig_strikes_succ) = get_striking_stats(fight_stats,1)
-                (takedown_att,
-                 takedown_succ,
-                 submission_att,
-                 reversals,
-                 ctrl_time) = get_grappling_stats(fight_stats,1)
-
-                
-                #Add fight stats for first fighter to csv
-                writer.writerow([fighter_name.strip(),
-                                knockdowns.strip(),
-                                total_strikes_att.strip(),
-                                total_strikes_succ.strip(),
-                                sig_strikes_att.strip(),
-                                sig_strikes_succ.strip(),
-                                takedown_att.strip(),
-                                takedown_succ.strip(),
-                                submission_att.strip(),
-                                reversals.strip(),
-                                ctrl_time.strip(),
-                                url])
-
-                #Scrape fight stats for second fighter 
-                fighter_name = get_fighter_id(fight_soup,fight_stats,2)
-                (knockdowns,
-                 total_strikes_att,
-                 total_strikes_succ,
-                 sig_strikes_att,
-                 sig_strikes_succ) = get_striking_stats(fight_stats,2)
-                (takedown_att,
-                 takedown_succ,
-                 submission_att,
-                 reversals,
-                 ctrl_time) = get_grappling_stats(fight_stats,2)
-
-                #Add fight stats for second fighter to csv
-                writer.writerow([fighter_name.strip(),
-                                knockdowns.strip(),
-                                total_strikes_att.strip(),
-                                total_strikes_succ.strip(),
-                                sig_strikes_att.strip(),
-                                sig_strikes_succ.strip(),
-                                takedown_att.strip(),
-                                takedown_succ.strip(),
-                                submission_att.strip(),
-                                reversals.strip(),
-                                ctrl_time.strip(),
-                                url])
-                
-                urls_scraped += 1
-                logger.debug(f'Successfully scraped fight stats from: {url}')
-                
-            except requests.RequestException as e:
-                logger.error(f"Request error for fight: {url} - {e}")
+        #Fetches fight pages concurrently and writes rows back in url order
+        for i, (url, rows, error) in enumerate(fetcher.scrape_urls(fight_urls, parse_fight_stats), 1):
+            logger.debug(f'Processing fight {i}/{urls_to_scrape}: {url}')
+            if isinstance(error, requests.RequestException):
+                logger.error(f"Request error for fight: {url} - {error}")
                 continue
-            except Exception as e:
-                logger.error(f"Unexpected error scraping fight: {url} - {e}")
+            elif error is not None:
+                logger.error(f"Unexpected error scraping fight: {url} - {error}")
                 continue
+
+            #Add fight stats for both fighters to csv
+            writer.writerows(rows)
+            
+            urls_scraped += 1
+            logger.debug(f'Successfully scraped fight stats from: {url}')
         
     logger.info(f'{urls_scraped}/{urls_to_scrape} fights successfully scraped')
 
@@ -0,0 +1,73 @@
+#Import libraries for scraping fight summaries from event pages and saving to CSV file.
+import csv
+import os
+import logging
+from scraper import records
+
+logger = logging.getLogger(__name__)
+
+#Define path for scraped files folder
+file_path = os.getcwd() + '/scraped_files'
+
+#Creates csv file for scraped data
+def create_csv_file():
+    #If file does not exist, create a new CSV file with column headers
+    if 'ufc_fight_summary_data.csv' not in os.listdir(file_path):
+        with open(file_path + '/' + 'ufc_fight_summary_data.csv','w',newline='',encoding='UTF8') as ufc_fight_summary_data:
+            writer = csv.writer(ufc_fight_summary_data)
+            writer.writerow([name for name, _ in records.FightSummary.columns()])
+        logger.info('New File Created - ufc_fight_summary_data.csv')
+    else:
+        logger.info('Scraping to Existing File - ufc_fight_summary_data.csv')
+
+#Text of the fighter 1 and fighter 2 lines of a cell, with NULL for a missing line
+def get_pair(cell):
+    lines = [p.text.strip() for p in cell.select('p')]
+    lines += ['NULL'] * (2 - len(lines))
+    return lines[0], lines[1]
+
+#Scrapes a summary of every bout on a parsed event page, which lists the fighters, the winner, knockdowns,
+#significant strikes, takedowns and submission attempts of each fighter, the weight class, method, round and time
+#Returns a typed record per bout, in the order of the event page
+def parse_fight_summaries(event_soup,url):
+    summaries = []
+    for row in event_soup.select('tr.b-fight-details__table-row'):
+        cells = row.select('td')
+        flags = [flag.text.strip() for flag in row.select('a.b-flag')]
+        fighter_links = cells[1].select('a') if len(cells) >= 10 else []
+        if not flags or len(fighter_links) < 2:
+            continue
+
+        fight_url = row.select('a.b-flag')[0].get('href')
+        f_1, f_2 = fighter_links[0].text.strip(), fighter_links[1].text.strip()
+        f_1_url, f_2_url = fighter_links[0].get('href').strip(), fighter_links[1].get('href').strip()
+
+        #The winner is listed first with a single 'win' flag, draws and no contests flag both fighters
+        if flags[0] == 'win':
+            winner, winner_url = f_1, f_1_url
+        else:
+            winner, winner_url = 'NULL', 'NULL'
+
+        #Title fights have a belt image under the weight class
+        title_fight = 'T' if cells[6].select('img.b-fight-details__fight-title-img') else 'F'
+        method, method_details = get_pair(cells[7])
+
+        summaries.append(records.FightSummary.from_row([url,
+                                                        fight_url,
+                                                        f_1,
+                                                        f_2,
+                                                        winner,
+                                                        *get_pair(cells[2]),
+                                                        *get_pair(cells[3]),
+                                                        *get_pair(cells[4]),
+                                                        *get_pair(cells[5]),
+                                                        get_pair(cells[6])[0],
+                                                        title_fight,
+                                                        method,
+                                                        method_details or 'NULL',
+                                                        get_pair(cells[8])[0],
+                                                        get_pair(cells[9])[0],
+                                                        f_1_url,
+                                                        f_2_url,
+                                                        winner_url]))
+    return summaries
@@ -1,24 +1,101 @@
 #Import libraries for web-scraping and saving to CSV file
 import requests
-import bs4
+import contextlib
 import csv
 import os
 import time
 import logging
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from scraper import cache, fightsummaries, journal, metrics, parsing, ratelimit, storage
 
 logger = logging.getLogger(__name__)
 
+#Site the scraped urls belong to, urls are always stored with this base whichever server pages are fetched from
+SITE_URL = 'http://ufcstats.com'
+
+#Server requests are sent to, e.g. http://127.0.0.1:8000 for the local mock in benchmarks/mock_server.py
+BASE_URL = SITE_URL
+
+#Url a page is requested from, with the site's base swapped for BASE_URL
+def request_url(url):
+    if BASE_URL != SITE_URL and url.startswith(SITE_URL):
+        return BASE_URL + url[len(SITE_URL):]
+    return url
+
+#Times a request is sent again after a 429, once the limiter has slowed down
+RATE_LIMIT_RETRIES = 3
+
+#Set to True to also write a summary of every bout (ufc_fight_summary_data.csv) from the event pages fetched for fight URLs
+SUMMARIES = False
+
+#Writer for the fight summaries table, or None when SUMMARIES is off
+def open_summaries():
+    if SUMMARIES:
+        return storage.open_table('fight_summaries', fightsummaries.create_csv_file)
+    return contextlib.nullcontext()
+
+#Writes the summaries of the bouts on an event page that are not in the table yet
+def write_summaries(summary_writer, event_soup, url, summarised):
+    for summary in fightsummaries.parse_fight_summaries(event_soup, url):
+        if summary.fight_url not in summarised:
+            summary_writer.writerow(summary)
+            summarised.add(summary.fight_url)
+
+#Session that paces every request with the shared adaptive rate limiter and reports each response back to it
+#429s are handled here rather than by urllib3, so Retry-After pauses every worker and not just the one that got it
+class ThrottledSession(requests.Session):
+
+    def request(self, method, url, *args, **kwargs):
+        url_type = cache.page_type(url)
+        url = request_url(url)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            ratelimit.limiter.wait()
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.RequestException as e:
+                metrics.inc('request_errors_total', page_type=url_type, error=type(e).__name__)
+                ratelimit.limiter.record(None)
+                raise
+            latency = time.perf_counter() - start
+
+            #Connection errors and 5xx responses urllib3 already retried
+            retries = getattr(response.raw, 'retries', None)
+            retried_statuses = [retry.status for retry in retries.history] if retries is not None else []
+
+            metrics.observe('request_seconds', latency, page_type=url_type)
+            metrics.inc('requests_total', page_type=url_type, status=response.status_code)
+            metrics.inc('bytes_downloaded_total', len(response.content), page_type=url_type)
+            if retried_statuses:
+                metrics.inc('retries_total', len(retried_statuses), page_type=url_type)
+
+            retry_after = None
+            if response.status_code in (429, 503):
+                retry_after = ratelimit.parse_retry_after(response.headers.get('Retry-After'))
+            ratelimit.limiter.record(response.status_code, latency, retried_statuses, retry_after)
+
+            if response.status_code != 429:
+                return response
+            metrics.inc('rate_limited_total', page_type=url_type)
+            if attempt == RATE_LIMIT_RETRIES:
+                return response
+            metrics.inc('retries_total', page_type=url_type)
+            logger.debug(f'Rate limited, retrying: {url}')
+
 # Configure session with retry strategy
-def create_session():
-    session = requests.Session()
+def create_session(pool_size=10):
+    session = ThrottledSession()
+    #429 and Retry-After are left to ThrottledSession
     retry_strategy = Retry(
         total=3,
         backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=[500, 502, 503, 504],
+        respect_retry_after_header=False,
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy,
+                          pool_connections=pool_size,
+                          pool_maxsize=pool_size)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
@@ -38,66 +115,42 @@ def write_urls_to_csv(file_name, urls):
     
     logger.info(f'Saved {len(urls)} URLs to {file_name}')
 
-# Helper function to save progress checkpoint
-def save_checkpoint(file_name, urls, current_index):
-    #Create a new directory for checkpoints
-    os.makedirs('checkpoints',exist_ok=True)
-    checkpoint_path = os.getcwd() + '/checkpoints'
-    
-    # Save current progress
-    with open(checkpoint_path + '/' + file_name, 'w', newline='') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['current_index', 'total_urls_collected'])
-        writer.writerow([current_index, len(urls)])
-        
-    # Save collected URLs so far
-    urls_file = file_name.replace('_checkpoint.csv', '_partial.csv')
-    with open(checkpoint_path + '/' + urls_file, 'w', newline='') as csv_file:
-        writer = csv.writer(csv_file)
-        for url in urls:
-            writer.writerow([url])
-    
-    logger.info(f'Checkpoint saved: {current_index} processed, {len(urls)} URLs collected')
-
-# Helper function to load progress checkpoint
-def load_checkpoint(file_name):
-    checkpoint_path = os.getcwd() + '/checkpoints'
-    checkpoint_file = checkpoint_path + '/' + file_name
-    
-    if os.path.exists(checkpoint_file):
-        with open(checkpoint_file, 'r') as csv_file:
-            reader = csv.reader(csv_file)
-            next(reader)  # Skip header
-            row = next(reader)
-            return int(row[0]), int(row[1])
-    return 0, 0
-
-# Helper function to load partial URLs
-def load_partial_urls(file_name):
-    checkpoint_path = os.getcwd() + '/checkpoints'
-    urls_file = file_name.replace('_checkpoint.csv', '_partial.csv')
-    partial_file = checkpoint_path + '/' + urls_file
-    
-    if os.path.exists(partial_file):
-        with open(partial_file, 'r') as csv_file:
+# Helper function to read URLs from a CSV file, returning an empty list if it does not exist yet
+def read_urls_from_csv(file_name):
+    path = os.getcwd() + '/urls'
+    if os.path.exists(path + '/' + file_name):
+        with open(path + '/' + file_name, 'r') as csv_file:
             reader = csv.reader(csv_file)
             return [row[0] for row in reader]
     return []
 
+#Adds href to list if href contains a link with keyword 'event-details'
+def parse_event_urls(main_event_soup):
+    return [item.get('href') for item in  main_event_soup.select('a') 
+            if type(item.get('href')) == str 
+            and 'event-details' in item.get('href')]
+
+#Scrapes fight URLs from an event page
+def parse_fight_urls(event_soup):
+    return [item.get('href') for item in event_soup.select('a.b-flag.b-flag_style_green')]
+
+#Scrapes URLs of both fighters in each bout from an event page
+def parse_fighter_urls(event_soup):
+    return [item.get('href') for item in event_soup.select('a')
+            if type(item.get('href')) == str
+            and 'fighter-details' in item.get('href')]
+
 #Scrapes url of each UFC event from ufcstats.com
 def get_event_urls():
     
     logger.info('Starting to scrape event links from ufcstats.com')
     try:
         session = create_session()
-        main_url = session.get('http://ufcstats.com/statistics/events/completed?page=all', timeout=30)
+        main_url = cache.get(session, f'{SITE_URL}/statistics/events/completed?page=all', timeout=30)
         logger.info(f'Got response with status code: {main_url.status_code}')
-        main_event_soup = bs4.BeautifulSoup(main_url.text, 'lxml')
+        main_event_soup = parsing.parse_html(main_url.text)
         
-        #Adds href to list if href contains a link with keyword 'event-details'
-        all_event_urls = [item.get('href') for item in  main_event_soup.find_all('a') 
-                          if type(item.get('href')) == str 
-                          and 'event-details' in item.get('href')]
+        all_event_urls = parse_event_urls(main_event_soup)
         
         logger.info(f'Found {len(all_event_urls)} event URLs')
         
@@ -114,6 +167,44 @@ def get_event_urls():
         raise
     
 
+#Checkpoint files of the fight url collection before it had a journal: the number of events processed,
+#and the fight urls found on them in event order
+OLD_CHECKPOINT = 'fight_urls_checkpoint.csv'
+OLD_PARTIAL_URLS = 'fight_urls_partial.csv'
+
+#Opens the fight url journal, first importing an old checkpoint once so its events are not fetched again
+#The old checkpoint doesn't say which event each fight came from, so its fight urls are journalled with the first
+#event and none with the others, which gives the same fight_urls.csv as it is written in event order
+def open_fight_journal(event_urls):
+    fight_journal = journal.Journal('fight_urls')
+    checkpoint_path = os.path.join(journal.journal_path, OLD_CHECKPOINT)
+    partial_path = os.path.join(journal.journal_path, OLD_PARTIAL_URLS)
+    if not os.path.exists(checkpoint_path):
+        return fight_journal
+
+    if not os.path.exists(fight_journal.path):
+        try:
+            with open(checkpoint_path, 'r') as checkpoint_csv:
+                rows = list(csv.reader(checkpoint_csv))
+            events_done = int(rows[1][0]) if len(rows) > 1 else 0
+            fight_urls = []
+            if os.path.exists(partial_path):
+                with open(partial_path, 'r') as partial_csv:
+                    fight_urls = [row[0] for row in csv.reader(partial_csv) if row]
+        except (OSError, ValueError, IndexError) as e:
+            logger.error(f'Could not import {OLD_CHECKPOINT}, events will be fetched again: {e}')
+            return fight_journal
+        with fight_journal:
+            for i, url in enumerate(event_urls[:events_done]):
+                fight_journal.append(url, fight_urls if i == 0 else [])
+        logger.info(f'Imported {min(events_done, len(event_urls))} processed events and {len(fight_urls)} fight URLs '
+                    f'from {OLD_CHECKPOINT}')
+
+    for path in (checkpoint_path, partial_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return fight_journal
+
 #Scrapes url of each UFC fight from ufcstats.com 
 def get_fight_urls():
 
@@ -132,52 +223,56 @@ def get_fight_urls():
     logger.info('Starting to scrape fight links from ufcstats.com')
     session = create_session()
 
-    # Check for existing checkpoint
-    start_index, existing_urls_count = load_checkpoint('fight_urls_checkpoint.csv')
-    all_fight_urls = load_partial_urls('fight_urls_checkpoint.csv')
+    #Events processed by earlier or interrupted runs, with the fight URLs found on their pages
+    fight_journal = open_fight_journal(event_urls)
+    done_events = fight_journal.load()
     
-    if start_index > 0:
-        logger.info(f'Resuming from checkpoint: {start_index}/{len(event_urls)} events processed, {existing_urls_count} URLs already collected')
+    if done_events:
+        logger.info(f'Resuming from journal: {len(done_events)}/{len(event_urls)} events already processed')
+
+    #With SUMMARIES, processed events with bouts missing from the summaries are read again, usually from the cache
+    summarised = storage.scraped_urls('fight_summaries') if SUMMARIES else set()
     
     #Iterates through each event URL
-    for i, url in enumerate(event_urls, 1):
-        # Skip already processed events
-        if i <= start_index:
-            continue
-            
-        try:
-            # Progress logging every 50 events
-            if i % 50 == 0 or i == 1:
-                logger.info(f'Processing event {i}/{len(event_urls)} ({i/len(event_urls)*100:.1f}%)')
-            else:
-                logger.debug(f'Processing event {i}/{len(event_urls)}: {url}')
-            
-            event_url = session.get(url, timeout=30)
-            event_soup = bs4.BeautifulSoup(event_url.text,'lxml')
-
-           #Scrapes fight URLs from event pages and adds to list
-            fight_count = 0
-            for item in event_soup.find_all('a', class_='b-flag b-flag_style_green'):
-                all_fight_urls.append(item.get('href'))
-                fight_count += 1
-            logger.debug(f'Found {fight_count} fights in event {i}')
-            
-            # Save checkpoint every 100 events
-            if i % 100 == 0:
-                save_checkpoint('fight_urls_checkpoint.csv', all_fight_urls, i)
-            
-            # Add delay to avoid being blocked (1-2 seconds)
-            time.sleep(1.5)
-            
-        except requests.RequestException as e:
-            logger.error(f'Error requesting event {url}: {e}')
-            continue
-        except Exception as e:
-            logger.error(f'Error processing event {url}: {e}')
-            continue
+    with fight_journal, open_summaries() as summary_writer:
+        for i, url in enumerate(event_urls, 1):
+            # Skip already processed events
+            if url in done_events and (not SUMMARIES or all(fight_url in summarised for fight_url in done_events[url])):
+                continue
+                
+            try:
+                # Progress logging every 50 events
+                if i % 50 == 0 or i == 1:
+                    logger.info(f'Processing event {i}/{len(event_urls)} ({i/len(event_urls)*100:.1f}%)')
+                else:
+                    logger.debug(f'Processing event {i}/{len(event_urls)}: {url}')
+                
+                #Events without fights yet are revalidated, as an upcoming event is cached before it has results
+                if url in done_events:
+                    event_url = cache.get(session, url, timeout=30)
+                else:
+                    event_url = cache.fetch(session, url, timeout=30)
+                event_soup = parsing.parse_html(event_url.text)
+
+                #Scrapes fight URLs from event pages and records them as soon as the event is done
+                #Upcoming events have no fight links yet, so they are left to be checked again next run
+                fight_urls = parse_fight_urls(event_soup)
+                if SUMMARIES:
+                    write_summaries(summary_writer, event_soup, url, summarised)
+                if fight_urls and url not in done_events:
+                    fight_journal.append(url, fight_urls)
+                    done_events[url] = fight_urls
+                logger.debug(f'Found {len(fight_urls)} fights in event {i}')
+                
+            except requests.RequestException as e:
+                logger.error(f'Error requesting event {url}: {e}')
+                continue
+            except Exception as e:
+                logger.error(f'Error processing event {url}: {e}')
+                continue
     
-    # Save final checkpoint
-    save_checkpoint('fight_urls_checkpoint.csv', all_fight_urls, len(event_urls))
+    #Fight URLs in event order, whether they were found in this run or an earlier one
+    all_fight_urls = [fight_url for url in event_urls for fight_url in done_events.get(url, [])]
 
     #Creates csv file and adds each fight url to file as a new row
     write_urls_to_csv('fight_urls.csv', all_fight_urls)
@@ -191,36 +286,115 @@ def get_fighter_urls():
     logger.info('Starting to scrape fighter links from ufcstats.com')
     session = create_session()
 
-    #Creates a list of each fighter page alphabetically
-    main_url_list = []
-    for i, letter in enumerate('abcdefghijklmnopqrstuvwxyz', 1):
-        try:
-            logger.info(f'Requesting fighters page for letter: {letter} ({i}/26)')
-            response = session.get(f'http://ufcstats.com/statistics/fighters?char={letter}&page=all', timeout=30)
-            main_url_list.append(response)
-            logger.debug(f'Got response for letter {letter} with status: {response.status_code}')
-            #Adds 1.5s delay to avoid response(429)
-            time.sleep(1.5)
-        except requests.RequestException as e:
-            logger.error(f'Error requesting fighters page for letter {letter}: {e}')
-            continue
-        
-    logger.info(f'Successfully retrieved {len(main_url_list)} fighter pages')
-    
-    #Iterates through each page and scrapes fighter links
-    main_soup_list = [bs4.BeautifulSoup(url.text,'lxml') for url in main_url_list]
-    fighter_urls = []
-    for i, main_link in enumerate(main_soup_list):
-        try:
-            links = main_link.select('a.b-link')[1::3]
-            for link in links:
-                fighter_urls.append(link.get('href'))
-            logger.debug(f'Found {len(links)} fighters on page {i+1}')
-        except Exception as e:
-            logger.error(f'Error processing fighter page {i+1}: {e}')
-            continue
+    #Letters done by an interrupted run, with the fighter URLs found on their pages
+    #The listings gain new fighters, so the journal only lives until the collection completes
+    fighter_journal = journal.Journal('fighter_urls')
+    done_pages = fighter_journal.load()
+    if done_pages:
+        logger.info(f'Resuming from journal: {len(done_pages)}/26 fighter pages already processed')
+
+    #Requests each fighter page alphabetically and scrapes its fighter links
+    with fighter_journal:
+        for i, letter in enumerate('abcdefghijklmnopqrstuvwxyz', 1):
+            url = f'{SITE_URL}/statistics/fighters?char={letter}&page=all'
+            if url in done_pages:
+                continue
+            try:
+                logger.info(f'Requesting fighters page for letter: {letter} ({i}/26)')
+                response = cache.get(session, url, timeout=30)
+                logger.debug(f'Got response for letter {letter} with status: {response.status_code}')
+                links = parsing.parse_html(response.text).select('a.b-link')[1::3]
+                done_pages[url] = [link.get('href') for link in links]
+                fighter_journal.append(url, done_pages[url])
+                logger.debug(f'Found {len(links)} fighters on page {i}')
+            except requests.RequestException as e:
+                logger.error(f'Error requesting fighters page for letter {letter}: {e}')
+                continue
+            except Exception as e:
+                logger.error(f'Error processing fighter page {i}: {e}')
+                continue
+
+    logger.info(f'Successfully retrieved {len(done_pages)} fighter pages')
+    fighter_urls = [fighter_url for urls in done_pages.values() for fighter_url in urls]
 
     #Adds each link as a new row to a csv file
     write_urls_to_csv('fighter_urls.csv', fighter_urls)
+    fighter_journal.remove()
 
     logger.info(f'{len(fighter_urls)} fighter links successfully scraped')
+
+
+#Collects URLs for events completed since the last run, and their fights and fighters
+def get_new_urls():
+
+    logger.info('Checking ufcstats.com for new events')
+    session = create_session()
+
+    known_event_urls = read_urls_from_csv('event_urls.csv')
+    known_fight_urls = read_urls_from_csv('fight_urls.csv')
+    known_fighter_urls = read_urls_from_csv('fighter_urls.csv')
+    known_events = set(known_event_urls)
+    known_fighters = set(known_fighter_urls)
+
+    #Diff the completed events listing against the events already collected
+    try:
+        main_url = cache.fetch(session, f'{SITE_URL}/statistics/events/completed?page=all', timeout=30)
+        main_event_soup = parsing.parse_html(main_url.text)
+    except requests.RequestException as e:
+        logger.error(f'Error making request to ufcstats.com: {e}')
+        raise
+
+    listed_event_urls = parse_event_urls(main_event_soup)
+    candidate_event_urls = [url for url in listed_event_urls if url not in known_events]
+    logger.info(f'Found {len(candidate_event_urls)} events not yet collected')
+
+    #Fetch only the new event pages, collecting fight URLs and fighter URLs from each bout
+    #New events are also recorded in the fight URL journal, so a later full run does not fetch them again
+    new_event_urls = []
+    new_fight_urls = []
+    new_fighter_urls = []
+    summarised = storage.scraped_urls('fight_summaries') if SUMMARIES else set()
+    with journal.Journal('fight_urls') as fight_journal, open_summaries() as summary_writer:
+        for url in candidate_event_urls:
+            try:
+                #Revalidated, as an upcoming event may have been cached by an earlier run before it had results
+                event_url = cache.fetch(session, url, timeout=30)
+                event_soup = parsing.parse_html(event_url.text)
+
+                fight_urls = parse_fight_urls(event_soup)
+
+                #Upcoming events are listed before they have results, so leave them for a later run
+                if len(fight_urls) == 0:
+                    logger.info(f'Skipping event without completed fights: {url}')
+                    continue
+
+                fight_journal.append(url, fight_urls)
+                if SUMMARIES:
+                    write_summaries(summary_writer, event_soup, url, summarised)
+                new_event_urls.append(url)
+                new_fight_urls.extend(fight_urls)
+                for fighter_url in parse_fighter_urls(event_soup):
+                    if fighter_url not in known_fighters:
+                        known_fighters.add(fighter_url)
+                        new_fighter_urls.append(fighter_url)
+
+            except requests.RequestException as e:
+                logger.error(f'Error requesting event {url}: {e}')
+                continue
+            except Exception as e:
+                logger.error(f'Error processing event {url}: {e}')
+                continue
+
+    if len(new_event_urls) == 0:
+        logger.info('No new events to collect')
+        return
+
+    #New URLs go first so files keep the newest-first order of a full collection
+    all_event_urls = new_event_urls + known_event_urls
+    all_fight_urls = new_fight_urls + known_fight_urls
+    write_urls_to_csv('event_urls.csv', all_event_urls)
+    write_urls_to_csv('fight_urls.csv', all_fight_urls)
+    write_urls_to_csv('fighter_urls.csv', new_fighter_urls + known_fighter_urls)
+
+    logger.info(f'{len(new_event_urls)} new events, {len(new_fight_urls)} new fights and '
+                f'{len(new_fighter_urls)} new fighters collected')
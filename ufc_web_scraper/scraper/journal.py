@@ -0,0 +1,98 @@
+#Import libraries for the append-only progress journal shared by every stage
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+#Define path for journal files, one per stage
+journal_path = os.getcwd() + '/checkpoints'
+
+#Entries are flushed to the OS as they are written, so a crash of the scraper loses nothing
+#fsync, which also survives a power cut, is batched to every SYNC_EVERY entries or SYNC_INTERVAL seconds
+SYNC_EVERY = 50
+SYNC_INTERVAL = 5.0
+
+#A journal with more than this many lines per url, i.e. mostly entries superseded by later ones of the same url,
+#is rewritten with one line per url when it is loaded, so it doesn't keep growing across runs
+COMPACT_RATIO = 2
+
+#Append-only record of completed urls for one stage, one JSON line per url with the data found on its page
+#Resuming reads only the entries written so far, only a journal that is mostly superseded entries is rewritten
+class Journal:
+
+    def __init__(self, name):
+        self.path = journal_path + '/' + name + '.journal'
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    #Returns {url: data} for every completed url, in the order they were completed
+    #A line cut short by a crash is dropped, so its url is fetched again
+    def load(self):
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'rb') as journal_file:
+            content = journal_file.read()
+        complete = content[:content.rfind(b'\n') + 1]
+        if len(complete) < len(content):
+            logger.warning(f'Dropping incomplete last entry of {os.path.basename(self.path)}')
+            with open(self.path, 'r+b') as journal_file:
+                journal_file.truncate(len(complete))
+        lines = complete.splitlines()
+        for line in lines:
+            entry = json.loads(line)
+            entries[entry['url']] = entry.get('data')
+        if len(lines) > COMPACT_RATIO * max(len(entries), 1):
+            self.compact(entries)
+        return entries
+
+    #Rewrites the journal with one line per url, to a temporary file that replaces it so a crash loses nothing
+    def compact(self, entries):
+        self.close()
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='UTF8') as journal_file:
+            for url, data in entries.items():
+                journal_file.write(json.dumps({'url': url, 'data': data}) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self.path)
+        logger.info(f'Compacted {os.path.basename(self.path)} to {len(entries)} entries')
+
+    #Records a completed url and the data found on its page
+    def append(self, url, data=None):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'a', encoding='UTF8')
+        self.file.write(json.dumps({'url': url, 'data': data}) + '\n')
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= SYNC_EVERY or time.monotonic() - self.last_sync >= SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    #Deletes the journal once its stage has completed
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
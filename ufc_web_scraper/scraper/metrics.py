@@ -0,0 +1,203 @@
+#Import libraries for run metrics shared by every phase
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+#Upper bounds in seconds of the latency histogram buckets
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+#Prefix of every metric name in the Prometheus text format
+PROMETHEUS_PREFIX = 'ufc_scraper_'
+
+#Set to True to redraw a one line progress summary on stderr while pages are fetched
+PROGRESS = False
+PROGRESS_INTERVAL = 0.5
+
+lock = threading.Lock()
+counters = {}
+histograms = {}
+stages = {}
+started_at = time.time()
+last_progress = 0.0
+
+#Cumulative count of observations per bucket, plus their total and sum
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    #Estimated quantile, the upper bound of the bucket the quantile falls into
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return '+Inf'
+
+    def to_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            total += count
+            cumulative[str(bound)] = total
+        return {'count': self.count,
+                'sum': round(self.sum, 6),
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99),
+                'buckets': cumulative}
+
+#Metrics are keyed by name and a sorted tuple of their label pairs
+def metric_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+#Adds value to a counter, e.g. inc('requests_total', page_type='fights', status=200)
+def inc(name, value=1, **labels):
+    key = metric_key(name, labels)
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+#Records one observation in a histogram, e.g. observe('request_seconds', 0.42, page_type='fights')
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    key = metric_key(name, labels)
+    with lock:
+        if key not in histograms:
+            histograms[key] = Histogram(buckets)
+        histograms[key].observe(value)
+
+#Times a phase or sub-step of the run, nested stages are named 'parent/child'
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            stages[name] = stages.get(name, 0.0) + elapsed
+        logger.debug(f'Stage {name} took {elapsed:.2f} seconds')
+
+#Clears every metric, e.g. between benchmark runs
+def reset():
+    global started_at
+    with lock:
+        counters.clear()
+        histograms.clear()
+        stages.clear()
+        started_at = time.time()
+
+def total(name):
+    with lock:
+        return sum(value for (counter_name, _), value in counters.items() if counter_name == name)
+
+#Redraws the progress line at most every PROGRESS_INTERVAL seconds, or always when done == total
+#total_urls is None while urls are still being discovered
+def progress(label, done, total_urls):
+    global last_progress
+    if not PROGRESS:
+        return
+    now = time.monotonic()
+    if now - last_progress < PROGRESS_INTERVAL and done != total_urls:
+        return
+    last_progress = now
+    elapsed = time.time() - started_at
+    line = (f'\r{label}: {done}/{total_urls or "?"} pages | {total("requests_total")} requests, '
+            f'{total("cache_hits_total")} cached | {total("bytes_downloaded_total") / 1024 / 1024:.1f} MB | '
+            f'{total("retries_total")} retries, {total("rate_limited_total")} 429s | {elapsed:.0f}s')
+    sys.stderr.write(line + ('\n' if done == total_urls else ''))
+    sys.stderr.flush()
+
+#Copy of every metric taken under the lock, as ((name, labels), value) pairs
+def snapshot():
+    with lock:
+        return {'started_at': started_at,
+                'elapsed_seconds': round(time.time() - started_at, 3),
+                'stages': {name: round(seconds, 3) for name, seconds in stages.items()},
+                'counters': sorted(counters.items()),
+                'histograms': sorted(((key, histogram.to_dict()) for key, histogram in histograms.items()),
+                                     key=lambda item: item[0])}
+
+#Metrics as JSON serialisable data, each metric a list of {'labels': {...}, ...} entries
+def to_json():
+    data = snapshot()
+    counter_items, histogram_items = data['counters'], data['histograms']
+    data['counters'], data['histograms'] = {}, {}
+    for (name, labels), value in counter_items:
+        data['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+    for (name, labels), histogram in histogram_items:
+        data['histograms'].setdefault(name, []).append({'labels': dict(labels), **histogram})
+    return data
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+#Metrics in the Prometheus text exposition format
+def to_prometheus():
+    data = snapshot()
+    lines = [f'# TYPE {PROMETHEUS_PREFIX}elapsed_seconds gauge',
+             f'{PROMETHEUS_PREFIX}elapsed_seconds {data["elapsed_seconds"]}',
+             f'# TYPE {PROMETHEUS_PREFIX}stage_seconds gauge']
+    lines += [f'{PROMETHEUS_PREFIX}stage_seconds{{stage="{name}"}} {seconds}' for name, seconds in data['stages'].items()]
+
+    typed = set()
+    for (name, labels), value in data['counters']:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}{name} counter')
+        lines.append(f'{PROMETHEUS_PREFIX}{name}{format_labels(labels)} {value}')
+
+    for (name, labels), histogram in data['histograms']:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}{name} histogram')
+        for bound, count in histogram['buckets'].items():
+            lines.append(f'{PROMETHEUS_PREFIX}{name}_bucket{format_labels(labels, [("le", bound)])} {count}')
+        lines.append(f'{PROMETHEUS_PREFIX}{name}_sum{format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{PROMETHEUS_PREFIX}{name}_count{format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+#Writes the metrics to a file, in the Prometheus text format if it ends in .prom and as JSON otherwise
+def save(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as metrics_file:
+        if path.endswith('.prom'):
+            metrics_file.write(to_prometheus())
+        else:
+            json.dump(to_json(), metrics_file, indent=2)
+    logger.info(f'Metrics saved to {path}')
+
+#Logs the time spent in each stage and the request totals
+def log_summary():
+    with lock:
+        stage_items = list(stages.items())
+    for name, seconds in stage_items:
+        logger.info(f'Stage {name}: {seconds:.2f} seconds')
+    logger.info(f'{total("requests_total")} requests ({total("cache_hits_total")} served from cache), '
+                f'{total("bytes_downloaded_total") / 1024 / 1024:.1f} MB downloaded, '
+                f'{total("retries_total")} retries, {total("rate_limited_total")} rate limited (429), '
+                f'{total("rows_written_total")} rows written')
@@ -1,10 +1,82 @@
 #Import libraries for data cleaning
 import pandas as pd
+import csv
+import io
+import json
 import os
+import shutil
 import logging
+from scraper import storage
+
+#pyarrow is only needed for the optional Parquet/Arrow output
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 logger = logging.getLogger(__name__)
 
+#Column types for the columnar output, where csv files leave everything to be re-inferred on load
+INTEGER_COLUMNS = ['event_id', 'fight_id', 'fight_stat_id', 'fighter_id', 'f_1', 'f_2', 'winner',
+                   'num_rounds', 'finish_round', 'knockdowns', 'total_strikes_att', 'total_strikes_succ',
+                   'sig_strikes_att', 'sig_strikes_succ', 'takedown_att', 'takedown_succ', 'submission_att',
+                   'reversals', 'fighter_weight_lbs', 'fighter_w', 'fighter_l', 'fighter_d', 'fighter_nc_dq',
+                   'round_stat_id', 'round', 'ctrl_seconds', 'head_strikes_att', 'head_strikes_succ',
+                   'body_strikes_att', 'body_strikes_succ', 'leg_strikes_att', 'leg_strikes_succ',
+                   'distance_strikes_att', 'distance_strikes_succ', 'clinch_strikes_att', 'clinch_strikes_succ',
+                   'ground_strikes_att', 'ground_strikes_succ']
+FLOAT_COLUMNS = ['fighter_height_cm', 'fighter_reach_cm']
+DATE_COLUMNS = ['event_date', 'fighter_dob']
+DURATION_COLUMNS = ['finish_time', 'ctrl_time']
+CATEGORY_COLUMNS = ['event_country', 'title_fight', 'weight_class', 'gender', 'result', 'fighter_stance']
+
+#Columns for final output
+EVENT_COLUMNS = ['event_id', 'event_name', 'event_date', 'event_city', 'event_state',
+       'event_country', 'event_url']
+FIGHT_COLUMNS = ['fight_id','event_id','referee', 'f_1', 'f_2', 'winner', 'num_rounds', 'title_fight',
+       'weight_class', 'gender', 'result', 'result_details', 'finish_round',
+       'finish_time', 'fight_url']
+FIGHT_STAT_COLUMNS = ['fight_stat_id', 'fight_id', 'fighter_id', 'knockdowns', 'total_strikes_att',
+       'total_strikes_succ', 'sig_strikes_att', 'sig_strikes_succ',
+       'takedown_att', 'takedown_succ', 'submission_att', 'reversals',
+       'ctrl_time', 'fight_url']
+FIGHTER_COLUMNS = ['fighter_id','fighter_name', 'fighter_nickname',
+       'fighter_height_cm', 'fighter_weight_lbs', 'fighter_reach_cm',
+       'fighter_stance', 'fighter_dob', 'fighter_w', 'fighter_l', 'fighter_d',
+       'fighter_nc_dq', 'fighter_url']
+ROUND_STAT_COLUMNS = ['round_stat_id', 'fight_id', 'fighter_id', 'round', 'knockdowns', 'sig_strikes_att',
+       'sig_strikes_succ', 'total_strikes_att', 'total_strikes_succ', 'takedown_att', 'takedown_succ',
+       'submission_att', 'reversals', 'ctrl_seconds', 'head_strikes_att', 'head_strikes_succ',
+       'body_strikes_att', 'body_strikes_succ', 'leg_strikes_att', 'leg_strikes_succ',
+       'distance_strikes_att', 'distance_strikes_succ', 'clinch_strikes_att', 'clinch_strikes_succ',
+       'ground_strikes_att', 'ground_strikes_succ', 'fight_url']
+
+#Counts of the round stats, read as nullable integers since datasets scraped before fights were flagged with
+#round_breakdown have a row of NULLs for fights without a breakdown, which would otherwise turn them into floats
+ROUND_STAT_COUNTS = [column for column in ROUND_STAT_COLUMNS if column in INTEGER_COLUMNS and not column.endswith('_id')]
+
+#Column types given to pd.read_csv for each scraped table, by full and incremental runs alike
+READ_DTYPES = {'round_stats': {column: 'Int64' for column in ROUND_STAT_COUNTS}}
+
+#Scraped columns left out of the normalised output, so updating them needs no patch
+SCRAPED_ONLY_COLUMNS = ['round_breakdown']
+
+#Round stats were added after the other tables, so older scraped datasets may not have the file
+OPTIONAL_TABLES = ['round_stats']
+
+#Incremental normalisation appends to files in scraped_files/normalised, leaving the scraped csv files untouched
+file_path = os.path.join(os.getcwd(), 'scraped_files')
+normalised_path = os.path.join(file_path, 'normalised')
+state_file = os.path.join(os.getcwd(), 'checkpoints', 'normalise_state.json')
+
+#Table name: (primary key, output columns), in the order new rows are normalised
+#Fighters and events come first so new fights and fight stats can be linked to them
+INCREMENTAL_TABLES = {'fighters': ('fighter_id', FIGHTER_COLUMNS),
+                      'events': ('event_id', EVENT_COLUMNS),
+                      'fights': ('fight_id', FIGHT_COLUMNS),
+                      'fight_stats': ('fight_stat_id', FIGHT_STAT_COLUMNS),
+                      'round_stats': ('round_stat_id', ROUND_STAT_COLUMNS)}
+
 def add_primary_keys(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
 
     #Creates unique keys for each row in table
@@ -33,6 +105,20 @@ def add_primary_keys(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
         ufc_fighters['fighter_id'] = fighter_id[::-1]
         logger.debug('Added fighter_id primary key to fighters table')
 
+#Builds a Series of ids indexed by key column for vectorised Series.map lookups
+#If a key appears more than once the last row wins, as with a dictionary
+def build_lookup(table,key_column,id_column):
+    lookup = pd.Series(table[id_column].to_numpy(), index=table[key_column])
+    return lookup[~lookup.index.duplicated(keep='last')]
+
+#Fighter ids for a column of fighter names, looked up by the fighter profile url scraped alongside it
+#Rows scraped before urls were captured have no url and fall back to matching the name
+def map_fighter_ids(table,name_column,url_column,url_lookup,name_lookup):
+    if url_column not in table.columns:
+        return table[name_column].map(name_lookup)
+    urls = table[url_column]
+    return urls.map(url_lookup).where(urls.notna(), table[name_column].map(name_lookup))
+
 def add_foreign_key(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
     
     # === DEBUGGING STEP ===
@@ -43,30 +129,27 @@ def add_foreign_key(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
     #Add fighter name column to ufc_fighters match with fighter names in ufc_fights/ufc_fight_stats
     # The line below is causing the error. Check the output of the print statement above
     # to find the correct column names for first and last name.
-    logger.debug('Creating fighter_name column by combining first and last names')
-    ufc_fighters['fighter_name'] = ufc_fighters['fighter_f_name'] + ' ' + ufc_fighters['fighter_l_name']
+    #Files already normalised in place have the combined name only
+    if 'fighter_name' not in ufc_fighters.columns:
+        logger.debug('Creating fighter_name column by combining first and last names')
+        ufc_fighters['fighter_name'] = ufc_fighters['fighter_f_name'] + ' ' + ufc_fighters['fighter_l_name']
     
     """
-    Create dictionaries of primary keys and column in primary table to match with foreign table
+    Create lookups of primary keys indexed by the column in primary table to match with foreign table
     """
     
-    #Dictionary of all event names and their corresponding ID
-    logger.debug('Creating event ID dictionary')
-    event_id_dict = {}
-    for num in range(len(ufc_events)):
-        event_id_dict[ufc_events.loc[num,'event_name']]=ufc_events.loc[num,'event_id']
+    #Lookup of all event names and their corresponding ID
+    logger.debug('Creating event ID lookup')
+    event_id_lookup = build_lookup(ufc_events,'event_name','event_id')
     
-    #Dictionary of all fight urls and their corresponding ID
-    logger.debug('Creating fight URL dictionary')
-    fight_url_dict = {}
-    for num in range(len(ufc_fights)):
-        fight_url_dict[ufc_fights.loc[num,'fight_url']]=ufc_fights.loc[num,'fight_id']
+    #Lookup of all fight urls and their corresponding ID
+    logger.debug('Creating fight URL lookup')
+    fight_url_lookup = build_lookup(ufc_fights,'fight_url','fight_id')
     
-    #Dictionary of all fighter names and their corresponding ID
-    logger.debug('Creating fighter ID dictionary')
-    fighter_id_dict = {}
-    for num in range(len(ufc_fighters)):
-        fighter_id_dict[ufc_fighters.loc[num,'fighter_name']]=ufc_fighters.loc[num,'fighter_id']
+    #Lookups of all fighter urls and names and their corresponding ID
+    logger.debug('Creating fighter ID lookups')
+    fighter_url_lookup = build_lookup(ufc_fighters,'fighter_url','fighter_id')
+    fighter_id_lookup = build_lookup(ufc_fighters,'fighter_name','fighter_id')
     
     """
     Set foreign keys
@@ -75,60 +158,102 @@ def add_foreign_key(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
     #Add event_id to ufc_fights if not already present
     if 'event_id' not in ufc_fights.columns:
         logger.debug('Adding event_id foreign key to fights table')
-        ufc_fights['event_id'] = ufc_events['event_name'].map(event_id_dict)
+        ufc_fights['event_id'] = ufc_fights['event_name'].map(event_id_lookup)
 
     #Replace fighter names in ufc_fights with their fighter_id if not already changed
     if type(ufc_fights['f_1'][0])==str:
         logger.debug('Replacing fighter names with IDs in f_1 column')
-        ufc_fights['f_1'] = ufc_fights['f_1'].map(fighter_id_dict)
+        ufc_fights['f_1'] = map_fighter_ids(ufc_fights,'f_1','f_1_url',fighter_url_lookup,fighter_id_lookup)
 
     if type(ufc_fights['f_2'][0])==str:
         logger.debug('Replacing fighter names with IDs in f_2 column')
-        ufc_fights['f_2'] = ufc_fights['f_2'].map(fighter_id_dict)
+        ufc_fights['f_2'] = map_fighter_ids(ufc_fights,'f_2','f_2_url',fighter_url_lookup,fighter_id_lookup)
 
     if type(ufc_fights['winner'][0])==str:
         logger.debug('Replacing fighter names with IDs in winner column')
-        ufc_fights['winner'] = ufc_fights['winner'].map(fighter_id_dict)
+        ufc_fights['winner'] = map_fighter_ids(ufc_fights,'winner','winner_url',fighter_url_lookup,fighter_id_lookup)
 
     #Replace fighter names in ufc_fight_stats with their fighter_id
     # There was a potential bug here if 'fighter_id' was already numeric.
     # Changed to check the type of the first element in the column.
     if 'fighter_id' in ufc_fight_stats.columns and len(ufc_fight_stats) > 0 and isinstance(ufc_fight_stats['fighter_id'].iloc[0], str):
         logger.debug('Replacing fighter names with IDs in fight stats table')
-        ufc_fight_stats['fighter_id'] = ufc_fight_stats['fighter_id'].map(fighter_id_dict)
+        ufc_fight_stats['fighter_id'] = map_fighter_ids(ufc_fight_stats,'fighter_id','fighter_url',fighter_url_lookup,fighter_id_lookup)
 
 
     #Add fight_id to ufc_fight_stats
     if 'fight_id' not in ufc_fight_stats.columns:
         logger.debug('Adding fight_id foreign key to fight stats table')
-        ufc_fight_stats['fight_id'] = ufc_fight_stats['fight_url'].map(fight_url_dict)
+        ufc_fight_stats['fight_id'] = ufc_fight_stats['fight_url'].map(fight_url_lookup)
 
 
-def save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
-    
-    #Define columns for final output
-    event_columns = ['event_id', 'event_name', 'event_date', 'event_city', 'event_state',
-           'event_country', 'event_url']
-    fight_columns = ['fight_id','event_id','referee', 'f_1', 'f_2', 'winner', 'num_rounds', 'title_fight',
-           'weight_class', 'gender', 'result', 'result_details', 'finish_round',
-           'finish_time', 'fight_url']
-    fight_stat_columns = ['fight_stat_id', 'fight_id', 'fighter_id', 'knockdowns', 'total_strikes_att',
-           'total_strikes_succ', 'sig_strikes_att', 'sig_strikes_succ',
-           'takedown_att', 'takedown_succ', 'submission_att', 'reversals',
-           'ctrl_time', 'fight_url']
-    # I've commented out 'fighter_f_name' and 'fighter_l_name' since they will be replaced by 'fighter_name'
-    # which is already created. You should include 'fighter_name' in the final list.
-    fighter_columns = ['fighter_id','fighter_name', 'fighter_nickname', # Added 'fighter_name'
-           'fighter_height_cm', 'fighter_weight_lbs', 'fighter_reach_cm',
-           'fighter_stance', 'fighter_dob', 'fighter_w', 'fighter_l', 'fighter_d',
-           'fighter_nc_dq', 'fighter_url']
+#Adds primary and foreign keys to the per round stats, linked like the fight stats
+def add_round_stat_keys(ufc_round_stats,ufc_fights,ufc_fighters):
+    if 'round_stat_id' not in ufc_round_stats.columns:
+        ufc_round_stats['round_stat_id'] = list(range(len(ufc_round_stats), 0, -1))
+        logger.debug('Added round_stat_id primary key to round stats table')
+
+    #fighter_id holds fighter names until replaced with their id
+    if len(ufc_round_stats) > 0 and isinstance(ufc_round_stats['fighter_id'].iloc[0], str):
+        logger.debug('Replacing fighter names with IDs in round stats table')
+        ufc_round_stats['fighter_id'] = map_fighter_ids(ufc_round_stats,'fighter_id','fighter_url',
+                                                        build_lookup(ufc_fighters,'fighter_url','fighter_id'),
+                                                        build_lookup(ufc_fighters,'fighter_name','fighter_id'))
+
+    if 'fight_id' not in ufc_round_stats.columns:
+        logger.debug('Adding fight_id foreign key to round stats table')
+        ufc_round_stats['fight_id'] = ufc_round_stats['fight_url'].map(build_lookup(ufc_fights,'fight_url','fight_id'))
+
+#Converts 'm:ss' strings to durations, anything else (e.g. 'NULL', '--') becomes missing
+def parse_duration(column):
+    minutes_seconds = column.astype('string').str.extract(r'^\s*(\d+):(\d\d)\s*$')
+    seconds = pd.to_numeric(minutes_seconds[0]) * 60 + pd.to_numeric(minutes_seconds[1])
+    return pd.to_timedelta(seconds, unit='s')
+
+#Returns a copy of a table with real integer, float, date, duration and categorical dtypes
+def typed_table(table):
+    table = table.reset_index()
+    for column in table.columns:
+        if column in INTEGER_COLUMNS:
+            table[column] = pd.to_numeric(table[column], errors='coerce').round().astype('Int64')
+        elif column in FLOAT_COLUMNS:
+            table[column] = pd.to_numeric(table[column], errors='coerce')
+        elif column in DATE_COLUMNS:
+            table[column] = pd.to_datetime(table[column], errors='coerce')
+        elif column in DURATION_COLUMNS:
+            table[column] = parse_duration(table[column])
+        elif column in CATEGORY_COLUMNS:
+            table[column] = table[column].astype('category')
+        else:
+            table[column] = table[column].astype('string')
+    return table
+
+#Saves typed copies of the tables as compressed Parquet and/or uncompressed Arrow IPC (memory-mappable)
+def save_columnar(tables,formats,path):
+    if pyarrow is None:
+        logger.error('pyarrow is required for Parquet/Arrow output - install it with: pip install pyarrow')
+        raise ImportError('pyarrow is required for Parquet/Arrow output')
+
+    for name, table in tables.items():
+        table = typed_table(table)
+        #Names may include a sub-folder, as for the part files of incremental runs
+        for file_format in formats:
+            os.makedirs(os.path.dirname(os.path.join(path, file_format, name)), exist_ok=True)
+        if 'parquet' in formats:
+            table.to_parquet(os.path.join(path, 'parquet', name + '.parquet'), compression='zstd', index=False)
+            logger.debug(f'Saved {name}.parquet')
+        if 'arrow' in formats:
+            table.to_feather(os.path.join(path, 'arrow', name + '.arrow'), compression='uncompressed')
+            logger.debug(f'Saved {name}.arrow')
+
+def save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters,formats=(),ufc_round_stats=None):
 
     #Set columns for final output
     logger.debug('Setting final column order for all tables')
-    ufc_events = ufc_events[event_columns]
-    ufc_fights = ufc_fights[fight_columns]
-    ufc_fight_stats = ufc_fight_stats[fight_stat_columns]
-    ufc_fighters = ufc_fighters[fighter_columns]
+    ufc_events = ufc_events[EVENT_COLUMNS]
+    ufc_fights = ufc_fights[FIGHT_COLUMNS]
+    ufc_fight_stats = ufc_fight_stats[FIGHT_STAT_COLUMNS]
+    ufc_fighters = ufc_fighters[FIGHTER_COLUMNS]
 
     #Set primary key as index
     logger.debug('Setting primary keys as table indices')
@@ -136,6 +261,8 @@ def save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
     ufc_fights.set_index('fight_id',inplace=True)
     ufc_fight_stats.set_index('fight_stat_id',inplace=True)
     ufc_fighters.set_index('fighter_id',inplace=True)
+    if ufc_round_stats is not None:
+        ufc_round_stats = ufc_round_stats[ROUND_STAT_COLUMNS].set_index('round_stat_id')
     
     #Saves dataframes to CSV file
     # Using os.path.join for better cross-platform compatibility
@@ -150,9 +277,23 @@ def save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters):
     logger.debug('Saved ufc_fighter_data.csv')
     ufc_fight_stats.to_csv(os.path.join(path, 'ufc_fight_stat_data.csv'))
     logger.debug('Saved ufc_fight_stat_data.csv')
+    if ufc_round_stats is not None:
+        ufc_round_stats.to_csv(os.path.join(path, 'ufc_round_stat_data.csv'))
+        logger.debug('Saved ufc_round_stat_data.csv')
+
+    #Optionally saves typed columnar copies alongside the csv files
+    if formats:
+        logger.info(f'Saving normalized tables as {", ".join(formats)}')
+        tables = {'ufc_event_data': ufc_events,
+                  'ufc_fight_data': ufc_fights,
+                  'ufc_fight_stat_data': ufc_fight_stats,
+                  'ufc_fighter_data': ufc_fighters}
+        if ufc_round_stats is not None:
+            tables['ufc_round_stat_data'] = ufc_round_stats
+        save_columnar(tables, formats, path)
 
 
-def normalise_tables():
+def normalise_tables(formats=()):
 
     #Import csv files to Pandas dataframe
     path = os.path.join(os.getcwd(), 'scraped_files')
@@ -166,6 +307,11 @@ def normalise_tables():
         logger.debug(f'Loaded {len(ufc_fight_stats)} fight stats records')
         ufc_fighters = pd.read_csv(os.path.join(path, 'ufc_fighter_data.csv'))
         logger.debug(f'Loaded {len(ufc_fighters)} fighters')
+        ufc_round_stats = None
+        if os.path.exists(os.path.join(path, 'ufc_round_stat_data.csv')):
+            ufc_round_stats = pd.read_csv(os.path.join(path, 'ufc_round_stat_data.csv'),
+                                          dtype=READ_DTYPES['round_stats'])
+            logger.debug(f'Loaded {len(ufc_round_stats)} round stats records')
     except FileNotFoundError as e:
         logger.error(f'Required CSV file not found: {e}')
         raise
@@ -180,12 +326,253 @@ def normalise_tables():
     #Add foreign key to tables
     logger.info('Adding foreign keys')
     add_foreign_key(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters)
+    if ufc_round_stats is not None:
+        add_round_stat_keys(ufc_round_stats,ufc_fights,ufc_fighters)
     
     #Save dataframes to CSV file
-    save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters)
+    save_to_file(ufc_events,ufc_fights,ufc_fight_stats,ufc_fighters,formats,ufc_round_stats)
+
+    #Rewriting the scraped files in place makes incremental normalisation start again, so earlier updates are moot
+    storage.clear_row_updates()
 
     logger.info('Tables normalised successfully')
 
 
+#Loads how far each scraped file has been normalised: {table: {'inode', 'offset', 'rows', 'next_id'}, 'parts': columnar parts written}
+def load_state():
+    try:
+        with open(state_file, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_path = state_file + '.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(state, json_file)
+    os.replace(tmp_path, state_file)
+
+#Bytes taken by the header and first rows of a scraped file, None if it has fewer rows
+def rows_end(table, rows):
+    position = 0
+    with open(os.path.join(file_path, storage.TABLES[table][0]), 'rb') as csv_file:
+        def lines():
+            nonlocal position
+            for line in csv_file:
+                position += len(line)
+                yield line.decode('utf-8')
+        reader = csv.reader(lines())
+        for _ in range(rows + 1):
+            if next(reader, None) is None:
+                return None
+    return position
+
+#Follows the in-place updates of a scraped file made by storage.update_rows since it was last normalised, moving
+#the state to the updated file and finding its offset again by re-reading the rows already normalised. Returns the
+#urls and columns updated, or None if the updates don't start from the state's file, i.e. it was replaced
+def follow_row_updates(table, table_state, update):
+    if update['inode_before'] != table_state['inode'] or 'rows' not in table_state:
+        return None
+    offset = rows_end(table, table_state['rows'])
+    if offset is None:
+        return None
+    table_state['inode'] = update['inode']
+    table_state['offset'] = offset
+    return set(update['urls']), update['columns']
+
+#Columns of a table's normalised output holding an updated scraped column, None if a column can't be updated in place
+#(one the output only has as a foreign key). First and last names are combined into fighter_name
+def patched_columns(table, columns):
+    output_columns = INCREMENTAL_TABLES[table][1]
+    patched = set()
+    for column in columns:
+        if column in ['fighter_f_name', 'fighter_l_name'] and 'fighter_name' in output_columns:
+            patched.add('fighter_name')
+        elif column in SCRAPED_ONLY_COLUMNS:
+            continue
+        elif column in output_columns:
+            patched.add(column)
+        else:
+            return None
+    return patched
+
+#Writes the new values of updated scraped rows into their already normalised rows, which keep their ids
+def patch_rows(table, urls, columns):
+    file_name, scraped_columns, key, _ = storage.TABLES[table]
+    path = os.path.join(normalised_path, file_name)
+    if not urls or not columns or not os.path.exists(path):
+        return
+
+    scraped = storage.stored_values(table, scraped_columns)
+    updated = pd.DataFrame([{column: '' if value is None else str(value) for column, value in scraped[url].items()}
+                            for url in urls if url in scraped], columns=scraped_columns)
+    if 'fighter_name' in columns:
+        named = (updated['fighter_f_name'] != '') & (updated['fighter_l_name'] != '')
+        updated['fighter_name'] = (updated['fighter_f_name'] + ' ' + updated['fighter_l_name']).where(named, '')
+    updated = updated.set_index(key[0], drop=False)
+
+    #Read as text so the rows that are not updated are written back as they were
+    normalised = pd.read_csv(path, dtype=str, keep_default_na=False)
+    rows = normalised[key[0]].isin(updated.index)
+    for column in columns:
+        normalised.loc[rows, column] = normalised.loc[rows, key[0]].map(updated[column])
+    tmp_path = path + '.tmp'
+    normalised.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    logger.info(f'Updated {rows.sum()} normalised rows of {table}')
+
+#True if a scraped file was replaced or truncated (e.g. by --replay) since it was last normalised
+def file_replaced(table, table_state):
+    file_name = storage.TABLES[table][0]
+    stat = os.stat(os.path.join(file_path, file_name))
+    return (stat.st_ino != table_state['inode'] or stat.st_size < table_state['offset']
+            or not os.path.exists(os.path.join(normalised_path, file_name)))
+
+#Starts the state of a table at the first row of its scraped file
+#A file already normalised in place by a full run is copied across as the starting output
+def start_table(table):
+    file_name, columns, _, _ = storage.TABLES[table]
+    id_column = INCREMENTAL_TABLES[table][0]
+    source = os.path.join(file_path, file_name)
+
+    with open(source, 'rb') as csv_file:
+        header = csv_file.readline()
+        offset = csv_file.tell()
+
+    if id_column in header.decode('utf-8').strip().split(','):
+        logger.info(f'Using {file_name} as already normalised output')
+        shutil.copyfile(source, os.path.join(normalised_path, file_name))
+        ids = pd.read_csv(source, usecols=[id_column])[id_column]
+        return {'inode': os.stat(source).st_ino, 'offset': os.path.getsize(source), 'rows': len(ids),
+                'next_id': int(ids.max()) + 1 if len(ids) else 1}
+
+    return {'inode': os.stat(source).st_ino, 'offset': offset, 'rows': 0, 'next_id': 1}
+
+#Reads only the rows appended to a scraped file since the offset it was last normalised up to
+def read_new_rows(table, table_state):
+    file_name, columns, _, _ = storage.TABLES[table]
+    with open(os.path.join(file_path, file_name), 'rb') as csv_file:
+        csv_file.seek(table_state['offset'])
+        data = csv_file.read()
+
+    #Leave a partly written last row for the next run
+    data = data[:data.rfind(b'\n') + 1]
+    table_state['offset'] += len(data)
+    if not data.strip():
+        return pd.DataFrame(columns=columns)
+    rows = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=READ_DTYPES.get(table))
+    table_state['rows'] = table_state.get('rows', 0) + len(rows)
+    return rows
+
+#Gives new rows ids above every id already issued, newest (first scraped) row highest as in add_primary_keys
+def add_new_ids(table, rows, table_state):
+    next_id = table_state['next_id']
+    rows[INCREMENTAL_TABLES[table][0]] = list(range(next_id + len(rows) - 1, next_id - 1, -1))
+    table_state['next_id'] = next_id + len(rows)
+
+#Lookup of ids from the key and id columns of already normalised rows plus the new rows
+def load_lookup(table, new_rows, key_column, id_column):
+    path = os.path.join(normalised_path, storage.TABLES[table][0])
+    tables = [new_rows[[key_column, id_column]]]
+    if os.path.exists(path):
+        tables.insert(0, pd.read_csv(path, usecols=[key_column, id_column]))
+    return build_lookup(pd.concat(tables, ignore_index=True), key_column, id_column)
+
+#Normalises only the rows scraped since the last run and appends them to scraped_files/normalised
+#Cost grows with the number of new rows, apart from reading the key columns needed to link them
+def normalise_new_rows(formats=()):
+    tables_found = []
+    for table in INCREMENTAL_TABLES:
+        file_name = storage.TABLES[table][0]
+        if os.path.exists(os.path.join(file_path, file_name)):
+            tables_found.append(table)
+        elif table not in OPTIONAL_TABLES:
+            logger.error(f'Required CSV file not found: {file_name}')
+            raise FileNotFoundError(os.path.join(file_path, file_name))
+
+    os.makedirs(normalised_path, exist_ok=True)
+    state = load_state()
+
+    #Rows updated in place, e.g. by a fighter refresh, are patched in the output instead of rebuilding it
+    row_updates = storage.load_row_updates()
+    patches = {}
+    for table in tables_found:
+        if table in state and row_updates.get(table):
+            followed = follow_row_updates(table, state[table], row_updates[table])
+            if followed is not None:
+                urls, columns = followed
+                patches[table] = (urls, patched_columns(table, columns))
+
+    #Ids of every table depend on each other, so a replaced file means starting again from scratch
+    if (any(file_replaced(table, state[table]) for table in tables_found if table in state)
+            or any(columns is None for _, columns in patches.values())):
+        logger.warning('Scraped files changed since last normalised - rebuilding normalised tables')
+        for file_name in os.listdir(normalised_path):
+            os.remove(os.path.join(normalised_path, file_name))
+        state = {}
+        patches = {}
+
+    for table, (urls, columns) in patches.items():
+        patch_rows(table, urls, columns)
+
+    new_rows = {table: pd.DataFrame(columns=storage.TABLES[table][1]) for table in INCREMENTAL_TABLES}
+    adopted = {}
+    for table in tables_found:
+        if table not in state:
+            state[table] = start_table(table)
+            #Rows taken over from a full run also go into the first columnar part
+            if formats and state[table]['next_id'] > 1:
+                adopted[table] = pd.read_csv(os.path.join(normalised_path, storage.TABLES[table][0]))
+        new_rows[table] = read_new_rows(table, state[table])
+        add_new_ids(table, new_rows[table], state[table])
+        logger.info(f'Found {len(new_rows[table])} new rows in {table}')
+
+    ufc_events = new_rows['events']
+    ufc_fights = new_rows['fights']
+    ufc_fight_stats = new_rows['fight_stats']
+    ufc_fighters = new_rows['fighters']
+    ufc_round_stats = new_rows['round_stats']
+    ufc_fighters['fighter_name'] = ufc_fighters['fighter_f_name'] + ' ' + ufc_fighters['fighter_l_name']
+
+    if len(ufc_fights) or len(ufc_fight_stats) or len(ufc_round_stats):
+        logger.info('Adding foreign keys to new rows')
+        fighter_url_lookup = load_lookup('fighters', ufc_fighters, 'fighter_url', 'fighter_id')
+        fighter_id_lookup = load_lookup('fighters', ufc_fighters, 'fighter_name', 'fighter_id')
+
+        event_id_lookup = load_lookup('events', ufc_events, 'event_name', 'event_id')
+        ufc_fights['event_id'] = ufc_fights['event_name'].map(event_id_lookup)
+        for column in ['f_1', 'f_2', 'winner']:
+            ufc_fights[column] = map_fighter_ids(ufc_fights, column, column + '_url', fighter_url_lookup, fighter_id_lookup)
+
+        fight_url_lookup = load_lookup('fights', ufc_fights, 'fight_url', 'fight_id')
+        for stats in [ufc_fight_stats, ufc_round_stats]:
+            stats['fighter_id'] = map_fighter_ids(stats, 'fighter_name', 'fighter_url', fighter_url_lookup, fighter_id_lookup)
+            stats['fight_id'] = stats['fight_url'].map(fight_url_lookup)
+
+    tables = {}
+    for table, (_, columns) in INCREMENTAL_TABLES.items():
+        file_name = storage.TABLES[table][0]
+        rows = new_rows[table].reindex(columns=columns)
+        if len(rows):
+            path = os.path.join(normalised_path, file_name)
+            rows.to_csv(path, mode='a', index=False, header=not os.path.exists(path))
+            logger.debug(f'Appended {len(rows)} rows to normalised/{file_name}')
+        if table in adopted:
+            rows = pd.concat([adopted[table], rows], ignore_index=True)
+        if len(rows):
+            tables[file_name[:-len('.csv')]] = rows.set_index(columns[0])
+
+    #Each run adds one part file per table, read back together as a dataset
+    if formats and tables:
+        state['parts'] = state.get('parts', 0) + 1
+        part = f'part-{state["parts"]:05d}'
+        save_columnar({name + '/' + part: table for name, table in tables.items()}, formats, normalised_path)
+
+    save_state(state)
+    storage.clear_row_updates()
+    logger.info('New rows normalised successfully')
+
+
 if __name__ == '__main__':
     normalise_tables()
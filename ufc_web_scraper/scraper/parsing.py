@@ -0,0 +1,51 @@
+#Import libraries for html parsing
+import bs4
+import threading
+import lxml.html
+from lxml import etree
+
+#Parser used for every page: 'lxml' runs compiled XPath queries on the lxml tree,
+#'bs4' builds a full BeautifulSoup tree as the scrapers originally did
+BACKEND = 'lxml'
+
+#Compiled XPath queries per selector, kept per thread as XPath objects are not shared between threads
+compiled = threading.local()
+
+#Translates the 'tag.class1.class2' selectors used by the scrapers into XPath
+def css_to_xpath(selector):
+    tag, *classes = selector.split('.')
+    conditions = ''.join(f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]" for name in classes)
+    return f'descendant::{tag or "*"}{conditions}'
+
+#Returns the compiled XPath for a selector, compiling it on first use
+def compile_selector(selector):
+    if not hasattr(compiled, 'selectors'):
+        compiled.selectors = {}
+    xpath = compiled.selectors.get(selector)
+    if xpath is None:
+        xpath = compiled.selectors[selector] = etree.XPath(css_to_xpath(selector))
+    return xpath
+
+#Wraps an lxml element with the subset of the BeautifulSoup interface used by the extractors
+class Node:
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    #All text inside the element, like bs4's Tag.text
+    @property
+    def text(self):
+        return self.element.text_content()
+
+    def get(self, attribute, default=None):
+        return self.element.get(attribute, default)
+
+    def select(self, selector):
+        return [Node(element) for element in compile_selector(selector)(self.element)]
+
+#Parses a page with the configured backend, returning an object supporting select(), .text and .get()
+def parse_html(text):
+    if BACKEND == 'bs4':
+        return bs4.BeautifulSoup(text,'lxml')
+    return Node(lxml.html.document_fromstring(text))
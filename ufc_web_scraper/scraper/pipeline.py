@@ -0,0 +1,268 @@
+#Import libraries for streaming URL discovery straight into the Phase 2 scrapers
+import queue
+import threading
+import requests
+import logging
+from scraper import cache, events, fetcher, fightpages, fighters, fights, fightstats, fightsummaries, get_urls, parsing, roundstats, storage
+
+logger = logging.getLogger(__name__)
+
+#Urls waiting between two stages, the producer blocks when its consumer falls this far behind
+QUEUE_SIZE = 500
+
+#Put on a queue by each of its producers when they are done
+DONE = object()
+
+#The three fetching stages share the fetcher's connection pool, so each gets a third of its workers
+def stage_workers():
+    return max(2, fetcher.MAX_WORKERS // 3)
+
+#Tables written from a fight page, with the function creating each csv file
+FIGHT_TABLES = [('fights', fights.create_csv_file),
+                ('fight_stats', fightstats.create_csv_file),
+                ('round_stats', roundstats.create_csv_file)]
+
+#Yields urls from a queue until every producer has finished
+def drain(url_queue, producers=1):
+    while producers:
+        url = url_queue.get()
+        if url is DONE:
+            producers -= 1
+        else:
+            yield url
+
+#Event page rows plus the fight and fighter links on the page, so it is only fetched once
+def parse_event_page(event_soup,url):
+    return (events.parse_event(event_soup,url),
+            get_urls.parse_fight_urls(event_soup),
+            get_urls.parse_fighter_urls(event_soup),
+            fightsummaries.parse_fight_summaries(event_soup,url) if get_urls.SUMMARIES else [])
+
+#Fighter urls found by more than one producer are only queued once
+class FighterQueue:
+
+    def __init__(self, scraped_urls):
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.seen = set(scraped_urls)
+        self.found = []
+        self.lock = threading.Lock()
+
+    def put(self, url):
+        with self.lock:
+            if url in self.seen:
+                return
+            self.seen.add(url)
+            self.found.append(url)
+        self.queue.put(url)
+
+    def done(self):
+        self.queue.put(DONE)
+
+#Fetches event pages and writes new event rows, passing fight and fighter links on as each page is parsed
+#With skip_upcoming, events without fights are not written, as in get_urls.get_new_urls
+#Returns {event url: fight urls} of every event with completed fights
+def stream_events(event_urls, fight_queue, fighter_queue, skip_upcoming=False):
+    scraped_events = storage.scraped_urls('events')
+    fight_journal = get_urls.open_fight_journal(event_urls)
+    event_fights = fight_journal.load()
+    summarised = storage.scraped_urls('fight_summaries') if get_urls.SUMMARIES else set()
+
+    #Events scraped and journalled by an earlier run, with a summary of each bout when those are written
+    def already_done(url):
+        return (url in scraped_events and url in event_fights and
+                (not get_urls.SUMMARIES or all(fight_url in summarised for fight_url in event_fights[url])))
+
+    #Events already done are not fetched, their fight urls come from the journal
+    #Events without fights yet are revalidated, as an upcoming event is cached before it has results
+    def urls_to_fetch():
+        for url in event_urls:
+            if already_done(url):
+                for fight_url in event_fights[url]:
+                    fight_queue.put(fight_url)
+            else:
+                if url not in event_fights:
+                    cache.expire(url)
+                yield url
+
+    urls_scraped = 0
+    with fight_journal, get_urls.open_summaries() as summary_writer, \
+         storage.open_table('events', events.create_csv_file) as writer:
+        for url, result, error in fetcher.scrape_urls(urls_to_fetch(), parse_event_page, stage_workers()):
+            if isinstance(error, requests.RequestException):
+                logger.error(f'Request error for event {url}: {error}')
+                continue
+            elif error is not None:
+                logger.error(f'Error processing event {url}: {error}')
+                continue
+
+            event_row, fight_urls, fighter_urls, summaries = result
+            if url not in scraped_events and (fight_urls or not skip_upcoming):
+                writer.writerow(event_row)
+                urls_scraped += 1
+            for summary in summaries:
+                if summary.fight_url not in summarised:
+                    summary_writer.writerow(summary)
+                    summarised.add(summary.fight_url)
+
+            #Upcoming events have no fight links yet, so they are checked again next run
+            if fight_urls and url not in event_fights:
+                fight_journal.append(url, fight_urls)
+                event_fights[url] = fight_urls
+            for fight_url in fight_urls:
+                fight_queue.put(fight_url)
+            for fighter_url in fighter_urls:
+                fighter_queue.put(fighter_url)
+
+    logger.info(f'{urls_scraped} new events scraped')
+    return {url: event_fights[url] for url in event_urls if url in event_fights}
+
+#Fetches fight pages as their urls arrive and writes the fights, fight stats and round stats still missing
+def stream_fights(fight_queue):
+    scraped = {table: fightpages.scraped_urls(table) for table, _ in FIGHT_TABLES}
+    missing = {}
+
+    def new_fight_urls():
+        for url in drain(fight_queue):
+            tables = {table for table, _ in FIGHT_TABLES if url not in scraped[table]}
+            if tables and url not in missing:
+                missing[url] = tables
+                yield url
+
+    def parse_fight_page(fight_soup,url):
+        return fightpages.parse_tables(fight_soup,url,missing[url])
+
+    urls_scraped = 0
+    no_breakdown = []
+    with storage.open_table('fights', fights.create_csv_file) as fight_writer, \
+         storage.open_table('fight_stats', fightstats.create_csv_file) as stat_writer, \
+         storage.open_table('round_stats', roundstats.create_csv_file) as round_writer, \
+         fighters.open_refresh_journal() as refresh_journal:
+        for url, rows, error in fetcher.scrape_urls(new_fight_urls(), parse_fight_page, stage_workers()):
+            if isinstance(error, requests.RequestException):
+                logger.error(f'Request error for fight URL {url}: {error}')
+                continue
+            elif error is not None:
+                logger.error(f'Error processing fight URL {url}: {error}')
+                continue
+
+            fightpages.write_tables((fight_writer, stat_writer, round_writer), refresh_journal, url, rows, no_breakdown)
+            urls_scraped += 1
+
+    fightpages.flag_no_breakdown(no_breakdown)
+    logger.info(f'{urls_scraped} new fight pages scraped')
+
+#Fetches the fighter listing pages one letter at a time and queues each fighter link as soon as its page is parsed
+#Returns the fighter urls in listing order
+def stream_fighter_listings(fighter_queue):
+    session = get_urls.create_session()
+    listed_urls = []
+    for letter in 'abcdefghijklmnopqrstuvwxyz':
+        try:
+            response = cache.get(session, f'{get_urls.SITE_URL}/statistics/fighters?char={letter}&page=all', timeout=30)
+            links = parsing.parse_html(response.text).select('a.b-link')[1::3]
+        except requests.RequestException as e:
+            logger.error(f'Error requesting fighters page for letter {letter}: {e}')
+            continue
+        except Exception as e:
+            logger.error(f'Error processing fighters page for letter {letter}: {e}')
+            continue
+        for link in links:
+            listed_urls.append(link.get('href'))
+            fighter_queue.put(link.get('href'))
+    return listed_urls
+
+#Fetches fighter pages as their urls arrive and writes the new fighters
+def stream_fighters(fighter_queue, producers):
+    urls_scraped = 0
+    with storage.open_table('fighters', fighters.create_csv) as writer:
+        for url, row, error in fetcher.scrape_urls(drain(fighter_queue.queue, producers), fighters.parse_fighter,
+                                                   stage_workers()):
+            if isinstance(error, requests.RequestException):
+                logger.error(f'Request error for fighter {url}: {error}')
+                continue
+            elif error is not None:
+                logger.error(f'Error processing fighter {url}: {error}')
+                continue
+            writer.writerow(row)
+            urls_scraped += 1
+    logger.info(f'{urls_scraped} new fighters scraped')
+
+#Runs a stage on its own thread, passing DONE on to the queues it feeds even if it fails
+#A failed stage keeps emptying its input queue, given as (queue, producers), so the stages feeding it do not block
+def start_stage(name, target, outputs, results, errors, inputs=()):
+
+    def run():
+        try:
+            results[name] = target()
+        except BaseException as e:
+            logger.error(f'Pipeline stage {name} failed: {e}')
+            errors.append(e)
+            for url_queue, producers in inputs:
+                for _ in drain(url_queue, producers):
+                    pass
+        finally:
+            for output in outputs:
+                if isinstance(output, FighterQueue):
+                    output.done()
+                else:
+                    output.put(DONE)
+
+    thread = threading.Thread(target=run, name=f'pipeline-{name}', daemon=True)
+    thread.start()
+    return thread
+
+#Scrapes events, fights and fighters as a stream: each fight url found on an event page goes straight to the
+#fight page stage, and each fighter link to the fighter stage, so every stage runs at once with bounded memory
+#With incremental=True only events missing from event_urls.csv are fetched and fighters come from their pages
+def run_pipeline(incremental=False):
+    session = get_urls.create_session()
+    listing = cache.fetch if incremental else cache.get
+    main_url = listing(session, f'{get_urls.SITE_URL}/statistics/events/completed?page=all', timeout=30)
+    listed_event_urls = get_urls.parse_event_urls(parsing.parse_html(main_url.text))
+
+    known_event_urls = get_urls.read_urls_from_csv('event_urls.csv')
+    known_fight_urls = get_urls.read_urls_from_csv('fight_urls.csv')
+    known_fighter_urls = get_urls.read_urls_from_csv('fighter_urls.csv')
+    if incremental:
+        known_events = set(known_event_urls)
+        event_urls = [url for url in listed_event_urls if url not in known_events]
+    else:
+        event_urls = listed_event_urls
+    logger.info(f'Streaming {len(event_urls)} events into the fight and fighter scrapers')
+
+    fight_queue = queue.Queue(QUEUE_SIZE)
+    fighter_queue = FighterQueue(storage.scraped_urls('fighters'))
+    fighter_producers = 1 if incremental else 2
+    results, errors = {}, []
+
+    threads = [start_stage('events', lambda: stream_events(event_urls, fight_queue, fighter_queue, incremental),
+                           [fight_queue, fighter_queue], results, errors),
+               start_stage('fights', lambda: stream_fights(fight_queue), [], results, errors, [(fight_queue, 1)]),
+               start_stage('fighters', lambda: stream_fighters(fighter_queue, fighter_producers), [], results, errors,
+                           [(fighter_queue.queue, fighter_producers)])]
+    if not incremental:
+        threads.append(start_stage('fighter_listings', lambda: stream_fighter_listings(fighter_queue),
+                                   [fighter_queue], results, errors))
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    #Url files are kept in the same order as a staged run, so the staged scrapers and --replay can use them
+    event_fights = results['events']
+    new_event_urls = [url for url in event_urls if url in event_fights] if incremental else event_urls
+    new_fight_urls = [fight_url for url in event_urls for fight_url in event_fights.get(url, [])]
+    if incremental:
+        if new_event_urls:
+            get_urls.write_urls_to_csv('event_urls.csv', new_event_urls + known_event_urls)
+            get_urls.write_urls_to_csv('fight_urls.csv', new_fight_urls + known_fight_urls)
+            known_fighters = set(known_fighter_urls)
+            get_urls.write_urls_to_csv('fighter_urls.csv', [url for url in fighter_queue.found if url not in known_fighters]
+                                       + known_fighter_urls)
+    else:
+        listed_fighter_urls = results['fighter_listings']
+        listed = set(listed_fighter_urls)
+        get_urls.write_urls_to_csv('event_urls.csv', event_urls)
+        get_urls.write_urls_to_csv('fight_urls.csv', new_fight_urls)
+        get_urls.write_urls_to_csv('fighter_urls.csv', listed_fighter_urls +
+                                   [url for url in fighter_queue.found if url not in listed])
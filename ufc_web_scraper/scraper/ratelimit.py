@@ -0,0 +1,136 @@
+#Import libraries for the adaptive request rate shared by every session
+import email.utils
+import threading
+import time
+import logging
+from scraper import metrics
+
+logger = logging.getLogger(__name__)
+
+#Starting rate and the range the rate adapts within, in requests per second
+#By default the rate never rises above the 1.5 seconds between requests the scraper has always kept with ufcstats.com,
+#so the limiter only slows down when the site pushes back. A higher MAX_RATE (main.py --max-rate) is opt-in
+REQUESTS_PER_SECOND = 1 / 1.5
+MIN_RATE = 0.1
+MAX_RATE = REQUESTS_PER_SECOND
+
+#Set to False to keep the rate fixed at REQUESTS_PER_SECOND
+ADAPTIVE = True
+
+#Requests that may start back to back after an idle period
+BURST = 2
+
+#Requests per second added after each healthy response (additive increase)
+RATE_STEP = 0.05
+
+#Rate multiplier after a 429/5xx/connection error, and after latency rises above LATENCY_RISE times its baseline
+BACKOFF = 0.5
+LATENCY_BACKOFF = 0.8
+LATENCY_RISE = 2.0
+
+#Responses already in flight when the server pushes back only lower the rate once per BACKOFF_COOLDOWN seconds
+BACKOFF_COOLDOWN = 2.0
+
+#Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 300
+
+#Seconds to pause every request for after a 429 or 503 without a Retry-After header
+DEFAULT_RETRY_AFTER = 5
+
+#Returns the seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = int(value)
+    else:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+#Token bucket shared by all workers, whose refill rate follows the server's responses:
+#it ramps up while responses are healthy and backs off on 429s, 5xx, errors or rising latency
+class AdaptiveRateLimiter:
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND):
+        self.rate = requests_per_second
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.last_backoff = 0.0
+        self.latency = None
+        self.baseline = None
+        self.lock = threading.Lock()
+
+    #Takes a token, sleeping until one is available
+    #Tokens can go negative so waiting workers queue up one refill interval apart
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            ready_at = self.updated + max(0.0, -self.tokens) / self.rate
+        delay = ready_at - now
+        if delay > 0:
+            metrics.observe('rate_limit_wait_seconds', delay)
+            time.sleep(delay)
+
+    #Stops every request from starting for the given number of seconds
+    def pause(self, seconds):
+        with self.lock:
+            resume_at = time.monotonic() + seconds
+            if resume_at > self.updated:
+                self.updated = resume_at
+                self.tokens = min(self.tokens, 0.0)
+        logger.warning(f'Server asked to slow down, pausing requests for {seconds:.1f} seconds')
+
+    def back_off(self, factor, reason):
+        now = time.monotonic()
+        if now - self.last_backoff < BACKOFF_COOLDOWN:
+            return
+        self.last_backoff = now
+        self.rate = max(MIN_RATE, self.rate * factor)
+        metrics.inc('rate_backoffs_total', reason=reason)
+        logger.info(f'Request rate lowered to {self.rate:.2f}/sec ({reason})')
+
+    #Adapts the rate to the outcome of a request: its final status (None for a connection error),
+    #any statuses urllib3 retried on the way and the seconds it took
+    def record(self, status, latency=None, retried_statuses=(), retry_after=None):
+        if status in (429, 503) or retry_after is not None:
+            self.pause(retry_after if retry_after is not None else DEFAULT_RETRY_AFTER)
+        if not ADAPTIVE:
+            return
+
+        with self.lock:
+            statuses = [*retried_statuses, status]
+            if 429 in statuses:
+                self.back_off(BACKOFF, 'rate limited')
+            elif None in statuses:
+                self.back_off(BACKOFF, 'request error')
+            elif any(code >= 500 for code in statuses):
+                self.back_off(BACKOFF, 'server error')
+            elif latency is not None:
+                #Smoothed latency against the lowest smoothed latency seen, which drifts up slowly
+                #so a server that is permanently slower does not keep the rate at its minimum
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if self.baseline is None or self.latency < self.baseline:
+                    self.baseline = self.latency
+                else:
+                    self.baseline += (self.latency - self.baseline) * 0.01
+
+                if self.latency > LATENCY_RISE * self.baseline:
+                    self.back_off(LATENCY_BACKOFF, 'latency rising')
+                else:
+                    self.rate = min(MAX_RATE, self.rate + RATE_STEP)
+
+limiter = AdaptiveRateLimiter(REQUESTS_PER_SECOND)
+
+#Sets the starting rate for later requests
+def configure(requests_per_second):
+    global REQUESTS_PER_SECOND, limiter
+    REQUESTS_PER_SECOND = requests_per_second
+    limiter = AdaptiveRateLimiter(requests_per_second)
@@ -0,0 +1,269 @@
+#Import libraries for typed scraped records and the column buffers they are batched into
+import array
+import dataclasses
+import datetime
+import re
+from typing import Optional
+
+#Written to csv files in place of missing values
+NULL = 'NULL'
+
+#Kinds of column, each parsed once when a page is scraped
+TEXT = 'text'
+INT = 'int'
+FLOAT = 'float'
+DATE = 'date'
+DURATION = 'duration'
+
+def to_text(value):
+    return None if value is None or value == NULL else value
+
+#Whole number, None for '--', 'NULL' or blank cells
+def to_int(value):
+    if value is None or isinstance(value, int):
+        return value
+    value = value.strip()
+    return int(value) if value.isdigit() else None
+
+def to_float(value):
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+#Date from a 'YYYY-MM-DD' string
+def to_date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(value.strip()[0:10])
+    except ValueError:
+        return None
+
+#Whole seconds from a 'm:ss' string
+def to_seconds(value):
+    if value is None or isinstance(value, int):
+        return value
+    match = re.match(r'^\s*(\d+):(\d\d)\s*$', value)
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+def format_seconds(seconds):
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+PARSE = {TEXT: to_text, INT: to_int, FLOAT: to_float, DATE: to_date, DURATION: to_seconds}
+
+#Values as the scrapers have always written them: dates as 'YYYY-MM-DD' and durations as 'm:ss'
+FORMAT = {DATE: datetime.date.isoformat, DURATION: format_seconds}
+
+#Declares a record field of the given kind
+def column(kind):
+    return dataclasses.field(metadata={'kind': kind})
+
+#Base of the record classes, one per scraped table with a field per column in storage.TABLES order
+class Record:
+    __slots__ = ()
+
+    #Field names and kinds of a record class, worked out once per class
+    @classmethod
+    def columns(cls):
+        if '_columns' not in cls.__dict__:
+            cls._columns = [(field.name, field.metadata['kind']) for field in dataclasses.fields(cls)]
+        return cls._columns
+
+    #Builds a record from the text values an extractor scraped, in column order
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(PARSE[kind](value) for (_, kind), value in zip(cls.columns(), row)))
+
+    #Values to write, with None for missing values
+    def row(self):
+        values = []
+        for name, kind in self.columns():
+            value = getattr(self, name)
+            if value is not None and kind in FORMAT:
+                value = FORMAT[kind](value)
+            values.append(value)
+        return values
+
+    #Values as written to csv files, with 'NULL' for missing values
+    def csv_row(self):
+        return [NULL if value is None else value for value in self.row()]
+
+@dataclasses.dataclass(slots=True)
+class Event(Record):
+    event_name: Optional[str] = column(TEXT)
+    event_date: Optional[datetime.date] = column(DATE)
+    event_city: Optional[str] = column(TEXT)
+    event_state: Optional[str] = column(TEXT)
+    event_country: Optional[str] = column(TEXT)
+    event_url: Optional[str] = column(TEXT)
+
+@dataclasses.dataclass(slots=True)
+class Fight(Record):
+    event_name: Optional[str] = column(TEXT)
+    referee: Optional[str] = column(TEXT)
+    f_1: Optional[str] = column(TEXT)
+    f_2: Optional[str] = column(TEXT)
+    winner: Optional[str] = column(TEXT)
+    num_rounds: Optional[int] = column(INT)
+    title_fight: Optional[str] = column(TEXT)
+    weight_class: Optional[str] = column(TEXT)
+    gender: Optional[str] = column(TEXT)
+    result: Optional[str] = column(TEXT)
+    result_details: Optional[str] = column(TEXT)
+    finish_round: Optional[int] = column(INT)
+    finish_time: Optional[int] = column(DURATION)
+    fight_url: Optional[str] = column(TEXT)
+    f_1_url: Optional[str] = column(TEXT)
+    f_2_url: Optional[str] = column(TEXT)
+    winner_url: Optional[str] = column(TEXT)
+    round_breakdown: Optional[str] = column(TEXT)
+
+@dataclasses.dataclass(slots=True)
+class FightStat(Record):
+    fighter_name: Optional[str] = column(TEXT)
+    knockdowns: Optional[int] = column(INT)
+    total_strikes_att: Optional[int] = column(INT)
+    total_strikes_succ: Optional[int] = column(INT)
+    sig_strikes_att: Optional[int] = column(INT)
+    sig_strikes_succ: Optional[int] = column(INT)
+    takedown_att: Optional[int] = column(INT)
+    takedown_succ: Optional[int] = column(INT)
+    submission_att: Optional[int] = column(INT)
+    reversals: Optional[int] = column(INT)
+    ctrl_time: Optional[int] = column(DURATION)
+    fight_url: Optional[str] = column(TEXT)
+    fighter_url: Optional[str] = column(TEXT)
+
+@dataclasses.dataclass(slots=True)
+class RoundStat(Record):
+    fighter_name: Optional[str] = column(TEXT)
+    round: Optional[int] = column(INT)
+    knockdowns: Optional[int] = column(INT)
+    sig_strikes_att: Optional[int] = column(INT)
+    sig_strikes_succ: Optional[int] = column(INT)
+    total_strikes_att: Optional[int] = column(INT)
+    total_strikes_succ: Optional[int] = column(INT)
+    takedown_att: Optional[int] = column(INT)
+    takedown_succ: Optional[int] = column(INT)
+    submission_att: Optional[int] = column(INT)
+    reversals: Optional[int] = column(INT)
+    ctrl_seconds: Optional[int] = column(INT)
+    head_strikes_att: Optional[int] = column(INT)
+    head_strikes_succ: Optional[int] = column(INT)
+    body_strikes_att: Optional[int] = column(INT)
+    body_strikes_succ: Optional[int] = column(INT)
+    leg_strikes_att: Optional[int] = column(INT)
+    leg_strikes_succ: Optional[int] = column(INT)
+    distance_strikes_att: Optional[int] = column(INT)
+    distance_strikes_succ: Optional[int] = column(INT)
+    clinch_strikes_att: Optional[int] = column(INT)
+    clinch_strikes_succ: Optional[int] = column(INT)
+    ground_strikes_att: Optional[int] = column(INT)
+    ground_strikes_succ: Optional[int] = column(INT)
+    fight_url: Optional[str] = column(TEXT)
+    fighter_url: Optional[str] = column(TEXT)
+
+@dataclasses.dataclass(slots=True)
+class Fighter(Record):
+    fighter_f_name: Optional[str] = column(TEXT)
+    fighter_l_name: Optional[str] = column(TEXT)
+    fighter_nickname: Optional[str] = column(TEXT)
+    fighter_height_cm: Optional[float] = column(FLOAT)
+    fighter_weight_lbs: Optional[int] = column(INT)
+    fighter_reach_cm: Optional[float] = column(FLOAT)
+    fighter_stance: Optional[str] = column(TEXT)
+    fighter_dob: Optional[datetime.date] = column(DATE)
+    fighter_w: Optional[int] = column(INT)
+    fighter_l: Optional[int] = column(INT)
+    fighter_d: Optional[int] = column(INT)
+    fighter_nc_dq: Optional[int] = column(INT)
+    fighter_url: Optional[str] = column(TEXT)
+
+@dataclasses.dataclass(slots=True)
+class FightSummary(Record):
+    event_url: Optional[str] = column(TEXT)
+    fight_url: Optional[str] = column(TEXT)
+    f_1: Optional[str] = column(TEXT)
+    f_2: Optional[str] = column(TEXT)
+    winner: Optional[str] = column(TEXT)
+    f_1_knockdowns: Optional[int] = column(INT)
+    f_2_knockdowns: Optional[int] = column(INT)
+    f_1_sig_strikes_succ: Optional[int] = column(INT)
+    f_2_sig_strikes_succ: Optional[int] = column(INT)
+    f_1_takedown_succ: Optional[int] = column(INT)
+    f_2_takedown_succ: Optional[int] = column(INT)
+    f_1_submission_att: Optional[int] = column(INT)
+    f_2_submission_att: Optional[int] = column(INT)
+    weight_class: Optional[str] = column(TEXT)
+    title_fight: Optional[str] = column(TEXT)
+    method: Optional[str] = column(TEXT)
+    method_details: Optional[str] = column(TEXT)
+    finish_round: Optional[int] = column(INT)
+    finish_time: Optional[int] = column(DURATION)
+    f_1_url: Optional[str] = column(TEXT)
+    f_2_url: Optional[str] = column(TEXT)
+    winner_url: Optional[str] = column(TEXT)
+
+#Record class of each table in storage.TABLES
+RECORDS = {'events': Event,
+           'fights': Fight,
+           'fight_stats': FightStat,
+           'round_stats': RoundStat,
+           'fighters': Fighter,
+           'fight_summaries': FightSummary}
+
+#Array typecode of each numeric kind, dates are stored as day ordinals and durations as seconds
+TYPECODES = {INT: 'q', FLOAT: 'd', DATE: 'q', DURATION: 'q'}
+
+#Rows waiting to be written, held column by column: numeric columns in typed arrays with a missing-value mask,
+#text columns in lists, so a batch costs a few bytes per number instead of a Python object per value
+class ColumnBuffer:
+
+    def __init__(self, record_class):
+        self.record_class = record_class
+        self.clear()
+
+    def clear(self):
+        self.values = []
+        self.missing = []
+        for _, kind in self.record_class.columns():
+            self.values.append(array.array(TYPECODES[kind]) if kind in TYPECODES else [])
+            self.missing.append(bytearray() if kind in TYPECODES else None)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, record):
+        for (name, kind), values, missing in zip(self.record_class.columns(), self.values, self.missing):
+            value = getattr(record, name)
+            if missing is None:
+                values.append(value)
+            else:
+                missing.append(value is None)
+                if value is None:
+                    value = 0
+                elif kind == DATE:
+                    value = value.toordinal()
+                values.append(value)
+        self.size += 1
+
+    #Rows in the order they were added, as Record.row() would return them
+    def rows(self):
+        columns = []
+        for (_, kind), values, missing in zip(self.record_class.columns(), self.values, self.missing):
+            if missing is None:
+                columns.append(values)
+                continue
+            if kind == DATE:
+                format_value = lambda ordinal: datetime.date.fromordinal(ordinal).isoformat()
+            else:
+                format_value = FORMAT.get(kind)
+            columns.append([None if is_missing else format_value(value) if format_value else value
+                            for value, is_missing in zip(values, missing)])
+        return [list(row) for row in zip(*columns)]
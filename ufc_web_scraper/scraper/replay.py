@@ -0,0 +1,189 @@
+#Import libraries for re-parsing stored pages without network access
+import contextlib
+import csv
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from scraper import cache, events, fightpages, fights, fightstats, fighters, parsing, records, roundstats, storage
+
+logger = logging.getLogger(__name__)
+
+#Define paths for url folder and scraped files folder
+url_path = os.getcwd() + '/urls'
+file_path = os.getcwd() + '/scraped_files'
+
+#Number of pages sent to a worker process at a time
+CHUNK_SIZE = 32
+
+#Runs every fight page extractor on the same page, as in fightpages.scrape_fight_pages
+#A round stats error is sent back as text, like the errors of parse_page
+def parse_fight_page(fight_soup,url):
+    fight_row, stat_rows, round_rows, round_error = fightpages.parse_tables(fight_soup,url,
+                                                                            {'fights', 'fight_stats', 'round_stats'})
+    if round_error is not None:
+        round_error = f'{type(round_error).__name__}: {round_error}'
+    return fight_row, stat_rows, round_rows, round_error
+
+#Stage name: (url file, extractor, [(output table, function creating its csv file)])
+STAGES = {'events': ('event_urls.csv', events.parse_event, [('events', events.create_csv_file)]),
+          'fights': ('fight_urls.csv', parse_fight_page, [('fights', fights.create_csv_file),
+                                                          ('fight_stats', fightstats.create_csv_file),
+                                                          ('round_stats', roundstats.create_csv_file)]),
+          'fighters': ('fighter_urls.csv', fighters.parse_fighter, [('fighters', fighters.create_csv)])}
+
+#Points each worker process at the stored corpus
+def init_worker(corpus_path):
+    cache.cache_path = corpus_path
+
+#Parses one stored page in a worker process and returns (url, result, error)
+def parse_page(task):
+    stage, url = task
+    content, _ = cache.load(url)
+    if content is None:
+        return url, None, 'page not found in corpus'
+    try:
+        soup = parsing.parse_html(content.decode('utf-8', errors='replace'))
+        return url, STAGES[stage][1](soup,url), None
+    except Exception as e:
+        return url, None, f'{type(e).__name__}: {e}'
+
+#Rows of a table's csv file by page url, in file order, and whether the file has the scraped layout
+#Rows are kept for pages that cannot be replayed, e.g. pages scraped before the cache existed
+def load_stored_rows(table):
+    file_name, columns, key, _ = storage.TABLES[table]
+    if file_name not in os.listdir(file_path):
+        return {}, True
+    stored = {}
+    with open(file_path + '/' + file_name,'r',newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        if not header:
+            return {}, True
+        url_index = header.index(key[0])
+        for row in reader:
+            if len(row) > url_index:
+                #Rows from before columns were added get NULL for them
+                stored.setdefault(row[url_index], []).append(row + [records.NULL] * (len(columns) - len(row)))
+    return stored, storage.scraped_layout(table, header)
+
+#Returns a writer for a table's replayed rows, written to a temporary file next to the table
+def open_replay_table(table):
+    path = file_path + '/' + storage.TABLES[table][0] + '.replay'
+    with open(path,'w',newline='',encoding='UTF8') as csv_file:
+        csv.writer(csv_file).writerow(storage.csv_header(table))
+    return storage.open_csv(table, path)
+
+#Swaps the replayed files of a stage in for its tables, or removes them if the tables are kept
+def finish_replay(stage, keep_tables):
+    for table, _ in STAGES[stage][2]:
+        path = file_path + '/' + storage.TABLES[table][0]
+        if keep_tables:
+            if os.path.exists(path + '.replay'):
+                os.remove(path + '.replay')
+        else:
+            os.replace(path + '.replay', path)
+
+#Writes a parsed result to the stage's output files
+#Returns False if the round stats of a fight page failed, so none were written for it
+def write_result(stage, writers, url, result):
+    if stage == 'fights':
+        fight_row, stat_rows, round_rows, round_error = result
+        writers[0].writerow(fight_row)
+        writers[1].writerows(stat_rows)
+        writers[2].writerows(round_rows or [])
+        if round_error is not None:
+            logger.error(f'Error replaying round stats of fight page {url}: {round_error}')
+            return False
+    else:
+        writers[0].writerow(result)
+    return True
+
+#Regenerates the Phase 2 tables from a stored html corpus, parsing pages across a process pool
+def replay(corpus_path=None, processes=None, stages=('events','fights','fighters')):
+    corpus_path = corpus_path or cache.cache_path
+    if not os.path.isdir(corpus_path):
+        logger.error(f'Missing corpus directory: {corpus_path} - run the scraper once to populate the cache')
+        return
+
+    logger.info(f'Replaying stored pages from {corpus_path} using {processes or os.cpu_count()} processes')
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(corpus_path,)) as executor:
+        for stage in stages:
+            url_file = STAGES[stage][0]
+
+            if url_file not in os.listdir(url_path):
+                logger.error(f'Missing file: {url_file} - skipping {stage} replay')
+                continue
+            with open(url_path + '/' + url_file,'r') as urls_csv:
+                reader = csv.reader(urls_csv)
+                urls = [row[0] for row in reader]
+
+            logger.info(f'Replaying {len(urls)} {stage} pages...')
+            if storage.BACKEND == 'csv':
+                replay_csv(executor, stage, urls)
+            else:
+                replay_database(executor, stage, urls)
+
+#Parses the stage's pages in url order, yielding (url, result, error)
+#map keeps url order, so the output matches a live scrape of the same url file
+def parse_pages(executor, stage, urls):
+    for url, result, error in executor.map(parse_page, [(stage, url) for url in urls], chunksize=CHUNK_SIZE):
+        if error is not None:
+            logger.error(f'Error replaying {stage} page {url}: {error}')
+        yield url, result, error
+
+#Regenerates the stage's csv files in temporary files that replace them once every page has been parsed
+#Pages that cannot be replayed keep their stored rows in their place, and rows of pages not in the url file go last
+#Rows of a file normalised in place cannot be mixed with scraped rows, so such a file is then left as it was
+def replay_csv(executor, stage, urls):
+    outputs = STAGES[stage][2]
+    stored, layouts = zip(*(load_stored_rows(table) for table, _ in outputs))
+    pages_parsed = 0
+    rows_carried = 0
+
+    try:
+        with contextlib.ExitStack() as stack:
+            writers = [stack.enter_context(open_replay_table(table)) for table, _ in outputs]
+            for url, result, error in parse_pages(executor, stage, urls):
+                old_rows = [table_rows.pop(url, []) for table_rows in stored]
+                if error is not None:
+                    for writer, rows in zip(writers, old_rows):
+                        writer.write_stored(rows)
+                        rows_carried += len(rows)
+                    continue
+                #Round stats that fail keep their stored rows
+                if not write_result(stage, writers, url, result):
+                    writers[2].write_stored(old_rows[2])
+                    rows_carried += len(old_rows[2])
+                pages_parsed += 1
+
+            for writer, table_rows in zip(writers, stored):
+                rows = [row for url_rows in table_rows.values() for row in url_rows]
+                writer.write_stored(rows)
+                rows_carried += len(rows)
+    except BaseException:
+        finish_replay(stage, keep_tables=True)
+        raise
+
+    logger.info(f'{pages_parsed}/{len(urls)} {stage} pages replayed successfully')
+    if rows_carried and not all(layouts):
+        logger.error(f'{rows_carried} stored {stage} rows could not be replayed and their files are normalised in place, '
+                     f'so the {stage} tables are left as they were')
+        finish_replay(stage, keep_tables=True)
+        return
+    if rows_carried:
+        logger.info(f'Kept {rows_carried} stored {stage} rows of pages that could not be replayed')
+    finish_replay(stage, keep_tables=False)
+
+#SQLite tables are upserted by url, so replayed rows replace the stored ones and other rows are kept
+def replay_database(executor, stage, urls):
+    pages_parsed = 0
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(storage.open_table(table, create_csv_file))
+                   for table, create_csv_file in STAGES[stage][2]]
+        for url, result, error in parse_pages(executor, stage, urls):
+            if error is None:
+                write_result(stage, writers, url, result)
+                pages_parsed += 1
+
+    logger.info(f'{pages_parsed}/{len(urls)} {stage} pages replayed successfully')
@@ -0,0 +1,108 @@
+#Import libraries for scraping again only the pages in the dead-letter store
+import collections
+import time
+import logging
+from scraper import cache, deadletter, events, fetcher, fightpages, fighters, fights, fightstats, roundstats, storage
+
+logger = logging.getLogger(__name__)
+
+#Passes over the pages still failing, with RETRY_BACKOFF seconds before the second pass, doubling after each one
+RETRY_ROUNDS = 3
+RETRY_BACKOFF = 10
+
+#Pages that have failed this many times are left in the store for a closer look instead of being retried
+MAX_ATTEMPTS = 5
+
+#Tables a page of each type is scraped into, with the function creating each csv file
+TABLES = {'events': [('events', events.create_csv_file)],
+          'fights': [('fights', fights.create_csv_file),
+                     ('fight_stats', fightstats.create_csv_file),
+                     ('round_stats', roundstats.create_csv_file)],
+          'fighters': [('fighters', fighters.create_csv)]}
+
+#Logs the failed pages by page type and error class, so the size of a retry is known before it starts
+def log_plan(failed):
+    by_type = collections.defaultdict(collections.Counter)
+    for entry in failed.values():
+        by_type[entry['page_type']][entry['error']] += 1
+    logger.info(f'{len(failed)} failed pages in the dead-letter store')
+    for page_type, errors in sorted(by_type.items()):
+        details = ', '.join(f'{error} {count}' for error, count in errors.most_common())
+        logger.info(f'  {page_type}: {sum(errors.values())} ({details})')
+
+#Scrapes the pages once, writing rows missing from their tables, and returns the urls that failed again
+#A fighter already stored, e.g. one whose refresh failed, has its row updated in place instead
+def retry_pages(urls):
+    scraped = {table: fightpages.scraped_urls(table) for tables in TABLES.values() for table, _ in tables}
+    stored_fighters = storage.stored_values('fighters', fighters.REFRESH_COLUMNS)
+
+    def parse_page(page_soup,url):
+        page_type = cache.page_type(url)
+        if page_type == 'events':
+            return events.parse_event(page_soup,url)
+        elif page_type == 'fights':
+            return fightpages.parse_tables(page_soup,url,{table for table, _ in TABLES['fights'] if url not in scraped[table]})
+        elif page_type == 'fighters':
+            return fighters.parse_fighter(page_soup,url)
+        raise ValueError(f'No scraper for {page_type} pages')
+
+    failed, updated_fighters, no_breakdown = [], [], []
+    with storage.open_table('events', events.create_csv_file) as event_writer, \
+         storage.open_table('fights', fights.create_csv_file) as fight_writer, \
+         storage.open_table('fight_stats', fightstats.create_csv_file) as stat_writer, \
+         storage.open_table('round_stats', roundstats.create_csv_file) as round_writer, \
+         storage.open_table('fighters', fighters.create_csv) as fighter_writer, \
+         fighters.open_refresh_journal() as refresh_journal:
+
+        #Pages are checked with the server even if cached, in case a bad copy was stored
+        for url, result, error in fetcher.scrape_urls(urls, parse_page, revalidate=True):
+            if error is not None:
+                logger.error(f'Retry failed for {url}: {error}')
+                failed.append(url)
+                continue
+
+            page_type = cache.page_type(url)
+            if page_type == 'events':
+                if url not in scraped['events']:
+                    event_writer.writerow(result)
+            elif page_type == 'fights':
+                if not fightpages.write_tables((fight_writer, stat_writer, round_writer), refresh_journal, url, result,
+                                               no_breakdown):
+                    failed.append(url)
+            elif url in stored_fighters:
+                updated_fighters.append(result)
+            else:
+                fighter_writer.writerow(result)
+
+    fighters.update_changed(updated_fighters, stored_fighters)
+    fightpages.flag_no_breakdown(no_breakdown)
+    return failed
+
+#Scrapes again only the pages in the dead-letter store, in up to RETRY_ROUNDS passes with a growing pause between them
+#so a server that was struggling has time to recover. Pages that scrape are removed from the store
+def retry_failed():
+    failed = deadletter.failed_pages()
+    if not failed:
+        logger.info('No failed pages to retry')
+        return
+    log_plan(failed)
+
+    urls = [url for url, entry in failed.items() if entry['attempts'] < MAX_ATTEMPTS]
+    if len(urls) < len(failed):
+        logger.warning(f'Skipping {len(failed) - len(urls)} pages that have failed {MAX_ATTEMPTS} times or more')
+
+    try:
+        for round_num in range(RETRY_ROUNDS):
+            if not urls:
+                break
+            if round_num:
+                backoff = RETRY_BACKOFF * 2 ** (round_num - 1)
+                logger.info(f'{len(urls)} pages still failing, retrying in {backoff} seconds')
+                time.sleep(backoff)
+            logger.info(f'Retrying {len(urls)} failed pages (pass {round_num + 1}/{RETRY_ROUNDS})')
+            urls = retry_pages(urls)
+    finally:
+        deadletter.compact()
+
+    remaining = len(deadletter.failed_pages())
+    logger.info(f'{len(failed) - remaining} of {len(failed)} failed pages recovered, {remaining} left in the dead-letter store')
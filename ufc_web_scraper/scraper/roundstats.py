@@ -0,0 +1,132 @@
+#Import libraries for web-scraping and saving to CSV file.
+import re
+import csv
+import os
+import logging
+from scraper import records, storage
+
+logger = logging.getLogger(__name__)
+
+#Define path for scraped files folder
+file_path = os.getcwd() + '/scraped_files'
+
+#Column headers, one row per fighter per round
+COLUMNS = ['fighter_id',
+           'round',
+           'knockdowns',
+           'sig_strikes_att',
+           'sig_strikes_succ',
+           'total_strikes_att',
+           'total_strikes_succ',
+           'takedown_att',
+           'takedown_succ',
+           'submission_att',
+           'reversals',
+           'ctrl_seconds',
+           'head_strikes_att',
+           'head_strikes_succ',
+           'body_strikes_att',
+           'body_strikes_succ',
+           'leg_strikes_att',
+           'leg_strikes_succ',
+           'distance_strikes_att',
+           'distance_strikes_succ',
+           'clinch_strikes_att',
+           'clinch_strikes_succ',
+           'ground_strikes_att',
+           'ground_strikes_succ',
+           'fight_url',
+           'fighter_url']
+
+#Creates csv file for scraped data
+def create_csv_file():
+    #If file does not exist, create a new CSV file with column headers
+    if 'ufc_round_stat_data.csv' not in os.listdir(file_path):
+        with open(file_path + '/' + 'ufc_round_stat_data.csv','w',newline='',encoding='UTF8') as ufc_round_stat_data:
+            writer = csv.writer(ufc_round_stat_data)
+            writer.writerow(COLUMNS)
+        logger.info('New File Created - ufc_round_stat_data.csv')
+    else:
+        logger.info('Scraping to Existing File - ufc_round_stat_data.csv')
+
+#Urls of fights flagged as having no round by round breakdown, which have no round stats rows
+def no_breakdown_urls():
+    stored = storage.stored_values('fights', ['round_breakdown'])
+    return {url for url, values in stored.items() if values.get('round_breakdown') == 'F'}
+
+#Urls of fight pages whose round stats were scraped, fights without a breakdown included
+def scraped_urls():
+    return storage.scraped_urls('round_stats') | no_breakdown_urls()
+
+#Ensure each url is only scraped once when script is run multiple times
+def filter_duplicate_urls(fight_urls):
+    #Removes previously scraped urls, keeping the original order of fight_urls
+    no_breakdown = no_breakdown_urls()
+    fight_urls[:] = [url for url in storage.filter_new_urls('round_stats', fight_urls) if url not in no_breakdown]
+
+#Whole number cell, 'NULL' for '--' or blank cells
+def parse_count(text):
+    return text if text.isdigit() else 'NULL'
+
+#Splits an 'x of y' cell into [attempted, successful]
+def parse_attempts(text):
+    match = re.match(r'^(\d+) of (\d+)$', text)
+    if match is None:
+        return ['NULL', 'NULL']
+    return [match.group(2), match.group(1)]
+
+#Converts a 'm:ss' control time to whole seconds
+def parse_seconds(text):
+    match = re.match(r'^(\d+):(\d\d)$', text)
+    if match is None:
+        return 'NULL'
+    return str(int(match.group(1)) * 60 + int(match.group(2)))
+
+#Text of each cell of a round, as [[fighter 1 value, fighter 2 value], ...]
+def get_round_cells(round_body):
+    return [[p.text.strip() for p in cell.select('p')] for cell in round_body.select('td')]
+
+#Scrapes the per round totals and significant strike tables of a parsed fight page and returns them as typed records
+#Fights without a round by round breakdown give no rows, fightpages.parse_tables flags their fight instead
+def parse_round_stats(fight_soup,url):
+
+    person_links = fight_soup.select('a.b-fight-details__person-link')[:2]
+    fighter_urls = [link.get('href').strip() for link in person_links]
+
+    #Per round totals table followed by the per round significant strikes table
+    round_tables = fight_soup.select('table.js-fight-table')
+    if len(round_tables) < 2:
+        return []
+
+    totals_rounds = round_tables[0].select('tbody.b-fight-details__table-body')
+    strikes_rounds = round_tables[1].select('tbody.b-fight-details__table-body')
+
+    rows = []
+    for round_num, (totals_body, strikes_body) in enumerate(zip(totals_rounds, strikes_rounds), 1):
+        totals_cells = get_round_cells(totals_body)
+        strikes_cells = get_round_cells(strikes_body)
+
+        for fighter in (0, 1):
+            #Fighter, KD, Sig. str., Sig. str. %, Total str., Td, Td %, Sub. att, Rev., Ctrl
+            totals = [cell[fighter] for cell in totals_cells]
+            #Fighter, Sig. str, Sig. str. %, Head, Body, Leg, Distance, Clinch, Ground
+            strikes = [cell[fighter] for cell in strikes_cells]
+
+            rows.append(records.RoundStat.from_row([totals[0],
+                                                    str(round_num),
+                                                    parse_count(totals[1]),
+                                                    *parse_attempts(totals[2]),
+                                                    *parse_attempts(totals[4]),
+                                                    *parse_attempts(totals[5]),
+                                                    parse_count(totals[7]),
+                                                    parse_count(totals[8]),
+                                                    parse_seconds(totals[9]),
+                                                    *parse_attempts(strikes[3]),
+                                                    *parse_attempts(strikes[4]),
+                                                    *parse_attempts(strikes[5]),
+                                                    *parse_attempts(strikes[6]),
+                                                    *parse_attempts(strikes[7]),
+                                                    *parse_attempts(strikes[8]),
+                                                    url,
+                                                    fighter_urls[fighter] if fighter < len(fighter_urls) else 'NULL']))
+    return rows
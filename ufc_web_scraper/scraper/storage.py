@@ -0,0 +1,613 @@
+#Import libraries for saving scraped rows to CSV files or a SQLite database
+import contextlib
+import csv
+import json
+import os
+import sqlite3
+import threading
+import logging
+from scraper import metrics, records
+
+logger = logging.getLogger(__name__)
+
+#Define path for scraped files folder
+file_path = os.getcwd() + '/scraped_files'
+
+#'csv' appends rows to the files in scraped_files, 'sqlite' upserts them into scraped_files/ufc.db
+BACKEND = 'csv'
+DB_PATH = file_path + '/ufc.db'
+
+#Rows written per transaction, also the number of urls checked per dedup query
+BATCH_SIZE = 500
+
+#csv files updated in place by update_rows since they were last normalised incrementally, so incremental
+#normalisation can tell an update from a file being replaced and patch the rows updated (record_row_update)
+updates_file = os.path.join(os.getcwd(), 'checkpoints', 'row_updates.json')
+#Keeps updates of the same file from threads of one process from replacing each other's rewrite
+update_lock = threading.Lock()
+
+#Table name: (csv file, columns in scraped row order, unique key, foreign key columns cleared when a row is replaced)
+#The first unique key column is the page url used to skip pages already scraped
+#Columns added after a table was first released go at the end so older files can be upgraded in place
+#The scrapers store the fighter's name in the stats 'fighter_id' csv columns, it is called fighter_name here
+#Fights without a round by round breakdown have round_breakdown 'F' and no round stats rows. Older datasets have a
+#row per fighter with a NULL round for them instead, counted as round 0 in the unique key
+TABLES = {'events': ('ufc_event_data.csv',
+                     ['event_name', 'event_date', 'event_city', 'event_state', 'event_country', 'event_url'],
+                     ['event_url'],
+                     []),
+          'fights': ('ufc_fight_data.csv',
+                     ['event_name', 'referee', 'f_1', 'f_2', 'winner', 'num_rounds', 'title_fight', 'weight_class',
+                      'gender', 'result', 'result_details', 'finish_round', 'finish_time', 'fight_url',
+                      'f_1_url', 'f_2_url', 'winner_url', 'round_breakdown'],
+                     ['fight_url'],
+                     ['event_id', 'f_1_id', 'f_2_id', 'winner_id']),
+          'fight_stats': ('ufc_fight_stat_data.csv',
+                          ['fighter_name', 'knockdowns', 'total_strikes_att', 'total_strikes_succ', 'sig_strikes_att',
+                           'sig_strikes_succ', 'takedown_att', 'takedown_succ', 'submission_att', 'reversals',
+                           'ctrl_time', 'fight_url', 'fighter_url'],
+                          ['fight_url', 'fighter_name'],
+                          ['fight_id', 'fighter_id']),
+          'round_stats': ('ufc_round_stat_data.csv',
+                          ['fighter_name', 'round', 'knockdowns', 'sig_strikes_att', 'sig_strikes_succ',
+                           'total_strikes_att', 'total_strikes_succ', 'takedown_att', 'takedown_succ',
+                           'submission_att', 'reversals', 'ctrl_seconds', 'head_strikes_att', 'head_strikes_succ',
+                           'body_strikes_att', 'body_strikes_succ', 'leg_strikes_att', 'leg_strikes_succ',
+                           'distance_strikes_att', 'distance_strikes_succ', 'clinch_strikes_att',
+                           'clinch_strikes_succ', 'ground_strikes_att', 'ground_strikes_succ', 'fight_url',
+                           'fighter_url'],
+                          ['fight_url', 'fighter_name', 'COALESCE(round, 0)'],
+                          ['fight_id', 'fighter_id']),
+          'fighters': ('ufc_fighter_data.csv',
+                       ['fighter_f_name', 'fighter_l_name', 'fighter_nickname', 'fighter_height_cm',
+                        'fighter_weight_lbs', 'fighter_reach_cm', 'fighter_stance', 'fighter_dob', 'fighter_w',
+                        'fighter_l', 'fighter_d', 'fighter_nc_dq', 'fighter_url'],
+                       ['fighter_url'],
+                       []),
+          'fight_summaries': ('ufc_fight_summary_data.csv',
+                              ['event_url', 'fight_url', 'f_1', 'f_2', 'winner', 'f_1_knockdowns', 'f_2_knockdowns',
+                               'f_1_sig_strikes_succ', 'f_2_sig_strikes_succ', 'f_1_takedown_succ', 'f_2_takedown_succ',
+                               'f_1_submission_att', 'f_2_submission_att', 'weight_class', 'title_fight', 'method',
+                               'method_details', 'finish_round', 'finish_time', 'f_1_url', 'f_2_url', 'winner_url'],
+                              ['fight_url'],
+                              [])}
+
+#Fighter names as written on fight pages, used to match fights and fight stats to fighters
+FIGHTER_NAME = "TRIM(COALESCE(fighter_f_name, '') || ' ' || COALESCE(fighter_l_name, ''))"
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    event_name TEXT,
+    event_date TEXT,
+    event_city TEXT,
+    event_state TEXT,
+    event_country TEXT,
+    event_url TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS fighters (
+    fighter_id INTEGER PRIMARY KEY,
+    fighter_f_name TEXT,
+    fighter_l_name TEXT,
+    fighter_nickname TEXT,
+    fighter_height_cm REAL,
+    fighter_weight_lbs INTEGER,
+    fighter_reach_cm REAL,
+    fighter_stance TEXT,
+    fighter_dob TEXT,
+    fighter_w INTEGER,
+    fighter_l INTEGER,
+    fighter_d INTEGER,
+    fighter_nc_dq INTEGER,
+    fighter_url TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS fights (
+    fight_id INTEGER PRIMARY KEY,
+    event_id INTEGER REFERENCES events(event_id),
+    f_1_id INTEGER REFERENCES fighters(fighter_id),
+    f_2_id INTEGER REFERENCES fighters(fighter_id),
+    winner_id INTEGER REFERENCES fighters(fighter_id),
+    event_name TEXT,
+    referee TEXT,
+    f_1 TEXT,
+    f_2 TEXT,
+    winner TEXT,
+    num_rounds INTEGER,
+    title_fight TEXT,
+    weight_class TEXT,
+    gender TEXT,
+    result TEXT,
+    result_details TEXT,
+    finish_round INTEGER,
+    finish_time TEXT,
+    fight_url TEXT NOT NULL UNIQUE,
+    f_1_url TEXT,
+    f_2_url TEXT,
+    winner_url TEXT,
+    round_breakdown TEXT
+);
+
+CREATE TABLE IF NOT EXISTS fight_stats (
+    fight_stat_id INTEGER PRIMARY KEY,
+    fight_id INTEGER REFERENCES fights(fight_id),
+    fighter_id INTEGER REFERENCES fighters(fighter_id),
+    fighter_name TEXT,
+    knockdowns INTEGER,
+    total_strikes_att INTEGER,
+    total_strikes_succ INTEGER,
+    sig_strikes_att INTEGER,
+    sig_strikes_succ INTEGER,
+    takedown_att INTEGER,
+    takedown_succ INTEGER,
+    submission_att INTEGER,
+    reversals INTEGER,
+    ctrl_time TEXT,
+    fight_url TEXT NOT NULL,
+    fighter_url TEXT,
+    UNIQUE (fight_url, fighter_name)
+);
+
+CREATE TABLE IF NOT EXISTS round_stats (
+    round_stat_id INTEGER PRIMARY KEY,
+    fight_id INTEGER REFERENCES fights(fight_id),
+    fighter_id INTEGER REFERENCES fighters(fighter_id),
+    fighter_name TEXT,
+    round INTEGER,
+    knockdowns INTEGER,
+    sig_strikes_att INTEGER,
+    sig_strikes_succ INTEGER,
+    total_strikes_att INTEGER,
+    total_strikes_succ INTEGER,
+    takedown_att INTEGER,
+    takedown_succ INTEGER,
+    submission_att INTEGER,
+    reversals INTEGER,
+    ctrl_seconds INTEGER,
+    head_strikes_att INTEGER,
+    head_strikes_succ INTEGER,
+    body_strikes_att INTEGER,
+    body_strikes_succ INTEGER,
+    leg_strikes_att INTEGER,
+    leg_strikes_succ INTEGER,
+    distance_strikes_att INTEGER,
+    distance_strikes_succ INTEGER,
+    clinch_strikes_att INTEGER,
+    clinch_strikes_succ INTEGER,
+    ground_strikes_att INTEGER,
+    ground_strikes_succ INTEGER,
+    fight_url TEXT NOT NULL,
+    fighter_url TEXT
+);
+
+CREATE TABLE IF NOT EXISTS fight_summaries (
+    fight_summary_id INTEGER PRIMARY KEY,
+    event_url TEXT,
+    fight_url TEXT NOT NULL UNIQUE,
+    f_1 TEXT,
+    f_2 TEXT,
+    winner TEXT,
+    f_1_knockdowns INTEGER,
+    f_2_knockdowns INTEGER,
+    f_1_sig_strikes_succ INTEGER,
+    f_2_sig_strikes_succ INTEGER,
+    f_1_takedown_succ INTEGER,
+    f_2_takedown_succ INTEGER,
+    f_1_submission_att INTEGER,
+    f_2_submission_att INTEGER,
+    weight_class TEXT,
+    title_fight TEXT,
+    method TEXT,
+    method_details TEXT,
+    finish_round INTEGER,
+    finish_time TEXT,
+    f_1_url TEXT,
+    f_2_url TEXT,
+    winner_url TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS round_stats_key ON round_stats(fight_url, fighter_name, COALESCE(round, 0));
+CREATE INDEX IF NOT EXISTS events_event_name ON events(event_name);
+CREATE INDEX IF NOT EXISTS fighters_fighter_name ON fighters({FIGHTER_NAME});
+CREATE INDEX IF NOT EXISTS fights_event_id ON fights(event_id);
+CREATE INDEX IF NOT EXISTS fight_stats_fight_id ON fight_stats(fight_id);
+CREATE INDEX IF NOT EXISTS round_stats_fight_id ON round_stats(fight_id);
+CREATE INDEX IF NOT EXISTS fight_summaries_event_url ON fight_summaries(event_url);
+'''
+
+#Opens the database, creating the tables and indexes on first use
+def connect():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    connection = sqlite3.connect(DB_PATH, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA foreign_keys=ON')
+    connection.executescript(SCHEMA)
+    add_missing_columns(connection)
+    return connection
+
+#Adds columns introduced since a database was created, all of them text
+def add_missing_columns(connection):
+    for table, (_, columns, _, _) in TABLES.items():
+        existing = {row[1] for row in connection.execute(f'PRAGMA table_info({table})')}
+        for column in columns:
+            if column not in existing:
+                logger.info(f'Adding column {column} to {table}')
+                connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+
+#Header of a table's csv file as the scrapers create it, the stats files name their fighter_name column fighter_id
+def csv_header(table):
+    return ['fighter_id' if column == 'fighter_name' else column for column in TABLES[table][1]]
+
+#True if a csv header has the scraped layout, possibly from before columns were added, rather than
+#the layout of a file normalised in place
+def scraped_layout(table, header):
+    return 0 < len(header) and header == csv_header(table)[:len(header)]
+
+#Extends a csv file written before columns were added to its table, filling them with NULL, and returns its header
+#Files already normalised in place have their own layout and are left as they are
+def add_missing_csv_columns(table):
+    file_name, columns, _, _ = TABLES[table]
+    path = file_path + '/' + file_name
+    with open(path,'r',newline='') as csv_file:
+        header = next(csv.reader(csv_file), [])
+        if not scraped_layout(table, header) or len(header) == len(columns):
+            return header
+
+        new_header = csv_header(table)
+        logger.info(f'Adding columns {", ".join(new_header[len(header):])} to {file_name}')
+        tmp_path = path + '.tmp'
+        with open(tmp_path,'w',newline='',encoding='UTF8') as new_file:
+            writer = csv.writer(new_file)
+            writer.writerow(new_header)
+            writer.writerows(row + ['NULL'] * (len(new_header) - len(row)) for row in csv.reader(csv_file))
+    os.replace(tmp_path, path)
+    return new_header
+
+#Insert statement that replaces the scraped columns of a row whose unique key already exists
+def upsert_statement(table):
+    _, columns, key, links = TABLES[table]
+    updates = [f'{column}=excluded.{column}' for column in columns if column not in key]
+    updates += [f'{column}=NULL' for column in links]
+    return (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+            f'ON CONFLICT ({", ".join(key)}) DO UPDATE SET {", ".join(updates)}')
+
+#Upserts batches of rows, one transaction per batch
+class SQLiteWriter:
+
+    def __init__(self, table):
+        self.connection = connect()
+        self.statement = upsert_statement(table)
+
+    def write_rows(self, rows):
+        with self.connection:
+            self.connection.executemany(self.statement, rows)
+
+    def close(self):
+        self.connection.close()
+
+#Collects the records of a table in a column buffer and passes them to write_rows BATCH_SIZE at a time
+#Rows given as lists of scraped text are turned into records first
+#Also counts the rows written for the run metrics
+class BufferedWriter:
+
+    def __init__(self, table, write_rows):
+        self.record_class = records.RECORDS[table]
+        self.buffer = records.ColumnBuffer(self.record_class)
+        self.write_rows = write_rows
+        self.rows = 0
+
+    def writerow(self, row):
+        if not isinstance(row, records.Record):
+            row = self.record_class.from_row(row)
+        self.buffer.append(row)
+        self.rows += 1
+        if len(self.buffer) >= BATCH_SIZE:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if len(self.buffer):
+            self.write_rows(self.buffer.rows())
+            self.buffer.clear()
+
+    #Writes rows already in stored form, e.g. carried over from an earlier copy of the table, after the buffered ones
+    def write_stored(self, rows):
+        self.flush()
+        if rows:
+            self.write_rows(rows)
+            self.rows += len(rows)
+
+#Returns a writer with writerow/writerows for a table of the configured backend
+#create_csv_file is the scraper's function that creates the csv file with its headers
+@contextlib.contextmanager
+def open_table(table, create_csv_file):
+    if BACKEND == 'sqlite':
+        database = SQLiteWriter(table)
+        writer = BufferedWriter(table, database.write_rows)
+        try:
+            yield writer
+        finally:
+            try:
+                writer.flush()
+            finally:
+                database.close()
+                metrics.inc('rows_written_total', writer.rows, table=table, backend=BACKEND)
+    else:
+        create_csv_file()
+        header = add_missing_csv_columns(table)
+        #Scraped rows appended under the header of a file normalised in place would land in the wrong columns
+        if not scraped_layout(table, header):
+            raise ValueError(f'{TABLES[table][0]} has been normalised in place, so scraped rows can no longer be '
+                             f'appended to it. Move it out of scraped_files/ to scrape into a new file, and use '
+                             f'--normalise incremental to keep the scraped files as they are')
+        with open_csv(table, file_path + '/' + TABLES[table][0]) as writer:
+            yield writer
+
+#Returns a writer appending a table's rows to the csv file at path, which has the table's columns
+@contextlib.contextmanager
+def open_csv(table, path):
+    with open(path,'a+') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        writer = BufferedWriter(table, lambda rows: csv_writer.writerows(
+            [records.NULL if value is None else value for value in row] for row in rows))
+        try:
+            yield writer
+        finally:
+            writer.flush()
+            metrics.inc('rows_written_total', writer.rows, table=table, backend='csv')
+
+#Returns the set of urls already in a table, for checking urls as they stream in
+def scraped_urls(table):
+    file_name, _, key, _ = TABLES[table]
+    url_column = key[0]
+
+    if BACKEND == 'sqlite':
+        connection = connect()
+        try:
+            return {row[0] for row in connection.execute(f'SELECT {url_column} FROM {table}')}
+        finally:
+            connection.close()
+
+    if file_name not in os.listdir(file_path):
+        return set()
+    with open(file_path + '/' + file_name,'r') as csv_file:
+        reader = csv.reader(csv_file)
+        url_index = next(reader).index(url_column)
+        return {row[url_index] for row in reader}
+
+#Returns the urls that are not yet in a table, keeping their original order
+def filter_new_urls(table, urls):
+    file_name, _, key, _ = TABLES[table]
+    url_column = key[0]
+
+    if BACKEND == 'sqlite':
+        #Each batch of urls is checked against the unique url index
+        connection = connect()
+        try:
+            scraped = set()
+            for start in range(0, len(urls), BATCH_SIZE):
+                batch = urls[start:start + BATCH_SIZE]
+                query = f'SELECT {url_column} FROM {table} WHERE {url_column} IN ({", ".join("?" * len(batch))})'
+                scraped.update(row[0] for row in connection.execute(query, batch))
+        finally:
+            connection.close()
+    else:
+        #Set of previously scraped urls for constant time lookups
+        scraped = scraped_urls(table)
+
+    #Removes previously scraped urls in a single pass
+    return [url for url in urls if url not in scraped]
+
+#Columns a full Phase 3 run combines into one column of a file normalised in place: {table: {column: parts}}
+COMBINED_COLUMNS = {'fighters': {'fighter_name': ['fighter_f_name', 'fighter_l_name']}}
+
+#Columns of a csv file holding the given columns of its table, as {column: index in the header}
+#Columns are named as in TABLES, apart from the combined columns of files normalised in place,
+#and columns the file doesn't have, e.g. ones added since it was written, are left out
+def file_columns(table, header, columns):
+    if scraped_layout(table, header):
+        indexes = {column: TABLES[table][1].index(column) for column in columns}
+        return {column: index for column, index in indexes.items() if index < len(header)}
+    combined = {part: column for column, parts in COMBINED_COLUMNS.get(table, {}).items() for part in parts}
+    found = {}
+    for column in columns:
+        column = combined.get(column, column)
+        if column in header:
+            found[column] = header.index(column)
+    return found
+
+#Value of a csv cell or a record's value as the kind of its column, for comparing stored rows with new scrapes
+#Files normalised in place by pandas have blank missing values and whole numbers that gained a '.0'
+def typed_value(kind, value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value in ('', records.NULL):
+        return None
+    if kind in (records.INT, records.FLOAT):
+        number = records.to_float(value)
+        if number is None or number != number:
+            return None
+        return int(number) if kind == records.INT and number.is_integer() else round(number, 6)
+    return records.PARSE[kind](value)
+
+#Kinds of a table's columns, including the combined columns of files normalised in place
+def column_kinds(table):
+    kinds = dict(records.RECORDS[table].columns())
+    kinds.update({column: records.TEXT for column in COMBINED_COLUMNS.get(table, {})})
+    return kinds
+
+#Values of a record for columns named as file_columns names them, combined columns joined as Phase 3 joins them
+def record_values(table, record, columns):
+    values = dict(zip([name for name, _ in record.columns()], record.row()))
+    for column, parts in COMBINED_COLUMNS.get(table, {}).items():
+        part_values = [values[part] for part in parts]
+        values[column] = None if None in part_values else ' '.join(part_values)
+    return {column: values[column] for column in columns}
+
+#Returns {url: {column: typed value}} for every row of a table, to compare with a new scrape (see changed_records)
+#csv files are read by header name, so files normalised in place are read correctly too
+def stored_values(table, columns):
+    file_name, _, key, _ = TABLES[table]
+    url_column = key[0]
+    kinds = column_kinds(table)
+
+    if BACKEND == 'sqlite':
+        connection = connect()
+        try:
+            query = f'SELECT {url_column}, {", ".join(columns)} FROM {table}'
+            return {row[0]: {column: typed_value(kinds[column], value) for column, value in zip(columns, row[1:])}
+                    for row in connection.execute(query)}
+        finally:
+            connection.close()
+
+    if file_name not in os.listdir(file_path):
+        return {}
+    with open(file_path + '/' + file_name,'r',newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        if url_column not in header:
+            return {}
+        indexes = file_columns(table, header, columns)
+        url_index = header.index(url_column)
+        return {row[url_index]: {column: typed_value(kinds[column], row[index] if index < len(row) else None)
+                                 for column, index in indexes.items()}
+                for row in reader if len(row) > url_index}
+
+#Records whose values differ from their stored row in stored, as returned by stored_values
+#Values are compared by kind, so e.g. a weight of 155 matches the 155.0 of a file normalised in place
+#Records without a stored row are left out
+def changed_records(table, updated, stored):
+    url_column = TABLES[table][2][0]
+    kinds = column_kinds(table)
+    changed = []
+    for record in updated:
+        stored_row = stored.get(getattr(record, url_column))
+        if stored_row is None:
+            continue
+        values = record_values(table, record, stored_row)
+        if any(typed_value(kinds[column], values[column]) != value for column, value in stored_row.items()):
+            changed.append(record)
+    return changed
+
+def load_row_updates():
+    try:
+        with open(updates_file, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_row_updates(updates):
+    os.makedirs(os.path.dirname(updates_file), exist_ok=True)
+    tmp_path = f'{updates_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(updates, json_file)
+    os.replace(tmp_path, updates_file)
+
+def clear_row_updates():
+    if os.path.exists(updates_file):
+        os.remove(updates_file)
+
+#Records an in-place update of a csv file since it was last normalised: {table: {'inode_before', 'inode', 'urls', 'columns'}}
+#inode_before is the file the first update started from and inode the file the latest one left, or None once
+#an update started from some other file, i.e. the file was replaced in between
+def record_row_update(table, inode_before, columns, urls):
+    updates = load_row_updates()
+    update = updates.setdefault(table, {'inode_before': inode_before, 'inode': inode_before, 'urls': [], 'columns': []})
+    if update['inode'] != inode_before:
+        update['inode_before'] = None
+    update['inode'] = os.stat(file_path + '/' + TABLES[table][0]).st_ino
+    update['urls'] = sorted(set(update['urls']) | set(urls))
+    update['columns'] = sorted(set(update['columns']) | set(columns))
+    save_row_updates(updates)
+
+#Replaces columns of rows already in a table with the values of updated records, matched on their page url
+#csv columns are found by header name (file_columns), so rows of files normalised in place keep their ids
+#csv files are rewritten to a temporary file that replaces the original, so an interrupted update changes nothing
+#SQLite foreign keys are cleared for link_keys to fill in again, unless relink is False as columns they come from are kept
+def update_rows(table, updated, columns, relink=True):
+    if not updated:
+        return 0
+    file_name, _, key, links = TABLES[table]
+    url_column = key[0]
+    updated = {getattr(record, url_column): record for record in updated}
+
+    if BACKEND == 'sqlite':
+        assignments = [f'{column}=?' for column in columns] + [f'{column}=NULL' for column in links if relink]
+        statement = f'UPDATE {table} SET {", ".join(assignments)} WHERE {url_column}=?'
+        connection = connect()
+        try:
+            with connection:
+                count = connection.executemany(statement, [[*record_values(table, record, columns).values(), url]
+                                                           for url, record in updated.items()]).rowcount
+        finally:
+            connection.close()
+    else:
+        header = add_missing_csv_columns(table)
+        #Columns are found by name, files normalised in place get blanks for missing values as pandas writes them
+        indexes = file_columns(table, header, columns)
+        url_index = header.index(url_column)
+        missing = records.NULL if scraped_layout(table, header) else ''
+        values = {url: record_values(table, record, indexes) for url, record in updated.items()}
+        path = file_path + '/' + file_name
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        updated_urls = []
+        with update_lock:
+            inode = os.stat(path).st_ino
+            with open(path,'r',newline='',encoding='UTF8') as csv_file, open(tmp_path,'w',newline='',encoding='UTF8') as new_file:
+                writer = csv.writer(new_file)
+                for line_num, row in enumerate(csv.reader(csv_file)):
+                    new_values = values.get(row[url_index]) if line_num and len(row) > url_index else None
+                    if new_values is not None:
+                        for column, index in indexes.items():
+                            row[index] = missing if new_values[column] is None else new_values[column]
+                        updated_urls.append(row[url_index])
+                    writer.writerow(row)
+            os.replace(tmp_path, path)
+            record_row_update(table, inode, columns, updated_urls)
+        count = len(updated_urls)
+
+    metrics.inc('rows_updated_total', count, table=table, backend=BACKEND)
+    logger.info(f'Updated {count} rows of {table}')
+    return count
+
+#Fills in foreign keys that are still missing, so only rows added or replaced since the last run are touched
+#Fighters are matched by profile url, falling back to their name for rows scraped before urls were captured
+def link_keys():
+    connection = connect()
+    try:
+        with connection:
+            logger.debug('Linking fights to events')
+            connection.execute('''UPDATE fights SET event_id =
+                                      (SELECT MAX(event_id) FROM events WHERE events.event_name = fights.event_name)
+                                  WHERE event_id IS NULL''')
+
+            logger.debug('Linking fights, fight stats and round stats to fighters')
+            for table, name_column, url_column, id_column in [('fights', 'f_1', 'f_1_url', 'f_1_id'),
+                                                               ('fights', 'f_2', 'f_2_url', 'f_2_id'),
+                                                               ('fights', 'winner', 'winner_url', 'winner_id'),
+                                                               ('fight_stats', 'fighter_name', 'fighter_url', 'fighter_id'),
+                                                               ('round_stats', 'fighter_name', 'fighter_url', 'fighter_id')]:
+                connection.execute(f'''UPDATE {table} SET {id_column} = CASE
+                                           WHEN {url_column} IS NOT NULL THEN
+                                               (SELECT fighter_id FROM fighters WHERE fighter_url = {table}.{url_column})
+                                           ELSE
+                                               (SELECT MAX(fighter_id) FROM fighters WHERE {FIGHTER_NAME} = {table}.{name_column})
+                                           END
+                                       WHERE {id_column} IS NULL''')
+
+            logger.debug('Linking fight stats and round stats to fights')
+            for table in ['fight_stats', 'round_stats']:
+                connection.execute(f'''UPDATE {table} SET fight_id =
+                                           (SELECT fight_id FROM fights WHERE fights.fight_url = {table}.fight_url)
+                                       WHERE fight_id IS NULL''')
+
+        for table in TABLES:
+            count = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            logger.info(f'{count} rows in {table}')
+    finally:
+        connection.close()
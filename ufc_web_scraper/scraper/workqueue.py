@@ -0,0 +1,395 @@
+#Import libraries for a shared work queue that scraping workers lease urls from
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from scraper import cache, deadletter, events, fetcher, fightpages, fighters, fights, fightstats, get_urls, metrics, ratelimit, records, roundstats, storage
+
+logger = logging.getLogger(__name__)
+
+#Default queue file, on the local filesystem of the machine every worker runs on
+queue_path = os.getcwd() + '/checkpoints/work_queue.db'
+
+#Urls leased at a time, and seconds a lease lasts before its urls are handed to another worker
+LEASE_SIZE = 50
+LEASE_SECONDS = 600
+
+#Leases of a url, including expired ones, before it is marked failed
+MAX_ATTEMPTS = 3
+
+#Seconds an idle worker waits before checking again for expired leases
+POLL_INTERVAL = 5.0
+
+#Url file queued for each page type, with the tables its page is scraped into
+URL_FILES = {'events': ('event_urls.csv', ['events']),
+             'fights': ('fight_urls.csv', ['fights', 'fight_stats', 'round_stats']),
+             'fighters': ('fighter_urls.csv', ['fighters'])}
+
+#Function creating the csv file of each table results are merged into
+CREATE_CSV = {'events': events.create_csv_file,
+              'fights': fights.create_csv_file,
+              'fight_stats': fightstats.create_csv_file,
+              'round_stats': roundstats.create_csv_file,
+              'fighters': fighters.create_csv}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    url TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    results TEXT,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks(state);
+CREATE TABLE IF NOT EXISTS budget (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    last_backoff REAL NOT NULL,
+    max_rate REAL
+);
+'''
+
+#Methods a work queue backend provides. Urls are leased by one worker at a time, a lease that runs out hands
+#its urls to the next worker, and a url's results are kept from whichever worker completes it first
+#The queue also holds the request budget every worker draws from, so the site sees one request rate
+#Workers on more than one machine need a backend built for that, e.g. one on Redis
+class WorkQueue:
+
+    #Queues urls not queued before, returns the number added
+    def add(self, urls):
+        raise NotImplementedError
+
+    #Leases up to count pending urls, or urls whose lease has run out, to a worker
+    def lease(self, worker, count, seconds):
+        raise NotImplementedError
+
+    #Stores the results of a url, {table: rows}, unless another worker completed it first
+    def complete(self, url, worker, results):
+        raise NotImplementedError
+
+    #Returns a url leased by the worker to the queue, or marks it failed after MAX_ATTEMPTS
+    def fail(self, url, worker, error):
+        raise NotImplementedError
+
+    #Number of urls pending or leased
+    def remaining(self):
+        raise NotImplementedError
+
+    #Yields (url, results) of completed urls not merged yet, in the order they were queued
+    def results(self):
+        raise NotImplementedError
+
+    def mark_merged(self, urls):
+        raise NotImplementedError
+
+    #Number of urls in each state
+    def counts(self):
+        raise NotImplementedError
+
+    #Sets the rate the shared budget may rise to, for every worker, and lowers the rate to it if above
+    def set_max_rate(self, rate):
+        raise NotImplementedError
+
+    #Takes a request from the shared budget, first adding RATE_STEP per healthy response since the last one
+    #up to the max rate stored in the queue. Returns the seconds to wait before sending it
+    def take_token(self, healthy=0):
+        raise NotImplementedError
+
+    #Multiplies the shared rate by factor (at most once per BACKOFF_COOLDOWN) and pauses every worker for pause seconds
+    def back_off(self, factor, pause=0):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+#Work queue in a SQLite file, shared by the worker processes of one machine
+#The file must be on a local filesystem: SQLite's locking is not reliable on network filesystems (NFS, SMB), where
+#two machines could lease the same url or corrupt the file. It uses the rollback journal rather than WAL, whose
+#shared memory index only works between processes of one machine
+#Every change is one IMMEDIATE transaction, so two workers never lease the same url
+class SQLiteWorkQueue(WorkQueue):
+
+    def __init__(self, path=None):
+        self.path = path or queue_path
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        #One connection for every fetcher thread of the worker, used under self.lock
+        self.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        #Also turns WAL off in queue files created by earlier versions
+        self.connection.execute('PRAGMA journal_mode=DELETE')
+        self.connection.executescript(SCHEMA)
+        #Queues created before the max rate was stored in them
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(budget)')]
+        if 'max_rate' not in columns:
+            self.connection.execute('ALTER TABLE budget ADD COLUMN max_rate REAL')
+        self.connection.execute('INSERT OR IGNORE INTO budget VALUES (0, ?, 1.0, ?, 0.0, NULL)',
+                                (ratelimit.REQUESTS_PER_SECOND, time.time()))
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def add(self, urls):
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO tasks (url) VALUES (?)', ([url] for url in urls))
+            return connection.total_changes - before
+
+    def lease(self, worker, count, seconds):
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute("UPDATE tasks SET state = 'failed', error = 'lease expired' "
+                               "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+            urls = [row[0] for row in connection.execute(
+                "SELECT url FROM tasks WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY rowid LIMIT ?", (now, count))]
+            connection.executemany("UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, "
+                                   "attempts = attempts + 1 WHERE url = ?",
+                                   ([worker, now + seconds, url] for url in urls))
+        return urls
+
+    def complete(self, url, worker, results):
+        with self.transaction() as connection:
+            connection.execute("UPDATE tasks SET state = 'done', worker = ?, lease_until = NULL, error = NULL, "
+                               "results = ? WHERE url = ? AND state != 'done'", (worker, json.dumps(results), url))
+
+    def fail(self, url, worker, error):
+        with self.transaction() as connection:
+            connection.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                               "lease_until = NULL, error = ? WHERE url = ? AND state = 'leased' AND worker = ?",
+                               (MAX_ATTEMPTS, f'{type(error).__name__}: {error}', url, worker))
+
+    def remaining(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def results(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT url, results FROM tasks WHERE state = 'done' AND merged = 0 ORDER BY rowid").fetchall()
+        for url, results in rows:
+            yield url, json.loads(results)
+
+    def mark_merged(self, urls):
+        with self.transaction() as connection:
+            connection.executemany('UPDATE tasks SET merged = 1 WHERE url = ?', ([url] for url in urls))
+
+    def counts(self):
+        with self.lock:
+            return dict(self.connection.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+
+    def set_max_rate(self, rate):
+        with self.transaction() as connection:
+            connection.execute('UPDATE budget SET max_rate = ?, rate = MIN(rate, ?)', (rate, rate))
+
+    #Same token bucket as ratelimit.AdaptiveRateLimiter, kept in the queue file on wall-clock time
+    #A queue without a stored max rate falls back to this process's ratelimit.MAX_RATE
+    def take_token(self, healthy=0):
+        now = time.time()
+        with self.transaction() as connection:
+            rate, tokens, updated, max_rate = connection.execute(
+                'SELECT rate, tokens, updated, COALESCE(max_rate, ?) FROM budget', (ratelimit.MAX_RATE,)).fetchone()
+            rate = min(max_rate, rate + healthy * ratelimit.RATE_STEP)
+            if now > updated:
+                tokens = min(ratelimit.BURST, tokens + (now - updated) * rate)
+                updated = now
+            tokens -= 1
+            connection.execute('UPDATE budget SET rate = ?, tokens = ?, updated = ?', (rate, tokens, updated))
+        return updated + max(0.0, -tokens) / rate - now
+
+    def back_off(self, factor, pause=0):
+        now = time.time()
+        with self.transaction() as connection:
+            rate, tokens, updated, last_backoff = connection.execute(
+                'SELECT rate, tokens, updated, last_backoff FROM budget').fetchone()
+            if factor != 1 and now - last_backoff >= ratelimit.BACKOFF_COOLDOWN:
+                rate, last_backoff = max(ratelimit.MIN_RATE, rate * factor), now
+            if pause and now + pause > updated:
+                updated, tokens = now + pause, min(tokens, 0.0)
+            connection.execute('UPDATE budget SET rate = ?, tokens = ?, updated = ?, last_backoff = ?',
+                               (rate, tokens, updated, last_backoff))
+        return rate
+
+    def close(self):
+        self.connection.close()
+
+#Stands in for ratelimit.limiter in a worker, so every worker draws from the budget in the queue
+#and a 429 seen by one of them slows down all of them
+#Rising latency does not lower the shared rate, as each worker sees latencies of its own requests only
+class SharedRateLimiter:
+
+    def __init__(self, work_queue):
+        self.queue = work_queue
+        self.healthy = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            healthy, self.healthy = self.healthy, 0
+        delay = self.queue.take_token(healthy)
+        if delay > 0:
+            metrics.observe('rate_limit_wait_seconds', delay)
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        self.queue.back_off(1, seconds)
+        logger.warning(f'Server asked to slow down, pausing every worker for {seconds:.1f} seconds')
+
+    #Same outcomes as AdaptiveRateLimiter.record, applied to the shared rate
+    def record(self, status, latency=None, retried_statuses=(), retry_after=None):
+        pause = 0
+        if status in (429, 503) or retry_after is not None:
+            pause = retry_after if retry_after is not None else ratelimit.DEFAULT_RETRY_AFTER
+            logger.warning(f'Server asked to slow down, pausing every worker for {pause:.1f} seconds')
+
+        statuses = [*retried_statuses, status]
+        if not ratelimit.ADAPTIVE:
+            reason = None
+        elif 429 in statuses:
+            reason = 'rate limited'
+        elif None in statuses:
+            reason = 'request error'
+        elif any(code >= 500 for code in statuses):
+            reason = 'server error'
+        else:
+            reason = None
+
+        if reason is not None:
+            rate = self.queue.back_off(ratelimit.BACKOFF, pause)
+            metrics.inc('rate_backoffs_total', reason=reason)
+            logger.info(f'Shared request rate now {rate:.2f}/sec ({reason})')
+        elif pause:
+            self.queue.back_off(1, pause)
+        elif ratelimit.ADAPTIVE:
+            with self.lock:
+                self.healthy += 1
+
+#Queues the urls in the url files that are missing from the tables their page is scraped into
+#Run once after Phase 1, e.g. python main.py --queue enqueue. Its --max-rate is stored in the queue and caps every worker
+def enqueue_urls(path=None):
+    work_queue = SQLiteWorkQueue(path)
+    try:
+        work_queue.set_max_rate(ratelimit.MAX_RATE)
+        for page_type, (url_file, tables) in URL_FILES.items():
+            urls = get_urls.read_urls_from_csv(url_file)
+            missing = set()
+            for table in tables:
+                new_urls = list(urls)
+                #Round stats also leave out fights flagged as having no round by round breakdown
+                if table == 'round_stats':
+                    roundstats.filter_duplicate_urls(new_urls)
+                else:
+                    new_urls = storage.filter_new_urls(table, new_urls)
+                missing.update(new_urls)
+            added = work_queue.add(url for url in urls if url in missing)
+            logger.info(f'Queued {added} new {page_type} pages from {url_file}')
+        logger.info(f'Work queue: {work_queue.counts()}')
+    finally:
+        work_queue.close()
+
+#Scrapes a queued page into {table: rows}, rows as values with None for missing ones so they can be stored as JSON
+def parse_page(page_soup,url):
+    page_type = cache.page_type(url)
+    if page_type == 'events':
+        results = {'events': [events.parse_event(page_soup,url)]}
+    elif page_type == 'fights':
+        fight_row, stat_rows, round_rows, round_error = fightpages.parse_tables(page_soup,url,URL_FILES['fights'][1])
+        results = {'fights': [fight_row], 'fight_stats': stat_rows, 'round_stats': round_rows}
+        #The fight and its stats are still stored, the next enqueue_urls queues the page again for its round stats
+        if round_error is not None:
+            logger.error(f'Error processing round stats of queued page {url}: {round_error}')
+            del results['round_stats']
+    elif page_type == 'fighters':
+        results = {'fighters': [fighters.parse_fighter(page_soup,url)]}
+    else:
+        raise ValueError(f'No scraper for {page_type} pages')
+    return {table: [record.row() for record in rows] for table, rows in results.items()}
+
+#Leases urls from the queue until none are left, scraping each batch with the fetcher and storing the results
+#in the queue. Requests are paced by the queue's shared budget instead of this process's own limiter
+def run_worker(path=None, worker_id=None):
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    work_queue = SQLiteWorkQueue(path)
+    ratelimit.limiter = SharedRateLimiter(work_queue)
+    #Failed urls are kept by the queue, so retrying them is left to the queue too
+    deadletter.ENABLED = False
+    pages_scraped = 0
+    try:
+        while True:
+            urls = work_queue.lease(worker_id, LEASE_SIZE, LEASE_SECONDS)
+            if not urls:
+                #Urls still leased by other workers come back if their worker stops before completing them
+                if not work_queue.remaining():
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            for url, results, error in fetcher.scrape_urls(urls, parse_page):
+                if error is not None:
+                    logger.error(f'Error scraping queued page {url}: {error}')
+                    work_queue.fail(url, worker_id, error)
+                    continue
+                work_queue.complete(url, worker_id, results)
+                pages_scraped += 1
+    finally:
+        work_queue.close()
+    logger.info(f'Worker {worker_id} scraped {pages_scraped} pages')
+    return pages_scraped
+
+#Runs a worker in each of processes processes on this machine, all of them leasing from the same queue file
+def run_workers(path=None, processes=None):
+    if not processes or processes == 1:
+        return run_worker(path)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pages_scraped = sum(executor.map(run_worker, [path] * processes))
+    logger.info(f'{processes} workers scraped {pages_scraped} pages')
+    return pages_scraped
+
+#Writes completed results into the output tables in the order their urls were queued
+#Rows of a url already in a table are skipped, so merging again after a crash, or results a worker stored twice,
+#never duplicate rows
+def merge_results(path=None):
+    work_queue = SQLiteWorkQueue(path)
+    try:
+        scraped = {table: fightpages.scraped_urls(table) for table in CREATE_CSV}
+        merged, no_breakdown = [], []
+        with contextlib.ExitStack() as stack:
+            writers = {table: stack.enter_context(storage.open_table(table, create_csv_file))
+                       for table, create_csv_file in CREATE_CSV.items()}
+            refresh_journal = stack.enter_context(fighters.open_refresh_journal())
+            for url, results in work_queue.results():
+                for table, rows in results.items():
+                    if url not in scraped[table]:
+                        writers[table].writerows(rows)
+                        scraped[table].add(url)
+                        if table == 'fights':
+                            for row in rows:
+                                fighters.queue_refresh(refresh_journal, records.Fight.from_row(row))
+                    #A fight stored before its round stats, found to have no breakdown
+                    elif table == 'fights' and url not in scraped['round_stats']:
+                        if any(records.Fight.from_row(row).round_breakdown == 'F' for row in rows):
+                            no_breakdown.append(url)
+                merged.append(url)
+        fightpages.flag_no_breakdown(no_breakdown)
+        work_queue.mark_merged(merged)
+        logger.info(f'Merged {len(merged)} scraped pages, work queue: {work_queue.counts()}')
+    finally:
+        work_queue.close()
@@ -0,0 +1,28 @@
+#Scraper modules are imported as the scraper package, from the folder main.py runs in
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import (events, fighters, fightpages, fights, fightstats, fightsummaries, journal, normalise_tables,
+                     replay, roundstats, storage)
+
+#Runs a test in an empty working folder, with the folders the modules resolved at import pointed at it
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    scraped_path = str(tmp_path / 'scraped_files')
+    os.makedirs(scraped_path)
+    os.makedirs(tmp_path / 'checkpoints')
+    monkeypatch.chdir(tmp_path)
+    for module in (events, fighters, fightpages, fights, fightstats, fightsummaries, replay, roundstats, storage):
+        monkeypatch.setattr(module, 'file_path', scraped_path)
+    monkeypatch.setattr(storage, 'DB_PATH', scraped_path + '/ufc.db')
+    monkeypatch.setattr(storage, 'updates_file', str(tmp_path / 'checkpoints' / 'row_updates.json'))
+    monkeypatch.setattr(normalise_tables, 'file_path', scraped_path)
+    monkeypatch.setattr(normalise_tables, 'normalised_path', os.path.join(scraped_path, 'normalised'))
+    monkeypatch.setattr(normalise_tables, 'state_file', str(tmp_path / 'checkpoints' / 'normalise_state.json'))
+    monkeypatch.setattr(journal, 'journal_path', str(tmp_path / 'checkpoints'))
+    return tmp_path
+
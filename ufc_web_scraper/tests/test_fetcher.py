@@ -0,0 +1,28 @@
+import threading
+from scraper import fetcher
+
+#A stalled first request stops new submissions LOOKAHEAD urls per worker past it, instead of buffering every later page
+def test_stalled_request_bounds_lookahead(monkeypatch):
+    release = threading.Event()
+    submitted = []
+
+    def fetch(url, revalidate=False):
+        submitted.append(url)
+        if url == 0:
+            release.wait(10)
+        return url
+
+    monkeypatch.setattr(fetcher, 'fetch', fetch)
+    results = fetcher.fetch_all(range(100), max_workers=2)
+    early = [next(results)[0] for _ in range(3)]
+
+    assert sorted(early) == [1, 2, 3]
+    assert sorted(submitted) == [0, 1, 2, 3]
+
+    release.set()
+    rest = [result[0] for result in results]
+    assert sorted(early + rest) == list(range(100))
+
+def test_in_order_yields_input_order():
+    results = [(2, 'c'), (0, 'a'), (1, 'b')]
+    assert list(fetcher.in_order(iter(results))) == [(0, 'a'), (1, 'b'), (2, 'c')]
@@ -0,0 +1,21 @@
+from scraper import fighters, records, storage
+from test_storage import NORMALISED_FIGHTERS, read_csv, write_csv
+
+def profile(wins, url):
+    return records.Fighter.from_row(['Tom', 'Aaron', 'NULL', 'NULL', '155', 'NULL', 'NULL', '1978-07-13', wins, '3', '0',
+                                     'NULL', 'http://ufcstats.com/fighter-details/' + url])
+
+#Only fighters whose profile differs from their stored row are updated, in a file normalised in place as well
+def test_update_changed_on_normalised_file(workdir):
+    write_csv(workdir, 'ufc_fighter_data.csv', NORMALISED_FIGHTERS)
+    stored = storage.stored_values('fighters', fighters.REFRESH_COLUMNS)
+
+    assert fighters.update_changed([profile('5', 'a')], stored) == []
+    assert read_csv(workdir, 'ufc_fighter_data.csv') == NORMALISED_FIGHTERS
+
+    won = profile('6', 'a')
+    assert fighters.update_changed([won], stored) == [won]
+    rows = read_csv(workdir, 'ufc_fighter_data.csv')
+    assert rows[1] == ['2', 'Tom Aaron', '', '', '155', '', '', '1978-07-13', '6', '3', '0', '',
+                       'http://ufcstats.com/fighter-details/a']
+    assert rows[2] == NORMALISED_FIGHTERS[2]
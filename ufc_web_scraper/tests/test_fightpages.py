@@ -0,0 +1,77 @@
+import csv
+import os
+from scraper import deadletter, fightpages, fights, parsing, roundstats, storage
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+FIGHT_URL = 'http://ufcstats.com/fight-details/0adfc21045c02555'
+NO_ROUNDS_URL = 'http://ufcstats.com/fight-details/2a03bc4c491b4c9a'
+TABLES = {'fights', 'fight_stats', 'round_stats'}
+
+def fight_soup(file_name='fight.html'):
+    with open(os.path.join(FIXTURES, 'fights', file_name), encoding='utf-8') as html_file:
+        return parsing.parse_html(html_file.read())
+
+#Stands in for a table's writer, keeping the rows written
+class Rows(list):
+
+    def writerow(self, row):
+        self.append(row)
+
+    def writerows(self, rows):
+        self.extend(rows)
+
+def test_parse_tables_scrapes_every_table():
+    fight_row, stat_rows, round_rows, round_error = fightpages.parse_tables(fight_soup(), FIGHT_URL, TABLES)
+
+    assert fight_row.fight_url == FIGHT_URL
+    assert fight_row.round_breakdown == 'T'
+    assert len(stat_rows) == 2
+    assert round_rows and round_error is None
+
+#A page whose round stats can't be parsed still gives its fight and fight stats, and goes to the dead-letter store
+def test_round_stats_failure_keeps_fight_rows(workdir, monkeypatch):
+    def broken(fight_soup, url):
+        raise IndexError('list index out of range')
+    monkeypatch.setattr(roundstats, 'parse_round_stats', broken)
+    monkeypatch.setattr(deadletter, 'store', None)
+    monkeypatch.setattr(deadletter, 'entries', None)
+
+    rows = fightpages.parse_tables(fight_soup(), FIGHT_URL, TABLES)
+    writers = Rows(), Rows(), Rows()
+    assert not fightpages.write_tables(writers, None, FIGHT_URL, rows, [])
+
+    assert [fight.fight_url for fight in writers[0]] == [FIGHT_URL]
+    assert writers[0][0].round_breakdown is None
+    assert len(writers[1]) == 2
+    assert writers[2] == []
+    assert deadletter.failed_pages()[FIGHT_URL]['error'] == 'IndexError'
+    deadletter.close()
+
+#A fight without a round by round breakdown gets no round stats rows, only a flag
+def test_no_breakdown_flags_fight():
+    fight_row, _, round_rows, round_error = fightpages.parse_tables(fight_soup('fight_no_rounds.html'), NO_ROUNDS_URL,
+                                                                   TABLES)
+
+    assert round_rows == [] and round_error is None
+    assert fight_row.round_breakdown == 'F'
+
+#A fight stored before its round stats were scraped is flagged once its table is closed, and not fetched again
+def test_stored_fight_without_breakdown_is_flagged(workdir):
+    fight_row, stat_rows, _, _ = fightpages.parse_tables(fight_soup('fight_no_rounds.html'), NO_ROUNDS_URL,
+                                                         {'fights', 'fight_stats'})
+    with storage.open_table('fights', fights.create_csv_file) as writer:
+        writer.writerow(fight_row)
+    assert roundstats.scraped_urls() == set()
+
+    rows = fightpages.parse_tables(fight_soup('fight_no_rounds.html'), NO_ROUNDS_URL, {'round_stats'})
+    no_breakdown = []
+    assert fightpages.write_tables((Rows(), Rows(), Rows()), None, NO_ROUNDS_URL, rows, no_breakdown)
+    assert no_breakdown == [NO_ROUNDS_URL]
+    fightpages.flag_no_breakdown(no_breakdown)
+
+    with open(workdir / 'scraped_files' / 'ufc_fight_data.csv', newline='') as csv_file:
+        stored = list(csv.reader(csv_file))
+    assert stored[1] == [str(value) for value in fight_row.csv_row()[:-1]] + ['F']
+    urls = [NO_ROUNDS_URL, FIGHT_URL]
+    roundstats.filter_duplicate_urls(urls)
+    assert urls == [FIGHT_URL]
@@ -0,0 +1,57 @@
+import json
+import os
+from scraper import deadletter, get_urls, journal
+
+EVENT_URLS = [f'http://ufcstats.com/event-details/{num}' for num in range(4)]
+
+#A line cut short by a crash is dropped and cut off the file, so appending carries on from the last whole line
+def test_load_drops_torn_last_line(workdir):
+    fight_journal = journal.Journal('fight_urls')
+    with fight_journal:
+        fight_journal.append(EVENT_URLS[0], ['http://ufcstats.com/fight-details/1'])
+    with open(fight_journal.path, 'a') as journal_file:
+        journal_file.write('{"url": "' + EVENT_URLS[1] + '", "da')
+
+    assert fight_journal.load() == {EVENT_URLS[0]: ['http://ufcstats.com/fight-details/1']}
+    with fight_journal:
+        fight_journal.append(EVENT_URLS[1], [])
+    assert list(journal.Journal('fight_urls').load()) == EVENT_URLS[:2]
+
+def test_load_compacts_superseded_entries(workdir):
+    dead_letters = journal.Journal('dead_letters')
+    with dead_letters:
+        for attempt in range(5):
+            dead_letters.append(EVENT_URLS[0], {'attempts': attempt})
+        dead_letters.append(EVENT_URLS[1], {'attempts': 0})
+
+    assert dead_letters.load() == {EVENT_URLS[0]: {'attempts': 4}, EVENT_URLS[1]: {'attempts': 0}}
+    with open(dead_letters.path) as journal_file:
+        assert [json.loads(line)['url'] for line in journal_file] == EVENT_URLS[:2]
+
+#The checkpoint of an older version is imported once, so its events are not fetched again, then removed
+def test_old_checkpoint_is_imported_once(workdir):
+    checkpoint_path = os.path.join(journal.journal_path, get_urls.OLD_CHECKPOINT)
+    partial_path = os.path.join(journal.journal_path, get_urls.OLD_PARTIAL_URLS)
+    with open(checkpoint_path, 'w') as checkpoint_csv:
+        checkpoint_csv.write('current_index,total_urls_collected\n3,2\n')
+    with open(partial_path, 'w') as partial_csv:
+        partial_csv.write('http://ufcstats.com/fight-details/1\nhttp://ufcstats.com/fight-details/2\n')
+
+    done_events = get_urls.open_fight_journal(EVENT_URLS).load()
+
+    assert list(done_events) == EVENT_URLS[:3]
+    assert [url for urls in done_events.values() for url in urls] == ['http://ufcstats.com/fight-details/1',
+                                                                     'http://ufcstats.com/fight-details/2']
+    assert not os.path.exists(checkpoint_path) and not os.path.exists(partial_path)
+    assert get_urls.open_fight_journal(EVENT_URLS).load() == done_events
+
+def test_dead_letter_compact_keeps_failing_pages(workdir, monkeypatch):
+    monkeypatch.setattr(deadletter, 'store', None)
+    monkeypatch.setattr(deadletter, 'entries', None)
+    deadletter.record_failure(EVENT_URLS[0], ValueError('bad page'))
+    deadletter.record_failure(EVENT_URLS[1], ValueError('bad page'))
+    deadletter.resolve(EVENT_URLS[0])
+    deadletter.compact()
+    deadletter.close()
+
+    assert list(journal.Journal(deadletter.NAME).load()) == [EVENT_URLS[1]]
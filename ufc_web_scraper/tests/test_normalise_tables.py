@@ -0,0 +1,69 @@
+import csv
+import json
+import os
+from scraper import normalise_tables, records, storage
+
+#Written to a new file that replaces the old one, as --replay does
+def write_scraped(workdir, table, rows):
+    path = workdir / 'scraped_files' / storage.TABLES[table][0]
+    with open(str(path) + '.tmp', 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows([storage.csv_header(table)] + rows)
+    os.replace(str(path) + '.tmp', path)
+
+def read_normalised(workdir, table):
+    with open(workdir / 'scraped_files' / 'normalised' / storage.TABLES[table][0], newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+FIGHT_URL = 'http://ufcstats.com/fight-details/1'
+
+#One fight between the first two fighters, so every table has rows normalised
+def write_fight(workdir):
+    write_scraped(workdir, 'events', [['UFC 1', '1993-11-12', 'Denver', 'Colorado', 'USA',
+                                       'http://ufcstats.com/event-details/1']])
+    write_scraped(workdir, 'fights', [['UFC 1', 'Herb Dean', 'Tom Aaron', 'Danny Abbadi', 'Tom Aaron', '3', 'F',
+                                       'Lightweight', 'M', 'Decision', 'Unanimous', '3', '5:00', FIGHT_URL,
+                                       'http://ufcstats.com/fighter-details/a', 'http://ufcstats.com/fighter-details/b',
+                                       'http://ufcstats.com/fighter-details/a', 'T']])
+    write_scraped(workdir, 'fight_stats', [[name, '0', '10', '5', '8', '4', '0', '0', '0', '0', '0:10', FIGHT_URL,
+                                            'http://ufcstats.com/fighter-details/' + url]
+                                           for name, url in [('Tom Aaron', 'a'), ('Danny Abbadi', 'b')]])
+
+def fighter(first, last, wins, url):
+    return [first, last, 'NULL', '180.34', '155', 'NULL', 'Orthodox', '1983-07-03', wins, '6', '0', 'NULL',
+            'http://ufcstats.com/fighter-details/' + url]
+
+#A fighter updated in place is patched in the normalised output, keeping its id, and rows appended after the
+#update, which moved the bytes of every row after it, are still read from where the last run stopped
+def test_updated_rows_are_patched_and_new_rows_appended(workdir):
+    write_fight(workdir)
+    write_scraped(workdir, 'fighters', [fighter('Tom', 'Aaron', '5', 'a'), fighter('Danny', 'Abbadi', '4', 'b')])
+    normalise_tables.normalise_new_rows()
+
+    renamed = records.Fighter.from_row(fighter('Thomas', 'Aaron', '15', 'a'))
+    storage.update_rows('fighters', [renamed], storage.TABLES['fighters'][1])
+    with storage.open_table('fighters', lambda: None) as writer:
+        writer.writerow(records.Fighter.from_row(fighter('Bo', 'Able', '1', 'c')))
+    normalise_tables.normalise_new_rows()
+
+    rows = read_normalised(workdir, 'fighters')
+    assert [row[:2] + row[8:9] for row in rows[1:]] == [['2', 'Thomas Aaron', '15'], ['1', 'Danny Abbadi', '4'],
+                                                         ['3', 'Bo Able', '1']]
+    with open(normalise_tables.state_file) as json_file:
+        state = json.load(json_file)
+    assert state['fighters']['rows'] == 3
+    assert state['fighters']['offset'] == (workdir / 'scraped_files' / 'ufc_fighter_data.csv').stat().st_size
+
+#A file replaced between two updates can't be followed, so the output is rebuilt from the scraped files
+def test_replaced_file_rebuilds_normalised_output(workdir):
+    write_fight(workdir)
+    write_scraped(workdir, 'fighters', [fighter('Tom', 'Aaron', '5', 'a'), fighter('Danny', 'Abbadi', '4', 'b')])
+    normalise_tables.normalise_new_rows()
+
+    storage.update_rows('fighters', [records.Fighter.from_row(fighter('Tom', 'Aaron', '6', 'a'))], ['fighter_w'])
+    write_scraped(workdir, 'fighters', [fighter('Danny', 'Abbadi', '4', 'b'), fighter('Tom', 'Aaron', '6', 'a')])
+    storage.update_rows('fighters', [records.Fighter.from_row(fighter('Tom', 'Aaron', '7', 'a'))], ['fighter_w'])
+    assert storage.load_row_updates()['fighters']['inode_before'] is None
+    normalise_tables.normalise_new_rows()
+
+    rows = read_normalised(workdir, 'fighters')
+    assert [row[:2] + row[8:9] for row in rows[1:]] == [['2', 'Danny Abbadi', '4'], ['1', 'Tom Aaron', '7']]
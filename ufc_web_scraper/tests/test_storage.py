@@ -0,0 +1,119 @@
+import csv
+import pytest
+from scraper import records, storage
+
+def write_csv(workdir, file_name, rows):
+    with open(workdir / 'scraped_files' / file_name, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+
+def read_csv(workdir, file_name):
+    with open(workdir / 'scraped_files' / file_name, newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+FIGHT = records.Fight.from_row(['UFC 1', 'Herb Dean', 'Tom Aaron', 'Bo Able', 'Tom Aaron', '3', 'F', 'Lightweight', 'M',
+                                'Decision', 'Unanimous', '3', '5:00', 'http://ufcstats.com/fight-details/1',
+                                'http://ufcstats.com/fighter-details/a', 'http://ufcstats.com/fighter-details/b',
+                                'http://ufcstats.com/fighter-details/a', 'T'])
+
+#Files from before the url columns were added get them, filled with NULL, before rows are appended
+def test_open_table_upgrades_scraped_file(workdir):
+    old_columns = storage.TABLES['fights'][1][:-4]
+    write_csv(workdir, 'ufc_fight_data.csv', [old_columns, ['x'] * len(old_columns)])
+
+    with storage.open_table('fights', lambda: None) as writer:
+        writer.writerow(FIGHT)
+
+    rows = read_csv(workdir, 'ufc_fight_data.csv')
+    assert rows[0] == storage.csv_header('fights')
+    assert rows[1] == ['x'] * len(old_columns) + ['NULL'] * 4
+    assert rows[2][-5:] == ['http://ufcstats.com/fight-details/1', 'http://ufcstats.com/fighter-details/a',
+                            'http://ufcstats.com/fighter-details/b', 'http://ufcstats.com/fighter-details/a', 'T']
+
+#Rows can't be appended to a file normalised in place, whose columns are not the scraped ones
+def test_open_table_refuses_normalised_file(workdir):
+    normalised = [['fight_id', 'event_id', 'referee', 'f_1', 'f_2', 'winner', 'num_rounds', 'title_fight',
+                   'weight_class', 'gender', 'result', 'result_details', 'finish_round', 'finish_time', 'fight_url'],
+                  ['1', '1', 'Herb Dean', '2', '1', '2', '3', 'F', 'Lightweight', 'M', 'Decision', 'Unanimous', '3',
+                   '5:00', 'http://ufcstats.com/fight-details/0']]
+    write_csv(workdir, 'ufc_fight_data.csv', normalised)
+
+    with pytest.raises(ValueError, match='normalised in place'):
+        with storage.open_table('fights', lambda: None) as writer:
+            writer.writerow(FIGHT)
+
+    assert read_csv(workdir, 'ufc_fight_data.csv') == normalised
+
+#Fighters file as a full Phase 3 run leaves it: ids first, names combined, blanks for missing values, '.0' on numbers
+NORMALISED_FIGHTERS = [['fighter_id', 'fighter_name', 'fighter_nickname', 'fighter_height_cm', 'fighter_weight_lbs',
+                        'fighter_reach_cm', 'fighter_stance', 'fighter_dob', 'fighter_w', 'fighter_l', 'fighter_d',
+                        'fighter_nc_dq', 'fighter_url'],
+                       ['2', 'Tom Aaron', '', '', '155.0', '', '', '1978-07-13', '5', '3', '0', '',
+                        'http://ufcstats.com/fighter-details/a'],
+                       ['1', 'Danny Abbadi', 'The Assassin', '180.34', '155.0', '', 'Orthodox', '1983-07-03', '4', '6',
+                        '0', '', 'http://ufcstats.com/fighter-details/b']]
+
+def fighter(row):
+    return records.Fighter.from_row(row)
+
+#As parsed from a listing page, which has no date of birth or no contest count
+TOM_AARON = ['Tom', 'Aaron', 'NULL', 'NULL', '155', 'NULL', '', 'NULL', '5', '3', '0', 'NULL',
+             'http://ufcstats.com/fighter-details/a']
+DANNY_ABBADI = ['Danny', 'Abbadi', 'The Assassin', 180.34, '155', 'NULL', 'Orthodox', 'NULL', '4', '6', '0', 'NULL',
+                'http://ufcstats.com/fighter-details/b']
+
+def listing_columns():
+    from scraper import fighters
+    return fighters.LISTING_COLUMNS
+
+def test_stored_values_reads_normalised_file_by_header_name(workdir):
+    write_csv(workdir, 'ufc_fighter_data.csv', NORMALISED_FIGHTERS)
+
+    stored = storage.stored_values('fighters', listing_columns())
+
+    assert stored['http://ufcstats.com/fighter-details/a'] == {
+        'fighter_name': 'Tom Aaron', 'fighter_nickname': None, 'fighter_height_cm': None, 'fighter_weight_lbs': 155,
+        'fighter_reach_cm': None, 'fighter_stance': None, 'fighter_w': 5, 'fighter_l': 3, 'fighter_d': 0}
+
+def test_unchanged_fighters_compare_equal_to_normalised_rows(workdir):
+    write_csv(workdir, 'ufc_fighter_data.csv', NORMALISED_FIGHTERS)
+    stored = storage.stored_values('fighters', listing_columns())
+
+    assert storage.changed_records('fighters', [fighter(TOM_AARON), fighter(DANNY_ABBADI)], stored) == []
+
+    won = fighter(TOM_AARON[:8] + ['6'] + TOM_AARON[9:])
+    assert storage.changed_records('fighters', [won, fighter(DANNY_ABBADI)], stored) == [won]
+
+#Updating a normalised file writes each value under its own header and keeps the ids
+def test_update_rows_on_normalised_file(workdir):
+    write_csv(workdir, 'ufc_fighter_data.csv', NORMALISED_FIGHTERS)
+    renamed = fighter(['Tommy', 'Aaron', 'The Tank', 'NULL', '156', 'NULL', 'Southpaw', '1978-07-13', '6', '3', '0',
+                       '1', 'http://ufcstats.com/fighter-details/a'])
+
+    assert storage.update_rows('fighters', [renamed], storage.TABLES['fighters'][1]) == 1
+
+    rows = read_csv(workdir, 'ufc_fighter_data.csv')
+    assert rows[0] == NORMALISED_FIGHTERS[0]
+    assert rows[1] == ['2', 'Tommy Aaron', 'The Tank', '', '156', '', 'Southpaw', '1978-07-13', '6', '3', '0', '1',
+                       'http://ufcstats.com/fighter-details/a']
+    assert rows[2] == NORMALISED_FIGHTERS[2]
+
+def test_update_rows_on_scraped_file(workdir):
+    write_csv(workdir, 'ufc_fighter_data.csv', [storage.csv_header('fighters'),
+                                                fighter(TOM_AARON).csv_row(), fighter(DANNY_ABBADI).csv_row()])
+    won = fighter(TOM_AARON[:8] + ['6'] + TOM_AARON[9:])
+
+    assert storage.update_rows('fighters', [won], listing_columns()) == 1
+
+    rows = read_csv(workdir, 'ufc_fighter_data.csv')
+    assert rows[1] == ['Tom', 'Aaron', 'NULL', 'NULL', '155', 'NULL', '', 'NULL', '6', '3', '0', 'NULL',
+                       'http://ufcstats.com/fighter-details/a']
+    assert rows[2] == [str(value) for value in fighter(DANNY_ABBADI).csv_row()]
+
+def test_stored_values_from_sqlite(workdir, monkeypatch):
+    monkeypatch.setattr(storage, 'BACKEND', 'sqlite')
+    with storage.open_table('fighters', lambda: None) as writer:
+        writer.writerows([fighter(TOM_AARON), fighter(DANNY_ABBADI)])
+    stored = storage.stored_values('fighters', listing_columns())
+
+    assert stored['http://ufcstats.com/fighter-details/b']['fighter_height_cm'] == 180.34
+    assert storage.changed_records('fighters', [fighter(TOM_AARON), fighter(DANNY_ABBADI)], stored) == []
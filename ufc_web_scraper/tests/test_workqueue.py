@@ -0,0 +1,75 @@
+import csv
+import os
+import time
+from scraper import parsing, ratelimit, storage, workqueue
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+FIGHT_URL = 'http://ufcstats.com/fight-details/0adfc21045c02555'
+
+def fight_results():
+    with open(os.path.join(FIXTURES, 'fights', 'fight.html'), encoding='utf-8') as html_file:
+        return workqueue.parse_page(parsing.parse_html(html_file.read()), FIGHT_URL)
+
+#Url of every row in a table's csv file, duplicates included
+def table_urls(table):
+    file_name, _, key, _ = storage.TABLES[table]
+    with open(os.path.join(storage.file_path, file_name), newline='') as csv_file:
+        return [row[key[0]] for row in csv.DictReader(csv_file)]
+
+#A lease that runs out hands its url to the next worker, and the url fails after MAX_ATTEMPTS leases
+def test_expired_lease_goes_to_next_worker(workdir):
+    work_queue = workqueue.SQLiteWorkQueue(str(workdir / 'queue.db'))
+    work_queue.add([FIGHT_URL])
+
+    assert work_queue.lease('a', 10, 600) == [FIGHT_URL]
+    assert work_queue.lease('b', 10, 600) == []
+
+    work_queue.connection.execute('UPDATE tasks SET lease_until = ?', (time.time() - 1,))
+    assert work_queue.lease('b', 10, -1) == [FIGHT_URL]
+    #Worker a finishing late does not take the url back from b
+    work_queue.fail(FIGHT_URL, 'a', ValueError('late'))
+    assert work_queue.counts() == {'leased': 1}
+
+    assert work_queue.lease('c', 10, -1) == [FIGHT_URL]
+    assert work_queue.lease('d', 10, 600) == []
+    assert work_queue.counts() == {'failed': 1}
+    assert work_queue.remaining() == 0
+    work_queue.close()
+
+#Merging again, or merging a url completed by two workers, never duplicates rows
+def test_merge_results_is_idempotent(workdir):
+    path = str(workdir / 'queue.db')
+    results = fight_results()
+    work_queue = workqueue.SQLiteWorkQueue(path)
+    work_queue.add([FIGHT_URL])
+    work_queue.lease('a', 10, 600)
+    work_queue.complete(FIGHT_URL, 'a', results)
+    work_queue.complete(FIGHT_URL, 'b', results)
+    work_queue.close()
+
+    workqueue.merge_results(path)
+    first = {table: table_urls(table) for table in ('fights', 'fight_stats', 'round_stats')}
+    assert first['fights'] == [FIGHT_URL]
+    assert len(first['fight_stats']) == 2 and first['round_stats']
+
+    #A merge that stopped before marking its urls merged is run again
+    work_queue = workqueue.SQLiteWorkQueue(path)
+    work_queue.connection.execute('UPDATE tasks SET merged = 0')
+    work_queue.close()
+    workqueue.merge_results(path)
+    workqueue.merge_results(path)
+
+    assert {table: table_urls(table) for table in first} == first
+
+#Workers rise no higher than the max rate enqueue stored, whatever their own MAX_RATE
+def test_max_rate_is_read_from_queue(workdir, monkeypatch):
+    work_queue = workqueue.SQLiteWorkQueue(str(workdir / 'queue.db'))
+    work_queue.set_max_rate(2.0)
+    monkeypatch.setattr(ratelimit, 'MAX_RATE', 50.0)
+
+    work_queue.take_token(healthy=1000)
+
+    assert work_queue.connection.execute('SELECT rate FROM budget').fetchone()[0] == 2.0
+    work_queue.set_max_rate(1.0)
+    assert work_queue.connection.execute('SELECT rate FROM budget').fetchone()[0] == 1.0
+    work_queue.close()